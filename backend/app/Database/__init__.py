@@ -1,4 +1,34 @@
-from app.Database.connection import connect_to_database
+from app.Database.connection import (
+    connect_to_database,
+    get_connection,
+    get_pool,
+    configure_pool,
+    close_pool,
+)
+from app.Database.pool import ConnectionPool, PoolError, PoolTimeoutError
+from app.Database.executor import (
+    ExecutorSaturatedError,
+    QueryDeadlineError,
+    QueryExecutor,
+    lookup_queries,
+    listing_queries,
+    run_in,
+)
 
 # This module initializes the database connection functionality.
-__all__ = ['connect_to_database']
\ No newline at end of file
+__all__ = [
+    'connect_to_database',
+    'get_connection',
+    'get_pool',
+    'configure_pool',
+    'close_pool',
+    'ConnectionPool',
+    'PoolError',
+    'PoolTimeoutError',
+    'ExecutorSaturatedError',
+    'QueryDeadlineError',
+    'QueryExecutor',
+    'lookup_queries',
+    'listing_queries',
+    'run_in',
+]
@@ -1,23 +1,142 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import pymssql
 
+from app.Database.executor import current_call
+from app.Database.instrumented import InstrumentedConnection
+from app.Database.pool import ConnectionPool
+from app.logs import get_logger
+from app.metrics import DB_ACQUIRE
+
+log = get_logger(__name__)
+
+
+def _connect():
+    """
+    Open a new pymssql connection, raising on failure.
+    """
+    # conn = pymssql.connect(server="plesk6900.is.cc",
+    #                        user="zoz",
+    #                        password="Syon_Soft",
+    #                        database="santova")
+    return pymssql.connect(server="sql5097.site4now.net",
+                           user="DB_A4EFFD_Hybridwf_admin",
+                           password="yL3qjUOBX@seJyC",
+                           database="DB_A4EFFD_Hybridwf")
+
+
 def connect_to_database():
     """
     Establish a connection to the database using pymssql.
-    
+
+    Prefer `get_connection()`, which reuses pooled connections.
+
     Returns:
-        pymssql.Connection: A connection object to the database.
+        InstrumentedConnection: A pymssql connection whose cursors are traced.
     """
     try:
-        # conn = pymssql.connect(server="plesk6900.is.cc",
-        #                        user="zoz",
-        #                        password="Syon_Soft",
-        #                        database="santova")
-        conn = pymssql.connect(server="sql5097.site4now.net",
-                               user="DB_A4EFFD_Hybridwf_admin",
-                               password="yL3qjUOBX@seJyC",
-                               database="DB_A4EFFD_Hybridwf")
-        print("Connection successful")
-        return conn
+        conn = _connect()
+        log.debug("database connection opened")
+        return InstrumentedConnection(conn)
     except pymssql.Error as e:
-        print(f"Error connecting to the database: {e}")
-        return None
\ No newline at end of file
+        log.error("database connection failed", extra={"error": str(e)})
+        return None
+
+
+def pool_config_from_env():
+    """
+    Read pool settings from the environment (see .env_example).
+    """
+    return {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 1)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+        "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+        "ping_interval": float(os.environ.get("DB_POOL_PING_INTERVAL", 30)),
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(creator=None, **options):
+    """
+    Replace the shared pool, e.g. with a sqlite3 or fake-driver creator.
+
+    Unspecified options fall back to the environment settings.
+    """
+    global _pool
+    config = pool_config_from_env()
+    config.update(options)
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(creator or _connect, **config)
+    if old is not None:
+        old.close()
+    return _pool
+
+
+def get_pool():
+    """
+    Return the shared connection pool, creating it on first use.
+
+    The thread that creates it also opens DB_POOL_MIN_SIZE connections,
+    under the development server as under gunicorn (where each worker
+    does so at startup, see app/lifecycle.py).
+    """
+    global _pool
+    pool = _pool
+    if pool is not None:
+        return pool
+    created = False
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(_connect, **pool_config_from_env())
+            created = True
+        pool = _pool
+    if created:
+        try:
+            pool.prefill()
+        except Exception as e:
+            # Not fatal: checkouts open connections on demand
+            log.error("opening database connections failed", extra={"error": str(e)})
+    return pool
+
+
+@contextmanager
+def get_connection(timeout=None):
+    """
+    Context manager yielding a pooled connection:
+
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            ...
+
+    Raises PoolTimeoutError (served as 503) if none frees up in time.
+    Inside a run_in() call the checkout also respects the call's deadline,
+    and the connection can be cancelled when the deadline passes.
+    Statements run through it are recorded in /metrics.
+    """
+    call = current_call()
+    if call is not None:
+        checkout = call.connection(get_pool(), timeout)
+    else:
+        checkout = get_pool().connection(timeout)
+    start = time.perf_counter()
+    with checkout as conn:
+        DB_ACQUIRE.observe(time.perf_counter() - start)
+        yield InstrumentedConnection(conn)
+
+
+def close_pool():
+    """
+    Close the shared pool; a new one is created on the next checkout.
+    """
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, None
+    if old is not None:
+        old.close()
@@ -0,0 +1,278 @@
+"""
+Bounded executors for blocking database calls.
+
+Every pymssql call blocks its thread for the whole round trip to SQL
+Server. Run straight on the request thread, one slow procedure
+(GetCommentsWithReacts, GetFileData) can hold every thread of a worker
+and stall cheap endpoints with it. Instead, DB functions are tagged with
+the class of work they belong to:
+
+    @run_in(listing_queries)
+    def get_files_from_db(...):
+        with get_connection() as conn:
+            ...
+
+and run on that class's own small thread pool. The request thread waits
+for the result, but only until the call's deadline, and only if the
+class has room. A class holds at most `workers` running calls plus
+`queue_depth` waiting ones; past that run_in raises
+ExecutorSaturatedError (served as 503 with Retry-After) right away. So a
+burst of heavy listings is shed before it can tie up the worker's
+threads, and lookups keep their own pool.
+
+When a call misses its deadline, QueryDeadlineError is raised (served as
+504). A call that has not started yet is dropped. A call already running
+has its query cancelled on the connection it checked out through
+get_connection(). Connections taken inside a call also use the remaining
+deadline as their pool checkout timeout.
+
+Calls made from inside an executor thread (a decorated function calling
+another) run inline, so a full pool never waits on itself. Calls see the
+caller's context variables, which is how Flask's current_app and request
+reach them.
+"""
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from app.Database.pool import PoolError
+from app.logs import get_logger
+
+log = get_logger(__name__)
+_local = threading.local()
+
+
+class ExecutorSaturatedError(PoolError):
+    """Raised when an executor class has no free worker and a full queue."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueryDeadlineError(PoolError):
+    """Raised when a call did not finish before its deadline."""
+
+
+def _cancel_connection(raw):
+    """Abort the statement running on `raw`, for the drivers that allow it."""
+    try:
+        if hasattr(raw, "_conn"):           # pymssql: dbcancel on the DB-Library handle
+            raw._conn.cancel()
+        elif hasattr(raw, "interrupt"):     # sqlite3
+            raw.interrupt()
+    except Exception as e:
+        log.warning("cancelling query failed", extra={"error": str(e)})
+
+
+class _Call:
+    """One submitted call: its deadline and the connection it has checked out."""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            raw = self._connection
+        if raw is not None:
+            _cancel_connection(raw)
+
+    @contextmanager
+    def connection(self, pool, timeout=None):
+        remaining = self.remaining()
+        if self.cancelled or remaining <= 0:
+            raise QueryDeadlineError("Deadline passed before a connection was checked out")
+        timeout = min(pool.timeout if timeout is None else timeout, remaining)
+        with pool.connection(timeout) as raw:
+            with self._lock:
+                self._connection = raw
+            try:
+                yield raw
+            finally:
+                with self._lock:
+                    self._connection = None
+
+
+def current_call():
+    """The executor call running on this thread, or None on request threads."""
+    return getattr(_local, "call", None)
+
+
+class QueryExecutor:
+    """
+    A thread pool for one class of database work, with a bound on the
+    calls it accepts and a default deadline per call.
+    """
+
+    def __init__(self, name, workers, queue_depth, deadline):
+        self.name = name
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.deadline = deadline
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._admitted = 0      # running + queued
+        self._running = 0
+        self._avg_runtime = 0.0
+        self._completed = 0
+        self._rejected = 0
+        self._deadline_misses = 0
+        self._cancelled_running = 0
+
+    def _get_executor(self):
+        # Created on first use, so no threads exist before gunicorn forks
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix=f"db-{self.name}")
+        return self._executor
+
+    def _retry_after(self):
+        # Seconds until the queue ahead of a new call has likely drained
+        backlog = (self.queue_depth + self.workers) / max(self.workers, 1)
+        return max(1, math.ceil(self._avg_runtime * backlog))
+
+    def run(self, fn, *args, deadline=None, **kwargs):
+        """Run fn(*args, **kwargs) on this executor and return its result."""
+        if current_call() is not None:
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            if self._admitted >= self.workers + self.queue_depth:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    f"Too many {self.name} queries in progress", self._retry_after()
+                )
+            self._admitted += 1
+            try:
+                executor = self._get_executor()
+            except BaseException:
+                self._admitted -= 1
+                raise
+
+        limit = self.deadline if deadline is None else deadline
+        call = _Call(time.monotonic() + limit)
+        try:
+            # Runs in a copy of the caller's context, so current_app and
+            # friends work in the executor thread as they do in the route
+            context = contextvars.copy_context()
+            future = executor.submit(context.run, self._execute, call, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+
+        try:
+            return future.result(timeout=max(0.0, call.remaining()))
+        except (FutureTimeoutError, CancelledError):
+            if future.done() and not future.cancelled():
+                return future.result()      # finished just as the wait ran out
+            if not future.cancel():
+                # Already running: stop the statement, the worker thread unwinds
+                call.cancel()
+                with self._lock:
+                    self._cancelled_running += 1
+            else:
+                with self._lock:
+                    self._admitted -= 1     # never started, _execute won't run
+            with self._lock:
+                self._deadline_misses += 1
+            raise QueryDeadlineError(f"{self.name} query did not finish within {limit:g}s")
+
+    def _execute(self, call, fn, args, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self._running += 1
+        _local.call = call
+        try:
+            if call.cancelled or call.remaining() <= 0:
+                raise QueryDeadlineError("Deadline passed while queued")
+            return fn(*args, **kwargs)
+        finally:
+            _local.call = None
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._admitted -= 1
+                self._completed += 1
+                self._avg_runtime += (elapsed - self._avg_runtime) * 0.1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "deadline": self.deadline,
+                "running": self._running,
+                "queued": self._admitted - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "deadline_misses": self._deadline_misses,
+                "cancelled_running": self._cancelled_running,
+                "avg_runtime_ms": round(self._avg_runtime * 1000.0, 1),
+            }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_in(executor):
+    """Decorator: calls to the function run on `executor` (see module doc)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return executor.run(fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Connections the executors leave to code that checks out on its own
+# thread: the reaction and download flushers, streamed listings and the
+# stats routes. Executor workers each hold at most one pooled connection,
+# so together they get DB_POOL_MAX_SIZE minus this headroom.
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+POOL_HEADROOM = int(os.environ.get("DB_EXEC_POOL_HEADROOM", max(3, POOL_MAX_SIZE // 4)))
+_executor_slots = max(2, POOL_MAX_SIZE - POOL_HEADROOM)
+
+# Heavy result sets behind the list endpoints (GetCommentsWithReacts,
+# GetFileData, GetAllUser, the rulebook) get 40% of those connections;
+# the short lookups and writes behind everything else get the rest.
+_listing_default = max(1, round(_executor_slots * 0.4))
+listing_queries = QueryExecutor(
+    "listing",
+    workers=int(os.environ.get("DB_EXEC_LISTING_WORKERS", _listing_default)),
+    queue_depth=int(os.environ.get("DB_EXEC_LISTING_QUEUE", 8)),
+    deadline=float(os.environ.get("DB_EXEC_LISTING_DEADLINE", 30)),
+)
+lookup_queries = QueryExecutor(
+    "lookup",
+    workers=int(os.environ.get("DB_EXEC_LOOKUP_WORKERS", max(1, _executor_slots - _listing_default))),
+    queue_depth=int(os.environ.get("DB_EXEC_LOOKUP_QUEUE", 32)),
+    deadline=float(os.environ.get("DB_EXEC_LOOKUP_DEADLINE", 10)),
+)
+
+EXECUTORS = (listing_queries, lookup_queries)
+
+if sum(executor.workers for executor in EXECUTORS) > POOL_MAX_SIZE - POOL_HEADROOM:
+    log.warning("DB executor workers leave less than DB_EXEC_POOL_HEADROOM connections free; "
+                "flushers and streamed responses may time out waiting for the pool", extra={
+                    "executor_workers": {executor.name: executor.workers for executor in EXECUTORS},
+                    "pool_max_size": POOL_MAX_SIZE,
+                    "headroom": POOL_HEADROOM,
+                })
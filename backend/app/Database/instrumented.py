@@ -0,0 +1,144 @@
+"""
+Connection and cursor wrappers that record every statement.
+
+get_connection() and connect_to_database() hand out an
+InstrumentedConnection; its cursors time each statement from execute()
+to the last fetch and count the rows fetched. A finished statement goes
+to the metrics (labelled by the stored procedure it runs,
+"santova.GetAllUser", or for plain SQL by verb and table, "SELECT
+santova.Company", so the label set stays small) and to the request's
+trace, the slow-query log and N+1 detection (app/tracing.py).
+"""
+import functools
+import re
+import time
+
+from app.metrics import DB_ERRORS, DB_ROWS, DB_STATEMENT
+from app.tracing import record_statement
+
+_EXEC = re.compile(r"\bEXEC(?:UTE)?\s+(?:@\w+\s*=\s*)?([\w.\[\]]+)", re.IGNORECASE)
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|MERGE)\s+([\w.\[\]]+)", re.IGNORECASE)
+_VERB = re.compile(r"\b(SELECT|INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+MAX_STATEMENT_LABELS = 200
+_labels_seen = set()
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_name(sql):
+    """Metric label for a SQL string: the procedure it executes, else verb + table."""
+    match = _EXEC.search(sql)
+    if match:
+        name = match.group(1).replace("[", "").replace("]", "")
+    else:
+        verb = _VERB.search(sql)
+        table = _TABLE.search(sql)
+        name = " ".join(part.group(1).upper() if part is verb else part.group(1)
+                        for part in (verb, table) if part) or "other"
+    if name not in _labels_seen:
+        if len(_labels_seen) >= MAX_STATEMENT_LABELS:
+            return "other"
+        _labels_seen.add(name)
+    return name
+
+
+class InstrumentedCursor:
+    __slots__ = ("_cursor", "_statement", "_sql", "_args", "_elapsed", "_rows", "_error")
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+        self._sql = None
+        self._args = ()
+        self._elapsed = 0.0
+        self._rows = 0
+        self._error = None
+
+    def _begin(self, sql, args):
+        self._finish()
+        self._statement = statement_name(sql)
+        self._sql = sql
+        self._args = args
+        self._elapsed = 0.0
+        self._rows = 0
+        self._error = None
+
+    def _finish(self):
+        if self._statement is not None:
+            DB_STATEMENT.observe(self._elapsed, self._statement)
+            if self._rows:
+                DB_ROWS.inc(self._statement, value=self._rows)
+            record_statement(self._statement, self._sql, self._args, self._elapsed, self._rows, self._error)
+            self._statement = None
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        except Exception as e:
+            if self._statement is not None:
+                DB_ERRORS.inc(self._statement)
+                self._error = type(e).__name__
+            raise
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def execute(self, operation, *args):
+        self._begin(operation, args)
+        return self._timed(self._cursor.execute, operation, *args)
+
+    def executemany(self, operation, *args):
+        self._begin(operation, ())     # shape of one row set is not interesting here
+        return self._timed(self._cursor.executemany, operation, *args)
+
+    def callproc(self, procname, *args):
+        self._begin("EXEC " + procname, args)
+        return self._timed(self._cursor.callproc, procname, *args)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed(self._cursor.fetchmany, *args)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def nextset(self):
+        return self._timed(self._cursor.nextset)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InstrumentedConnection:
+    __slots__ = ("_raw",)
+
+    def __init__(self, conn):
+        self._raw = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._raw.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolError(Exception):
+    """Base class for connection pool errors."""
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class PoolClosedError(PoolError):
+    """Raised when a connection is requested from a closed pool."""
+
+
+class _PooledConnection:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    `creator` is any zero-argument callable returning a DB-API connection
+    (pymssql.connect in production, sqlite3 or a fake driver elsewhere).
+    Connections idle longer than `ping_interval` seconds are health-checked
+    on checkout, and connections older than `max_lifetime` are recycled.
+    """
+
+    def __init__(self, creator, min_size=1, max_size=10, timeout=5.0,
+                 max_lifetime=1800.0, ping_interval=30.0, ping_query="SELECT 1"):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if min_size > max_size:
+            raise ValueError("min_size cannot be larger than max_size")
+
+        self._creator = creator
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.ping_query = ping_query
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0          # open connections, idle + in use + being created
+        self._in_use = 0
+        self._closed = False
+
+        # Metrics
+        self._created_total = 0
+        self._recent_creations = deque(maxlen=1000)
+        self._closed_total = 0
+        self._checkouts_total = 0
+        self._timeouts_total = 0
+        self._health_check_failures = 0
+        self._recycled_total = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+
+    def _acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosedError("Connection pool is closed")
+                    if self._idle:
+                        # LIFO keeps the hottest connections in use and lets
+                        # the rest age out through max_lifetime.
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts_total += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout:.1f}s waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+                self._in_use += 1
+
+            if create:
+                try:
+                    entry = _PooledConnection(self._creator())
+                except BaseException:
+                    self._forget(None)
+                    raise
+                with self._cond:
+                    self._created_total += 1
+                    self._recent_creations.append(entry.created_at)
+            elif not self._validate(entry):
+                self._forget(entry)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._checkouts_total += 1
+                self._wait_time_total += waited
+                if waited > self._wait_time_max:
+                    self._wait_time_max = waited
+            return entry
+
+    def _validate(self, entry):
+        now = time.monotonic()
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            with self._cond:
+                self._recycled_total += 1
+            return False
+        if self.ping_interval is not None and now - entry.last_used > self.ping_interval:
+            try:
+                cursor = entry.raw.cursor()
+                try:
+                    cursor.execute(self.ping_query)
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+            except Exception:
+                with self._cond:
+                    self._health_check_failures += 1
+                return False
+        return True
+
+    def _release(self, entry, discard=False):
+        if not discard:
+            # Reset on return: never hand an open transaction to the next user.
+            try:
+                entry.raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                pass
+            else:
+                entry.last_used = time.monotonic()
+                self._in_use -= 1
+                self._idle.append(entry)
+                self._cond.notify()
+                return
+        self._forget(entry)
+
+    def _forget(self, entry):
+        """Drop a checked-out slot, closing its connection if there is one."""
+        if entry is not None:
+            try:
+                entry.raw.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            if entry is not None:
+                self._closed_total += 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Check out a connection for the duration of a `with` block.
+
+        The connection is rolled back and returned to the pool on exit;
+        it is discarded instead if the rollback itself fails.
+        """
+        entry = self._acquire(timeout)
+        try:
+            yield entry.raw
+        finally:
+            self._release(entry)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def prefill(self):
+        """Open connections until `min_size` are available."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = _PooledConnection(self._creator())
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._created_total += 1
+                self._recent_creations.append(entry.created_at)
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def close(self):
+        """Close idle connections and refuse new checkouts.
+
+        Connections still checked out are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._closed_total += len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            try:
+                entry.raw.close()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        """Return a snapshot of the pool counters as a plain dict."""
+        now = time.monotonic()
+        with self._cond:
+            recent = sum(1 for t in self._recent_creations if now - t <= 60.0)
+            checkouts = self._checkouts_total
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "created_total": self._created_total,
+                "closed_total": self._closed_total,
+                "creation_rate_per_min": recent,
+                "checkouts_total": checkouts,
+                "timeouts_total": self._timeouts_total,
+                "health_check_failures": self._health_check_failures,
+                "recycled_total": self._recycled_total,
+                "wait_time_total": round(self._wait_time_total, 6),
+                "wait_time_avg": round(self._wait_time_total / checkouts, 6) if checkouts else 0.0,
+                "wait_time_max": round(self._wait_time_max, 6),
+            }
@@ -1,32 +1,122 @@
-from flask import Blueprint, jsonify
-from app.Database.connection import connect_to_database  # your existing DB connection function    C:\sapna\HybridWorkforce_Projects\santova2\backend\Database\connection.py
+from flask import Blueprint, jsonify, request
+from app.Database.connection import get_connection  # pooled DB connections
+from app.Database.pool import PoolError
+from app.Database.executor import listing_queries, run_in
+from app.serialization import rows_to_structs
+from app.compression import conditional_on
+from app.streaming import fetch_batches, prefetch, stream_format, stream_response
+from app.user_directory import UserDirectory
+from app.auth_middleware import token_required
+from app.logs import get_logger
 
 user_bp = Blueprint("user_bp", __name__)
+log = get_logger(__name__)
+
+
+@run_in(listing_queries)
+def get_users_from_db():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("EXEC santova.GetAllUser")
+            rows = cursor.fetchall()
+
+            # get column names
+            columns = [col[0] for col in cursor.description]
+
+            # One User record per row, no intermediate dicts
+            return rows_to_structs("User", columns, rows)
+        finally:
+            cursor.close()
+
+
+def stream_users_from_db():
+    """GetAllUser rows as batches of User records, read with fetchmany()."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("EXEC santova.GetAllUser")
+            columns = [col[0] for col in cursor.description]
+            for rows in fetch_batches(cursor):
+                yield rows_to_structs("User", columns, rows)
+        finally:
+            cursor.close()
+
+
+# Served from memory; GetAllUser runs at most every USER_DIRECTORY_TTL seconds
+user_directory = UserDirectory(get_users_from_db)
+
 
 @user_bp.route("/api/users", methods=["GET"])
 def get_all_users():
     """
     Fetch all users from santova.SantovaUser via stored procedure.
-    """
-    conn = connect_to_database()
-    cursor = conn.cursor()
 
+    ?stream=1 (or ndjson) streams {"success", "data"} straight from the
+    procedure instead of the cached directory.
+    """
+    fmt = stream_format()
+    if fmt:
+        return stream_response({"success": True}, "data", prefetch(stream_users_from_db()), fmt)
     try:
-        cursor.execute("EXEC santova.GetAllUser")
-        rows = cursor.fetchall()
+        cached = conditional_on(user_directory.epoch, user_directory.snapshot().version)
+        if cached is not None:
+            return cached
+        users, version = user_directory.all()
+        return jsonify({"success": True, "data": users, "version": version,
+                        "epoch": user_directory.epoch}), 200
+    except PoolError:
+        raise
+    except Exception as e:
+        log.exception("fetching users failed")
+        return jsonify({"success": False, "message": str(e)}), 500
 
-        # get column names
-        columns = [col[0] for col in cursor.description]
 
-        # convert each row to dict
-        users = [dict(zip(columns, row)) for row in rows]
+@user_bp.route("/api/users/search", methods=["GET"])
+@token_required
+def search_users(user_id, user_name):
+    """
+    Autocomplete for @mentions: ?q=<text>&limit=<n> (default 10, max 50).
+    Prefix matches on any name word or the e-mail come first, then
+    substring matches for queries of three or more characters.
+    """
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return jsonify({"success": False, "message": "limit must be an integer"}), 400
+    try:
+        cached = conditional_on(user_directory.epoch, user_directory.snapshot().version)
+        if cached is not None:
+            return cached
+        users, version = user_directory.search(request.args.get("q", ""), limit)
+        return jsonify({"success": True, "data": users, "version": version}), 200
+    except PoolError:
+        raise
+    except Exception as e:
+        log.exception("searching users failed")
+        return jsonify({"success": False, "message": str(e)}), 500
 
-        return jsonify({"success": True, "data": users}), 200
 
+@user_bp.route("/api/users/delta", methods=["GET"])
+@token_required
+def users_delta(user_id, user_name):
+    """
+    Users changed since ?since=<version> (from /api/users or an earlier
+    delta), plus the IDs of removed users. Pass ?epoch= as returned with
+    the version; "reset": true means reload /api/users in full.
+    """
+    try:
+        since = int(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"success": False, "message": "since must be an integer"}), 400
+    try:
+        cached = conditional_on(user_directory.epoch, user_directory.snapshot().version)
+        if cached is not None:
+            return cached
+        changes = user_directory.changes_since(since, request.args.get("epoch"))
+        return jsonify({"success": True, "data": changes.pop("users"), **changes}), 200
+    except PoolError:
+        raise
     except Exception as e:
-        print("Error fetching users:", e)
+        log.exception("fetching user changes failed")
         return jsonify({"success": False, "message": str(e)}), 500
-
-    finally:
-        cursor.close()
-        conn.close()
@@ -0,0 +1,206 @@
+import ipaddress
+import os
+
+
+def create_app():
+    """
+    Build the Flask application.
+
+    Used by app.py (development server) and by gunicorn.conf.py
+    ("app:create_app()"). Blueprints are imported here rather than at
+    module level so `import app.<module>` stays cheap and free of import
+    cycles, and so .env is loaded before modules read their settings.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app.logs import configure_logging
+    configure_logging()
+
+    from flask import Flask, Response, request, jsonify
+    from flask_cors import CORS
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from app.rulebook.rulebookendpoint import rulebook_blueprint
+    from app.file_management.uploadpopup_api import process_api
+    from app.auth import auth_bp
+    from app.file_management.file_management import file_bp
+    from app.file_management.upload_sessions import upload_session_bp
+    from app.discussion import discussion_bp, discussion_events
+    from app.User import user_bp
+    from app.Database import get_pool, PoolTimeoutError, ExecutorSaturatedError, QueryDeadlineError
+    from app.Database.executor import EXECUTORS
+    from app.auth_middleware import token_cache, token_required
+    from app.serialization import MsgspecJSONProvider
+    from app.compression import compressor
+    from app.metrics import metrics, registry
+    from app.tracing import tracing
+
+    app = Flask(__name__)
+
+    # Behind nginx every request comes from the proxy: take the client
+    # address (login throttling, logs) from the X-Forwarded-* headers the
+    # TRUSTED_PROXY_HOPS nearest proxies set. 0 trusts none of them, since
+    # clients that reach the app directly could forge the headers.
+    proxy_hops = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+    if proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops,
+                                x_host=proxy_hops, x_prefix=proxy_hops)
+
+    # Latency, status and size per route; first, so it sees the final response
+    metrics.init_app(app)
+    # Request IDs, slow-query log, N+1 detection, opt-in X-Debug-Trace
+    tracing.init_app(app)
+
+    # Struct payloads are encoded by msgspec; plain dicts still use the stdlib encoder
+    app.json = MsgspecJSONProvider(app)
+
+    # ✅ Secret key for JWT signing
+    app.secret_key = os.environ.get("SECRET_KEY")
+    if not app.secret_key:
+        raise RuntimeError("SECRET_KEY is not set! Set it as an environment variable.")
+
+    # Configure CORS for frontend origins
+    CORS(app, resources={
+        r"/*": {
+            "origins": [
+                "http://localhost:3000",
+                "http://127.0.0.1:3000",
+                "http://localhost:5173",
+                "http://localhost:8080",
+                "http://192.168.29.23:8080",
+                "https://icatui-b74o.onrender.com",
+                "https://newsantova.onrender.com",
+                "http://192.168.29.65:8080",
+                "http://172.25.224.1:8080/",
+                "http://172.23.208.1:8080/",
+                "https://orbis-demo.alphalogix.tech"
+            ],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Request-ID", "X-Debug-Trace"],
+            "expose_headers": ["X-Request-ID", "X-Debug-Trace"],
+            "supports_credentials": True
+        }
+    }, supports_credentials=True)
+
+    @app.after_request
+    def add_cors_headers(response):
+        origin = request.headers.get("Origin")
+        allowed_origins = [
+            "http://192.168.29.65:8080",
+            "http://localhost:8080",
+            "https://orbis-demo.alphalogix.tech",
+            "https://newsantova.onrender.com"
+        ]
+        if origin in allowed_origins:
+            response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Request-ID, X-Debug-Trace"
+        response.headers["Access-Control-Expose-Headers"] = "X-Request-ID, X-Debug-Trace"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+        return response
+
+    # ETags, 304s and gzip/br/zstd bodies for JSON responses (COMPRESS_* settings)
+    compressor.init_app(app)
+
+    # Pool exhausted: tell the client to retry instead of hanging the request
+    @app.errorhandler(PoolTimeoutError)
+    def handle_pool_timeout(e):
+        response = jsonify({"success": False, "message": "Database is busy, please retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+
+    # Too many queries of this class already running or queued: shed the request
+    @app.errorhandler(ExecutorSaturatedError)
+    def handle_executor_saturated(e):
+        response = jsonify({"success": False, "message": "Server is busy, please retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
+
+    # The query missed its deadline and was cancelled
+    @app.errorhandler(QueryDeadlineError)
+    def handle_query_deadline(e):
+        response = jsonify({"success": False, "message": "Database query timed out"})
+        response.status_code = 504
+        return response
+
+    # Point-in-time gauges read at scrape time
+    def collect_gauges():
+        pool = get_pool().stats()
+        executors = [executor.stats() | {"name": executor.name} for executor in EXECUTORS]
+        return [
+            ("orbis_db_pool_connections", "Open pooled connections by state.",
+             [({"state": "in_use"}, pool["in_use"]), ({"state": "idle"}, pool["idle"])]),
+            ("orbis_db_executor_calls", "Calls running or queued per DB executor class.",
+             [({"executor": e["name"], "state": state}, e[state]) for e in executors for state in ("running", "queued")]),
+            ("orbis_sse_clients", "Connected /api/discussion/stream clients.",
+             [({}, discussion_events.stats()["subscribers"])]),
+        ]
+    registry.set_collector("app", collect_gauges)
+
+    # Prometheus scrape endpoint (this worker's counters; see app/metrics.py).
+    # Open to scrapers in METRICS_ALLOW_FROM, otherwise a valid token is required
+    metrics_allow = [ipaddress.ip_network(net.strip(), strict=False)
+                     for net in os.environ.get("METRICS_ALLOW_FROM", "127.0.0.1,::1").split(",")
+                     if net.strip()]
+
+    def render_metrics(user_id=None, user_name=None):
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+    render_metrics_with_token = token_required(render_metrics)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        try:
+            client = ipaddress.ip_address(request.remote_addr or "")
+        except ValueError:
+            client = None
+        if client is not None and any(client in net for net in metrics_allow):
+            return render_metrics()
+        return render_metrics_with_token()
+
+    # Debug route for testing headers (optional)
+    @app.route("/api/debug-session")
+    def debug_session():
+        return jsonify({"message": "JWT mode active, session not used"})
+
+    # Connection pool metrics (in-use, idle, wait time, creation rate)
+    @app.route("/api/debug/db-pool")
+    @token_required
+    def debug_db_pool(user_id, user_name):
+        return jsonify(get_pool().stats())
+
+    # DB executor metrics per endpoint class (running, queued, rejected, deadline misses)
+    @app.route("/api/debug/db-executor")
+    @token_required
+    def debug_db_executor(user_id, user_name):
+        return jsonify({executor.name: executor.stats() for executor in EXECUTORS})
+
+    # Verified-token cache metrics (hits, misses, evictions)
+    @app.route("/api/debug/auth-cache")
+    @token_required
+    def debug_auth_cache(user_id, user_name):
+        return jsonify(token_cache.stats())
+
+    # Response compression metrics (codings, precompressed cache hits)
+    @app.route("/api/debug/compression")
+    @token_required
+    def debug_compression(user_id, user_name):
+        return jsonify(compressor.stats())
+
+    # Live discussion feed metrics (connected clients, buffered events, dropped slow clients)
+    @app.route("/api/debug/events")
+    @token_required
+    def debug_events(user_id, user_name):
+        return jsonify(discussion_events.stats())
+
+    # Register Blueprints
+    app.register_blueprint(rulebook_blueprint, url_prefix='/rulebook')
+    app.register_blueprint(process_api)
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(file_bp)
+    app.register_blueprint(upload_session_bp)
+    app.register_blueprint(discussion_bp)
+    app.register_blueprint(user_bp)
+
+    return app
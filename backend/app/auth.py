@@ -1,21 +1,83 @@
-from flask import Blueprint, request, jsonify, make_response, current_app
-from app.Database.connection import connect_to_database
+from flask import Blueprint, request, jsonify, make_response, current_app, g
+from app.Database.connection import get_connection
+from app.Database.pool import PoolError
+from app.Database.executor import lookup_queries, run_in
+from app.auth_middleware import token_required
+from app.rate_limit import per_minute
 import jwt
 import datetime
+import os
+from app.logs import get_logger
 
 auth_bp = Blueprint("auth", __name__)
+log = get_logger(__name__)
+
+TOKEN_LIFETIME = datetime.timedelta(hours=2)
+
+# Refreshing never extends a session past this long after the password login
+SESSION_MAX_AGE = datetime.timedelta(hours=float(os.environ.get("AUTH_SESSION_MAX_HOURS", 12)))
+
+# Checked before santova.checkLogin runs, so floods never reach the database
+login_ip_limiter = per_minute("LOGIN_RATE_PER_IP", 30, 10)
+login_account_limiter = per_minute("LOGIN_RATE_PER_ACCOUNT", 5, 5)
+
+
+def _encode_jwt(claims, orig_iat=None):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = dict(claims)
+    payload["exp"] = now + TOKEN_LIFETIME
+    payload["iat"] = now
+    payload["orig_iat"] = int((orig_iat or now).timestamp())
+    return jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
+
 
 def generate_jwt(user, company_ids):
-    payload = {
+    return _encode_jwt({
         "UserId": user.get("UserId"),
         "UserName": f"{user.get('FirstName')} {user.get('LastName')}".strip(),
         "RoleId": user.get("RoleId"),
         "CompanyIds": company_ids,  # pass all mapped company IDs
-        "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=2),
-        "iat": datetime.datetime.utcnow()
-    }
-    token = jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
-    return token
+    })
+
+
+def _too_many_attempts(retry_after):
+    response = jsonify({"message": "Too many login attempts, please try again later"})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+@run_in(lookup_queries)
+def check_login(email, password):
+    """
+    Runs santova.checkLogin. Returns (user row, company IDs, company names),
+    or None for bad credentials. The procedure returns one row per mapped
+    company; duplicates are folded in one pass, keeping first-seen order.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("EXEC santova.checkLogin @email=%s, @password=%s", (email, password))
+            rows = cursor.fetchall()
+            if not rows:
+                return None
+            columns = [column[0] for column in cursor.description]
+        finally:
+            cursor.close()
+
+    # Take the first row for basic user info
+    user = dict(zip(columns, rows[0]))
+
+    companies = {}
+    if "CompanyId" in columns:
+        id_index = columns.index("CompanyId")
+        name_index = columns.index("CompanyName") if "CompanyName" in columns else None
+        for row in rows:
+            company_id = row[id_index]
+            if company_id and company_id not in companies:
+                companies[company_id] = row[name_index] if name_index is not None else None
+
+    return user, list(companies), list(companies.values())
 
 @auth_bp.route("/login", methods=["POST"])
 def login():
@@ -26,28 +88,22 @@ def login():
     if not email or not password:
         return jsonify({"message": "Email and password required"}), 400
 
-    conn = connect_to_database()
-    cursor = conn.cursor()
+    ok, retry_after = login_ip_limiter.allow(request.remote_addr or "unknown")
+    if not ok:
+        return _too_many_attempts(retry_after)
+    account = email.strip().lower()
+    ok, retry_after = login_account_limiter.allow(account)
+    if not ok:
+        return _too_many_attempts(retry_after)
+
     try:
-        query = "EXEC santova.checkLogin @email=%s, @password=%s"
-        cursor.execute(query, (email, password))
-        rows = cursor.fetchall()
-        if not rows:
+        result = check_login(email, password)
+        if result is None:
             return jsonify({"message": "Invalid credentials"}), 401
+        user, company_ids, company_names = result
 
-        columns = [column[0] for column in cursor.description]
-
-        # Take the first row for basic user info
-        user = dict(zip(columns, rows[0]))
-
-        # Collect all mapped companies from returned rows
-        company_ids = []
-        company_names = []
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-            if row_dict.get("CompanyId") and row_dict["CompanyId"] not in company_ids:
-                company_ids.append(row_dict["CompanyId"])
-                company_names.append(row_dict.get("CompanyName"))
+        # A successful login gives the account its full allowance back
+        login_account_limiter.reset(account)
 
         token = generate_jwt(user, company_ids)
 
@@ -69,12 +125,33 @@ def login():
         }))
         return response
 
+    except PoolError:
+        raise
     except Exception as e:
-        print("Login error:", e)
+        log.exception("login failed")
         return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+@auth_bp.route("/refresh", methods=["POST"])
+@token_required
+def refresh(user_id, user_name):
+    """
+    Issues a fresh 2-hour token for a still-valid one, without a database
+    round trip. The claims are carried over as they are, and orig_iat keeps
+    the time of the password login so a session cannot be renewed past
+    AUTH_SESSION_MAX_HOURS.
+    """
+    principal = g.principal
+    if principal.session_started is None:
+        return jsonify({"message": "Session expired, please log in again"}), 401
+    started = datetime.datetime.fromtimestamp(principal.session_started, datetime.timezone.utc)
+    if datetime.datetime.now(datetime.timezone.utc) - started >= SESSION_MAX_AGE:
+        return jsonify({"message": "Session expired, please log in again"}), 401
+
+    token = _encode_jwt({
+        "UserId": principal.user_id,
+        "UserName": principal.user_name,
+        "RoleId": principal.role_id,
+        "CompanyIds": list(principal.company_ids),
+    }, orig_iat=started)
+    return jsonify({"message": "Token refreshed", "token": token})
@@ -1,36 +1,178 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from functools import wraps
 
+
+class Principal:
+    """The verified claims of a request's JWT, parsed once."""
+
+    __slots__ = ("user_id", "user_name", "role_id", "company_ids", "exp", "session_started")
+
+    def __init__(self, user_id, user_name, role_id, company_ids, exp, session_started=None):
+        self.user_id = user_id
+        self.user_name = user_name
+        self.role_id = role_id
+        self.company_ids = company_ids
+        self.exp = exp
+        # When the password login happened (refreshed tokens keep it)
+        self.session_started = session_started
+
+    @classmethod
+    def from_claims(cls, claims):
+        return cls(
+            claims.get("UserId"),
+            claims.get("UserName"),
+            claims.get("RoleId"),
+            tuple(claims.get("CompanyIds") or ()),
+            claims.get("exp"),
+            claims.get("orig_iat", claims.get("iat")),
+        )
+
+    def expired(self, now=None):
+        return self.exp is not None and (now or time.time()) >= self.exp
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens, keyed by the SHA-256 of the token.
+
+    An entry lives for at most `ttl` seconds and never past the token's
+    own `exp`, so a cached token expires exactly when jwt.decode would
+    start rejecting it. Only successfully verified tokens are stored.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        if max_size is None:
+            max_size = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+        if ttl is None:
+            ttl = float(os.environ.get("AUTH_TOKEN_CACHE_TTL", 300))
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # digest -> (principal, valid_until)
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    @staticmethod
+    def key(token, secret):
+        # The secret is part of the key: rotating SECRET_KEY invalidates everything
+        return hashlib.sha256(secret.encode("utf-8") + b"\0" + token.encode("utf-8")).digest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            principal, valid_until = entry
+            if now >= valid_until:
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return principal
+
+    def put(self, key, principal):
+        if self.max_size <= 0:
+            return
+        valid_until = time.time() + self.ttl
+        if principal.exp is not None:
+            valid_until = min(valid_until, principal.exp)
+        with self._lock:
+            self._entries[key] = (principal, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "expired": self._expired,
+                "evictions": self._evictions,
+            }
+
+
+token_cache = TokenCache()
+
+
+class AuthError(Exception):
+    """A request's token is missing or not acceptable."""
+
+
+def bearer_token():
+    """The raw token from the Authorization header, with or without "Bearer "."""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return None
+    if auth_header.startswith("Bearer "):
+        return auth_header.split(" ")[1]
+    return auth_header
+
+
+def verify_token(token):
+    """
+    Returns the Principal for `token`, from the cache when possible.
+    Raises AuthError with the client-facing message otherwise.
+    """
+    secret = current_app.config["SECRET_KEY"]
+    key = TokenCache.key(token, secret)
+    principal = token_cache.get(key)
+    if principal is not None:
+        return principal
+
+    try:
+        decoded = jwt.decode(token, secret, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        raise AuthError("Token expired!")
+    except jwt.InvalidTokenError:
+        raise AuthError("Invalid token!")
+
+    principal = Principal.from_claims(decoded)
+    if not principal.user_id:
+        raise AuthError("Invalid token: user_id missing")
+
+    token_cache.put(key, principal)
+    return principal
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-
-        # Get token from "Authorization" header
-        if "Authorization" in request.headers:
-            auth_header = request.headers["Authorization"]
-            if auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-            else:
-                token = auth_header
-
+        token = bearer_token()
         if not token:
             return jsonify({"message": "Token is missing!"}), 401
 
         try:
-            decoded = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-            user_id = decoded.get("UserId")
-            user_name = decoded.get("UserName")
-
-            if not user_id:
-                return jsonify({"message": "Invalid token: user_id missing"}), 401
+            principal = verify_token(token)
+        except AuthError as e:
+            return jsonify({"message": str(e)}), 401
 
-        except jwt.ExpiredSignatureError:
-            return jsonify({"message": "Token expired!"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"message": "Invalid token!"}), 401
+        # Full claims (RoleId, CompanyIds) for handlers that need them
+        g.principal = principal
 
         # Pass user info to the route
-        return f(user_id, user_name, *args, **kwargs)
+        return f(principal.user_id, principal.user_name, *args, **kwargs)
     return decorated
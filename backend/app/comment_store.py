@@ -0,0 +1,527 @@
+import base64
+import binascii
+import bisect
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+
+from app.serialization import CommentNode, RecordCache, comment_record
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor or sync token we cannot decode."""
+
+
+def encode_token(data):
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_token(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(data, dict):
+        raise InvalidCursor("Malformed cursor")
+    return data
+
+
+_MIN_DATE = datetime.datetime.min
+
+
+def _sort_key(comment):
+    return (comment["CreatedDate"] or _MIN_DATE, comment["CommentID"])
+
+
+def _fingerprint(comment):
+    return (
+        comment["CommentText"],
+        comment["ParentID"],
+        tuple((r["R_Id"], r["ReactionCount"]) for r in comment["Reactions"]),
+    )
+
+
+def _render_reactions(previous, counts, emoji_names):
+    """
+    Reactions list for `counts`, keeping the order of `previous`.
+    `emoji_names` is only called when a new R_Id has to be named.
+    """
+    reactions = []
+    for reaction in previous:
+        count = counts.get(reaction["R_Id"])
+        if count:
+            reactions.append({**reaction, "ReactionCount": count})
+    known = {r["R_Id"] for r in previous}
+    added = sorted(r for r in counts if r not in known)
+    names = emoji_names() if added else {}
+    for r_id in added:
+        reactions.append({
+            "R_Id": r_id,
+            "EmojiName": names.get(r_id) or "",
+            "ReactionCount": counts[r_id],
+        })
+    return reactions
+
+
+class _ThreadIndex:
+    """
+    Parent -> children index of one snapshot, built in O(n).
+
+    Children lists inherit the snapshot's (CreatedDate, CommentID) order.
+    Comments whose parent is missing are treated as roots.
+    """
+
+    __slots__ = ("roots", "root_keys", "children", "thread_sizes")
+
+    def __init__(self, snap):
+        children = {}
+        roots = []
+        for comment in snap.comments:
+            parent_id = comment["ParentID"]
+            if parent_id is not None and parent_id in snap.by_id and parent_id != comment["CommentID"]:
+                children.setdefault(parent_id, []).append(comment["CommentID"])
+            else:
+                roots.append(comment)
+
+        # Total replies below each comment, children before parents
+        thread_sizes = {}
+        visited = set()
+        for root in roots:
+            stack = [(root["CommentID"], False)]
+            while stack:
+                comment_id, expanded = stack.pop()
+                if expanded:
+                    thread_sizes[comment_id] = sum(
+                        1 + thread_sizes.get(child, 0) for child in children.get(comment_id, ())
+                    )
+                elif comment_id not in visited:
+                    visited.add(comment_id)
+                    stack.append((comment_id, True))
+                    stack.extend((child, False) for child in children.get(comment_id, ()))
+
+        self.roots = roots
+        self.root_keys = [_sort_key(c) for c in roots]
+        self.children = children
+        self.thread_sizes = thread_sizes
+
+
+class _Snapshot:
+    """
+    View of the comment set at one data version.
+
+    The ordering and the thread index never change; reaction updates swap
+    single comment dicts in place (copy-on-write) and bump `version`.
+    """
+
+    __slots__ = ("version", "load_started", "comments", "keys", "by_id", "_threads")
+
+    def __init__(self, version, comments, load_started=0.0):
+        self.version = version
+        self.load_started = load_started
+        self.comments = sorted(comments, key=_sort_key)
+        self.keys = [_sort_key(c) for c in self.comments]
+        self.by_id = {c["CommentID"]: c for c in self.comments}
+        self._threads = None
+
+    @property
+    def threads(self):
+        # Built once per data version, on first tree read
+        if self._threads is None:
+            self._threads = _ThreadIndex(self)
+        return self._threads
+
+
+class CommentStore:
+    """
+    In-process snapshot of santova.GetCommentsWithReacts.
+
+    The stored procedure only runs when the snapshot is invalidated by a
+    local write or is older than `ttl` seconds (writes made by other
+    processes). Reads are served from memory with keyset pagination over
+    (CreatedDate, CommentID).
+
+    Every reload is diffed against the previous snapshot: each new or
+    changed comment gets the next change sequence number, which is what
+    the opaque sync tokens of "since" mode refer to.
+    """
+
+    def __init__(self, loader, ttl=None, max_page_size=500, max_depth=50):
+        if ttl is None:
+            ttl = float(os.environ.get("COMMENTS_CACHE_TTL", 30))
+        self.ttl = ttl
+        self.max_page_size = max_page_size
+        self.max_depth = max_depth
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._new_epoch()
+        # Forked workers must not accept each other's tokens (see _new_epoch)
+        os.register_at_fork(after_in_child=self._new_epoch)
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._stale = True
+
+        self._seq = 0
+        self._fingerprints = {}     # CommentID -> fingerprint
+        self._comment_seq = {}      # CommentID -> seq of its last change
+        self._deleted_seq = {}      # CommentID -> seq it disappeared at
+        self._log_seqs = []         # change log, ascending seq
+        self._log_ids = []
+        self._reaction_counts = {}  # CommentID -> {R_Id: ReactionCount}
+        self._records = RecordCache(comment_record)
+
+    def _new_epoch(self):
+        # The epoch names this process's seq numbering. Workers forked from a
+        # preloaded master would otherwise share it while numbering changes
+        # independently, and read a sibling's sync token as a wrong delta;
+        # with their own epoch such a token is a reset instead.
+        self._epoch = uuid.uuid4().hex[:12]
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def invalidate(self):
+        """Force the next read to reload from the database."""
+        self._stale = True
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is None or self._stale or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                snap = self._snapshot
+                if snap is None or self._stale or time.monotonic() - self._loaded_at > self.ttl:
+                    snap = self._reload_locked()
+        return snap
+
+    def _reload_locked(self):
+        # Cleared before loading so a write racing the load re-invalidates
+        self._stale = False
+        load_started = time.monotonic()
+        try:
+            comments = self._loader()
+        except Exception:
+            self._stale = True
+            raise
+        self._apply_locked(comments, load_started)
+        self._loaded_at = time.monotonic()
+        return self._snapshot
+
+    def _apply_locked(self, comments, load_started=0.0):
+        """Diff `comments` against the last snapshot and publish them."""
+        # Reconciliation: counts come straight from the database again
+        self._reaction_counts = {
+            c["CommentID"]: {r["R_Id"]: r["ReactionCount"] for r in c["Reactions"]}
+            for c in comments if c["Reactions"]
+        }
+
+        fingerprints = {}
+        for comment in comments:
+            comment_id = comment["CommentID"]
+            fp = _fingerprint(comment)
+            fingerprints[comment_id] = fp
+            if self._fingerprints.get(comment_id) != fp:
+                self._record_locked(comment_id)
+                self._deleted_seq.pop(comment_id, None)
+
+        for comment_id in self._fingerprints.keys() - fingerprints.keys():
+            self._record_locked(comment_id)
+            self._deleted_seq[comment_id] = self._seq
+            self._comment_seq.pop(comment_id, None)
+
+        self._fingerprints = fingerprints
+        self._compact_log_locked()
+        self._records.clear()
+        self._snapshot = _Snapshot(self._seq, comments, load_started)
+
+    # ------------------------------------------------------------------
+    # Incremental reaction counts
+    # ------------------------------------------------------------------
+
+    def apply_reaction_deltas(self, deltas, emoji_names, committed_at):
+        """
+        Update cached reaction counts after a committed write.
+
+        deltas: [(CommentID, R_Id, +1 | -1), ...]
+        emoji_names: callable returning {R_Id: EmojiName}, only called
+            when a reaction is new to a comment
+        committed_at: time.monotonic() of the commit; deltas are skipped
+        when the snapshot was loaded after it (it already has them).
+
+        The periodic reload (ttl) reconciles any drift with the database.
+        """
+        with self._lock:
+            snap = self._snapshot
+            if snap is None or self._stale or snap.load_started >= committed_at:
+                return
+            touched = set()
+            for comment_id, r_id, delta in deltas:
+                if comment_id not in snap.by_id:
+                    continue    # unknown here yet; the next reload brings it
+                counts = self._reaction_counts.setdefault(comment_id, {})
+                count = counts.get(r_id, 0) + delta
+                if count > 0:
+                    counts[r_id] = count
+                else:
+                    counts.pop(r_id, None)
+                touched.add(comment_id)
+
+            for comment_id in touched:
+                comment = snap.by_id[comment_id]
+                reactions = _render_reactions(
+                    comment["Reactions"], self._reaction_counts.get(comment_id, {}), emoji_names
+                )
+                if reactions == comment["Reactions"]:
+                    continue    # toggles cancelled out
+                updated = dict(comment)
+                updated["Reactions"] = reactions
+                index = bisect.bisect_left(snap.keys, _sort_key(comment))
+                snap.comments[index] = updated
+                snap.by_id[comment_id] = updated
+                self._fingerprints[comment_id] = _fingerprint(updated)
+                self._record_locked(comment_id)
+            snap.version = self._seq
+
+    def reaction_counts(self, comment_id):
+        """Cached {R_Id: ReactionCount} for one comment."""
+        self.snapshot()
+        return dict(self._reaction_counts.get(comment_id, {}))
+
+    def _record_locked(self, comment_id):
+        self._seq += 1
+        self._comment_seq[comment_id] = self._seq
+        self._log_seqs.append(self._seq)
+        self._log_ids.append(comment_id)
+
+    def _compact_log_locked(self):
+        live = len(self._comment_seq) + len(self._deleted_seq)
+        if len(self._log_seqs) <= 2 * live + 64:
+            return
+        current = {**self._comment_seq, **self._deleted_seq}
+        entries = sorted((seq, cid) for cid, seq in current.items())
+        self._log_seqs = [seq for seq, _ in entries]
+        self._log_ids = [cid for _, cid in entries]
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def sync_token(self, snap=None):
+        snap = snap or self.snapshot()
+        return encode_token({"e": self._epoch, "s": snap.version})
+
+    def all(self):
+        snap = self.snapshot()
+        return snap.comments, self.sync_token(snap)
+
+    def page(self, cursor=None, limit=50, descending=False):
+        """
+        Return (comments, next_cursor, sync_token) for one keyset page.
+        `next_cursor` is None on the last page.
+        """
+        snap = self.snapshot()
+        items, next_cursor = self._keyset_slice(snap.comments, snap.keys, cursor, limit, descending)
+        return items, next_cursor, self.sync_token(snap)
+
+    def _keyset_slice(self, items, keys, cursor, limit, descending):
+        limit = max(1, min(limit, self.max_page_size))
+
+        if cursor:
+            data = decode_token(cursor)
+            try:
+                key = (
+                    datetime.datetime.fromisoformat(data["d"]) if data["d"] else _MIN_DATE,
+                    data["i"],
+                )
+            except (KeyError, TypeError, ValueError):
+                raise InvalidCursor("Malformed cursor")
+            if not isinstance(key[1], int):
+                raise InvalidCursor("Malformed cursor")
+            if descending:
+                end = bisect.bisect_left(keys, key)
+                start = max(0, end - limit)
+            else:
+                start = bisect.bisect_right(keys, key)
+                end = start + limit
+        elif descending:
+            end = len(items)
+            start = max(0, end - limit)
+        else:
+            start, end = 0, limit
+
+        page = items[start:end]
+        if descending:
+            page = page[::-1]
+            has_more = start > 0
+        else:
+            has_more = end < len(items)
+
+        next_cursor = None
+        if has_more and page:
+            last = page[-1]
+            created = last["CreatedDate"]
+            next_cursor = encode_token({
+                "d": created.isoformat() if created else None,
+                "i": last["CommentID"],
+            })
+        return page, next_cursor
+
+    # ------------------------------------------------------------------
+    # Threads
+    # ------------------------------------------------------------------
+
+    def records(self, comments):
+        """Serializable Comment Structs for comment dicts read from this store."""
+        return [self._records.get(c["CommentID"], c) for c in comments]
+
+    def _node(self, snap, comment, depth, seen=None):
+        """CommentNode for `comment` with replies down to `depth` levels."""
+        threads = snap.threads
+        comment_id = comment["CommentID"]
+        # ParentID cycles are unreachable from roots but not from thread()
+        seen = set() if seen is None else seen
+        seen.add(comment_id)
+        child_ids = [c for c in threads.children.get(comment_id, ()) if c not in seen]
+        if depth is not None and depth <= 0:
+            replies = []
+            has_more = bool(child_ids)
+        else:
+            next_depth = None if depth is None else depth - 1
+            replies = [self._node(snap, snap.by_id[c], next_depth, seen) for c in child_ids]
+            has_more = False
+        record = self._records.get(comment_id, comment)
+        return CommentNode(
+            record.CommentID, record.CommentText, record.UserID, record.UserName,
+            record.CreatedDate, record.ParentID, record.Reactions,
+            ReplyCount=len(child_ids),
+            ThreadReplyCount=threads.thread_sizes.get(comment_id, 0),
+            Replies=replies,
+            HasMoreReplies=has_more,
+        )
+
+    def tree(self, cursor=None, limit=None, descending=False, depth=None):
+        """
+        Return (threads, next_cursor, sync_token): root comments with nested
+        replies. Roots are keyset-paged when `cursor` or `limit` is given.
+        """
+        depth = self.max_depth if depth is None else min(depth, self.max_depth)
+        snap = self.snapshot()
+        threads = snap.threads
+        if cursor or limit:
+            roots, next_cursor = self._keyset_slice(
+                threads.roots, threads.root_keys, cursor, limit or self.max_page_size, descending
+            )
+        else:
+            roots = threads.roots[::-1] if descending else threads.roots
+            next_cursor = None
+        # Root dicts may predate a reaction update; render the current ones
+        nodes = [self._node(snap, snap.by_id[root["CommentID"]], depth) for root in roots]
+        return nodes, next_cursor, self.sync_token(snap)
+
+    def thread(self, comment_id, depth=None):
+        """
+        Return the subtree rooted at `comment_id`, or None if it is unknown.
+        """
+        depth = self.max_depth if depth is None else min(depth, self.max_depth)
+        snap = self.snapshot()
+        comment = snap.by_id.get(comment_id)
+        if comment is None:
+            return None
+        return self._node(snap, comment, depth)
+
+    def changes_since(self, token, limit=None):
+        """
+        Return comments added or changed after `token` (a sync token).
+
+        Result dict: comments, deleted (IDs), sync_token, has_more and
+        reset. `reset` is True when the token came from another process
+        or an older server start; the client should reload in full.
+        """
+        data = decode_token(token)
+        limit = max(1, min(limit or self.max_page_size, self.max_page_size))
+        snap = self.snapshot()
+
+        since = data.get("s")
+        if data.get("e") != self._epoch or not isinstance(since, int) or since > snap.version:
+            return {
+                "comments": [],
+                "deleted": [],
+                "sync_token": self.sync_token(snap),
+                "has_more": False,
+                "reset": True,
+            }
+
+        with self._lock:
+            start = bisect.bisect_right(self._log_seqs, since)
+            entries = list(zip(self._log_seqs[start:], self._log_ids[start:]))
+            current = {**self._comment_seq, **self._deleted_seq}
+
+        comments, deleted = [], []
+        last_seq = since
+        for seq, comment_id in entries:
+            if seq > snap.version:
+                break
+            if current.get(comment_id) != seq:
+                continue    # superseded by a later change
+            if len(comments) + len(deleted) >= limit:
+                return {
+                    "comments": comments,
+                    "deleted": deleted,
+                    "sync_token": encode_token({"e": self._epoch, "s": last_seq}),
+                    "has_more": True,
+                    "reset": False,
+                }
+            comment = snap.by_id.get(comment_id)
+            if comment is None:
+                deleted.append(comment_id)
+            else:
+                comments.append(comment)
+            last_seq = seq
+
+        return {
+            "comments": comments,
+            "deleted": deleted,
+            "sync_token": self.sync_token(snap),
+            "has_more": False,
+            "reset": False,
+        }
+
+
+class EmojiCatalog:
+    """
+    The reaction (emoji) list, loaded once and served from memory.
+    `ttl` (seconds) bounds how long an edited catalog can go unnoticed.
+    """
+
+    def __init__(self, loader, ttl=None):
+        if ttl is None:
+            ttl = float(os.environ.get("EMOJI_CATALOG_TTL", 3600))
+        self.ttl = ttl
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._emojis = None
+        self._names = {}
+        self._loaded_at = 0.0
+
+    def all(self):
+        emojis = self._emojis
+        if emojis is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._emojis is None or time.monotonic() - self._loaded_at > self.ttl:
+                    emojis = self._loader()
+                    self._names = {e.R_Id: e.EmojiName for e in emojis}
+                    self._emojis = emojis
+                    self._loaded_at = time.monotonic()
+                emojis = self._emojis
+        return emojis
+
+    def names(self):
+        self.all()
+        return self._names
+
+    def invalidate(self):
+        self._emojis = None
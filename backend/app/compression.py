@@ -0,0 +1,265 @@
+"""
+Response compression and conditional GETs for the JSON API.
+
+Compressor.init_app(app) adds an after_request hook that, for successful
+GET/HEAD responses with a buffered, compressible body:
+
+  - gives the response a strong ETag: the one the view set, one derived
+    from the data version of the cache behind it (conditional_on()), or
+    a hash of the body;
+  - answers a matching If-None-Match with 304 and no body;
+  - compresses bodies of at least COMPRESS_MIN_SIZE bytes with the best
+    coding the client accepts: br (needs the brotli package), zstd
+    (zstandard package, or compression.zstd on Python 3.14+) or gzip.
+
+Each content-coding is a separate representation, so it gets its own
+strong ETag ("<tag>-gz", "-br", "-zst"); If-None-Match accepts any of
+them. Compressed bodies are kept in a byte-bounded LRU keyed by ETag and
+coding, so a hot payload (the comment feed between two polls) is only
+compressed once. Streamed responses and file downloads are left alone.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, request
+from werkzeug.http import unquote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    try:
+        from compression import zstd as _stdlib_zstd
+    except ImportError:
+        _stdlib_zstd = None
+else:
+    _stdlib_zstd = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+_ETAG_SUFFIXES = {"gzip": "-gz", "br": "-br", "zstd": "-zst"}
+
+
+def _codecs(level):
+    """coding -> compress function, in server preference order."""
+    codecs = OrderedDict()
+    if brotli is not None:
+        codecs["br"] = lambda data: brotli.compress(data, quality=min(level, 11))
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=level)
+        lock = threading.Lock()     # ZstdCompressor objects are not thread-safe
+
+        def zstd_compress(data):
+            with lock:
+                return compressor.compress(data)
+        codecs["zstd"] = zstd_compress
+    elif _stdlib_zstd is not None:
+        codecs["zstd"] = lambda data: _stdlib_zstd.compress(data, level=level)
+    codecs["gzip"] = lambda data: gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+    return codecs
+
+
+def versioned_etag(*parts):
+    """
+    Strong ETag for a response that is fully determined by `parts` (data
+    version, epoch, ...) and the request's path and query string. Lets a
+    route answer 304 without building the body; see not_modified().
+    """
+    digest = hashlib.sha1()
+    for part in (request.path, request.query_string, *parts):
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _client_etags():
+    """{base ETag: tag as sent} from If-None-Match, coding suffixes removed."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return {}
+    if header.strip() == "*":
+        return {"*": "*"}
+    tags = {}
+    for raw in header.split(","):
+        sent, weak = unquote_etag(raw.strip())
+        if sent is None:
+            continue
+        tag = sent
+        for suffix in _ETAG_SUFFIXES.values():
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)]
+                break
+        tags[tag] = sent
+    return tags
+
+
+def etag_matches(etag):
+    tags = _client_etags()
+    return "*" in tags or etag in tags
+
+
+def not_modified(etag):
+    """True when the client already holds the representation tagged `etag`."""
+    return request.method in ("GET", "HEAD") and etag_matches(etag)
+
+
+def not_modified_response(etag):
+    """304 for not_modified(etag), echoing the representation's tag."""
+    sent = _client_etags().get(etag, etag)
+    response = current_app.response_class(status=304)
+    response.set_etag(sent)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def conditional_on(*parts):
+    """
+    For views backed by a versioned cache: returns a 304 response when the
+    client's copy is current, else None, and remembers the ETag so the
+    response built next is tagged without hashing its body.
+    """
+    etag = versioned_etag(*parts)
+    if not_modified(etag):
+        return not_modified_response(etag)
+    g.data_etag = etag
+    return None
+
+
+class _CompressedCache:
+    """Byte-bounded LRU of (etag, coding) -> compressed body."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes // 4:
+            return      # one huge body would flush everything else
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+class Compressor:
+    """The after_request middleware; one shared instance, `compressor`."""
+
+    def __init__(self, min_size=None, level=None, cache_mb=None):
+        if min_size is None:
+            min_size = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+        if level is None:
+            level = int(os.environ.get("COMPRESS_LEVEL", 6))
+        if cache_mb is None:
+            cache_mb = float(os.environ.get("COMPRESS_CACHE_MB", 32))
+        self.min_size = min_size
+        self.level = level
+        self.codecs = _codecs(level)
+        self.cache = _CompressedCache(int(cache_mb * 1024 * 1024))
+        self._compressed = 0
+        self._not_modified = 0
+
+    def init_app(self, app):
+        app.after_request(self.process_response)
+
+    def _choose_coding(self):
+        accepted = request.accept_encodings
+        best, best_q = None, 0
+        for coding in self.codecs:
+            q = accepted[coding]
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def process_response(self, response):
+        if response.status_code == 304:
+            self._not_modified += 1     # answered by the view itself
+            return response
+        if (request.method not in ("GET", "HEAD") or response.status_code != 200
+                or response.is_streamed or response.direct_passthrough
+                or "Content-Encoding" in response.headers):
+            return response
+        mimetype = response.mimetype or ""
+        if not (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        etag, weak = response.get_etag()
+        if etag is None or weak:
+            etag = g.get("data_etag") or hashlib.sha1(response.get_data()).hexdigest()
+        response.headers.setdefault("Cache-Control", "private, no-cache")
+        response.vary.add("Accept-Encoding")
+
+        body = response.get_data()
+        coding = self._choose_coding() if len(body) >= self.min_size else None
+
+        if etag_matches(etag):
+            self._not_modified += 1
+            response.set_etag(etag + _ETAG_SUFFIXES[coding] if coding else etag)
+            response.status_code = 304
+            response.set_data(b"")
+            response.headers.pop("Content-Length", None)
+            return response
+
+        if coding is None:
+            response.set_etag(etag)
+            return response
+
+        key = (etag, coding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self.codecs[coding](body)
+            self.cache.put(key, compressed)
+        self._compressed += 1
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = coding
+        response.set_etag(etag + _ETAG_SUFFIXES[coding])
+        return response
+
+    def stats(self):
+        return {
+            "codings": list(self.codecs),
+            "min_size": self.min_size,
+            "level": self.level,
+            "compressed_responses": self._compressed,
+            "not_modified": self._not_modified,
+            "cache": self.cache.stats(),
+        }
+
+
+compressor = Compressor()
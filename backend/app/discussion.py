@@ -1,48 +1,70 @@
-from flask import Blueprint, request, jsonify
-from app.Database.connection import connect_to_database
+from flask import Blueprint, Response, request, jsonify, g
+from app.Database.connection import get_connection
+from app.Database.pool import PoolError
+from app.Database.executor import listing_queries, lookup_queries, run_in
 from app.auth_middleware import token_required  # ✅ use JWT for authentication
+from app.comment_store import CommentStore, EmojiCatalog, InvalidCursor
+from app.serialization import Emoji
+from app.compression import conditional_on
+from app.event_bus import EventBus, sse_stream
+from app.streaming import batched, stream_format, stream_response
+from app.reaction_queue import ReactionQueue, ADD, REMOVE, ADDED, DELETED, NO_MATCH, DURABILITY_ASYNC
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import atexit
 import json
+import os
+import time
+from app.logs import get_logger
 
 # Create blueprint for discussion routes
 discussion_bp = Blueprint("discussion_bp", __name__)
+log = get_logger(__name__)
 
+COMMENTS_PAGE_SIZE = int(os.environ.get("COMMENTS_PAGE_SIZE", 50))
 
+# Live feed for /api/discussion/stream (SSE_HISTORY, SSE_QUEUE_SIZE, SSE_MAX_CLIENTS)
+discussion_events = EventBus()
+atexit.register(discussion_events.close)
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15))
+
+
+@run_in(lookup_queries)
 def insert_comment(user_id, comment_text, parent_id=None, mentioned_user_ids=None):
     """
     Calls santova.InsertComment stored procedure.
     Supports optional mentions via JSON array.
     """
-    conn = connect_to_database()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    try:
-        mentioned_json = json.dumps(mentioned_user_ids) if mentioned_user_ids else None
-
-        sql = """
-        DECLARE @NewCommentID INT;
-        EXEC santova.InsertComment
-            @UserID = %s,
-            @ParentID = %s,
-            @CommentText = %s,
-            @MentionedUserIDs = %s,
-            @NewCommentID = @NewCommentID OUTPUT;
-        SELECT @NewCommentID AS NewCommentID;
-        """
-
-        cursor.execute(sql, (user_id, parent_id, comment_text, mentioned_json))
-        result = cursor.fetchone()
-        new_comment_id = result[0] if result else None
-
-        conn.commit()
-        return True, new_comment_id
+        try:
+            mentioned_json = json.dumps(mentioned_user_ids) if mentioned_user_ids else None
 
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
+            sql = """
+            DECLARE @NewCommentID INT;
+            EXEC santova.InsertComment
+                @UserID = %s,
+                @ParentID = %s,
+                @CommentText = %s,
+                @MentionedUserIDs = %s,
+                @NewCommentID = @NewCommentID OUTPUT;
+            SELECT @NewCommentID AS NewCommentID;
+            """
+
+            cursor.execute(sql, (user_id, parent_id, comment_text, mentioned_json))
+            result = cursor.fetchone()
+            new_comment_id = result[0] if result else None
+
+            conn.commit()
+            comment_store.invalidate()
+            return True, new_comment_id
+
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
 
-    finally:
-        cursor.close()
-        conn.close()
+        finally:
+            cursor.close()
 
 
 @discussion_bp.route("/api/add-comment", methods=["POST"])
@@ -53,7 +75,7 @@ def add_comment(user_id, user_name):
     JWT provides user_id and user_name.
     """
     data = request.json
-    print("💡 Incoming payload:", data)
+    log.debug("add-comment payload", extra={"user_id": user_id, "keys": sorted(data or {}), "sample": 0.01})
     comment_text = data.get("CommentText")
     parent_id = data.get("ParentID")
     if parent_id:
@@ -72,95 +94,230 @@ def add_comment(user_id, user_name):
     success, result = insert_comment(user_id, comment_text, parent_id, mentioned_user_ids)
 
     if success:
-        return jsonify({
-            "success": True,
+        comment = {
             "CommentID": result,
             "UserID": user_id,
             "UserName": user_name,
             "ParentID": parent_id,
             "CommentText": comment_text,
             "MentionedUserIDs": mentioned_user_ids or []
-        }), 200
+        }
+        discussion_events.publish("comment", comment)
+        return jsonify({"success": True, **comment}), 200
     else:
         return jsonify({"success": False, "message": result}), 500
 
 
+@run_in(listing_queries)
 def get_comments_with_reacts():
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("EXEC santova.GetCommentsWithReacts")
-        results = cursor.fetchall()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("EXEC santova.GetCommentsWithReacts")
+            results = cursor.fetchall()
+
+            comments_dict = {}
+
+            for row in results:
+                comment_id = row[0]
+                comment_text = row[1] or ""
+                user_id = row[2]
+                user_name = row[3] or "Unknown User"
+                created_date = row[4]
+                parent_id = row[5]
+                r_id = row[6]  # can be None
+                emoji_name = row[7] or ""
+                reaction_count = row[8] or 0
+
+                if comment_id not in comments_dict:
+                    comments_dict[comment_id] = {
+                        "CommentID": comment_id,
+                        "CommentText": comment_text,
+                        "UserID": user_id,
+                        "UserName": user_name,
+                        "CreatedDate": created_date,
+                        "ParentID": parent_id,
+                        "Reactions": [],
+                    }
+
+                if r_id:
+                    comments_dict[comment_id]["Reactions"].append({
+                        "R_Id": r_id,
+                        "EmojiName": emoji_name,
+                        "ReactionCount": reaction_count,
+                    })
+
+            return list(comments_dict.values())
+
+        finally:
+            cursor.close()
+
+
+# Shared in-memory snapshot of the feed. New comments invalidate it; reaction
+# writes adjust its cached counts in place.
+comment_store = CommentStore(get_comments_with_reacts)
 
-        comments_dict = {}
 
-        for row in results:
-            comment_id = row[0]
-            comment_text = row[1] or ""
-            user_id = row[2]
-            user_name = row[3] or "Unknown User"
-            created_date = row[4]
-            parent_id = row[5]
-            r_id = row[6]  # can be None
-            emoji_name = row[7] or ""
-            reaction_count = row[8] or 0
+@discussion_bp.route("/api/get-comments", methods=["GET"])
+@token_required
+def get_comments_route(user_id, user_name):
+    """
+    Without parameters returns every comment, as before.
+
+    Query params:
+      limit, cursor   keyset page over (CreatedDate, CommentID); pass the
+                      returned next_cursor to get the following page
+      order           "asc" (default) or "desc"
+      since           sync_token from a previous response; returns only
+                      comments added/changed (and IDs deleted) after it
+      view            "tree" returns root comments with nested Replies,
+                      ReplyCount and ThreadReplyCount; limit/cursor then
+                      page over root comments
+      depth           reply levels to include in tree view
+      stream          "1" or "ndjson": stream the full list (no other
+                      parameters) in chunks, same envelope
+    """
+    since = request.args.get("since")
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit")
+    depth = request.args.get("depth")
+    try:
+        limit = int(limit) if limit else None
+        depth = int(depth) if depth else None
+    except ValueError:
+        return jsonify({"success": False, "error": "limit and depth must be numeric"}), 400
 
-            if comment_id not in comments_dict:
-                comments_dict[comment_id] = {
-                    "CommentID": comment_id,
-                    "CommentText": comment_text,
-                    "UserID": user_id,
-                    "UserName": user_name,
-                    "CreatedDate": created_date,
-                    "ParentID": parent_id,
-                    "Reactions": [],
-                }
+    try:
+        if not request.args.get("stream"):
+            cached = conditional_on(comment_store.sync_token())
+            if cached is not None:
+                return cached
+
+        if since:
+            changes = comment_store.changes_since(since, limit)
+            return jsonify({
+                "success": True,
+                "data": comment_store.records(changes["comments"]),
+                "deleted": changes["deleted"],
+                "sync_token": changes["sync_token"],
+                "has_more": changes["has_more"],
+                "reset": changes["reset"],
+            })
+
+        descending = request.args.get("order", "asc").lower() == "desc"
+        if request.args.get("view") == "tree":
+            data, next_cursor, sync_token = comment_store.tree(cursor, limit, descending, depth)
+            return jsonify({
+                "success": True,
+                "data": data,
+                "next_cursor": next_cursor,
+                "sync_token": sync_token,
+            })
+
+        if cursor or limit:
+            data, next_cursor, sync_token = comment_store.page(
+                cursor, limit or COMMENTS_PAGE_SIZE, descending
+            )
+            return jsonify({
+                "success": True,
+                "data": comment_store.records(data),
+                "next_cursor": next_cursor,
+                "sync_token": sync_token,
+            })
+
+        data, sync_token = comment_store.all()
+        fmt = stream_format()
+        if fmt:
+            batches = (comment_store.records(batch) for batch in batched(data))
+            return stream_response({"success": True, "sync_token": sync_token}, "data", batches, fmt)
+        return jsonify({"success": True, "data": comment_store.records(data), "sync_token": sync_token})
+    except InvalidCursor as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except PoolError:
+        raise
+    except Exception as e:
+        log.exception("fetching comments failed")
+        return jsonify({"success": False, "error": str(e)}), 500
 
-            if r_id:
-                comments_dict[comment_id]["Reactions"].append({
-                    "R_Id": r_id,
-                    "EmojiName": emoji_name,
-                    "ReactionCount": reaction_count,
-                })
 
-        return list(comments_dict.values())
 
-    finally:
-        cursor.close()
-        conn.close()
+@discussion_bp.route("/api/comments/<int:comment_id>/thread", methods=["GET"])
+@token_required
+def get_comment_thread_route(user_id, user_name, comment_id):
+    """
+    Returns one comment with its nested replies.
+    Optional ?depth=N limits how many reply levels are included.
+    """
+    depth = request.args.get("depth")
+    try:
+        depth = int(depth) if depth else None
+    except ValueError:
+        return jsonify({"success": False, "error": "depth must be numeric"}), 400
 
+    try:
+        cached = conditional_on(comment_store.sync_token())
+        if cached is not None:
+            return cached
+        thread = comment_store.thread(comment_id, depth)
+    except PoolError:
+        raise
+    except Exception as e:
+        log.exception("fetching comment thread failed")
+        return jsonify({"success": False, "error": str(e)}), 500
 
+    if thread is None:
+        return jsonify({"success": False, "error": "Comment not found"}), 404
+    return jsonify({"success": True, "data": thread})
 
 
-@discussion_bp.route("/api/get-comments", methods=["GET"])
+@discussion_bp.route("/api/discussion/stream", methods=["GET"])
 @token_required
-def get_comments_route(user_id, user_name):
-    try:
-        data = get_comments_with_reacts()
-        return jsonify({"success": True, "data": data})
-    except Exception as e:
-        import traceback
-        print("Error fetching comments:", str(e))
-        traceback.print_exc()
-        return jsonify({"success": False, "error": str(e)}), 500
+def discussion_stream_route(user_id, user_name):
+    """
+    Server-Sent Events feed of discussion activity:
+
+        event: comment    data: the add-comment response fields
+        event: reaction   data: {"CommentID": 1, "Changes": [{"R_Id": 2, "Delta": 1}]}
+        event: reset      the client missed events no longer buffered; reload the feed
+
+    Events come from the in-process bus, never from the database, so idle
+    viewers cost nothing but their connection. Reconnects resume after the
+    Last-Event-ID header (or ?lastEventId=). The browser EventSource cannot
+    send the Authorization header, so clients use a fetch-based EventSource.
+    The stream ends when the token expires; the client reconnects with a
+    refreshed one.
+    """
+    if discussion_events.full():
+        response = jsonify({"success": False, "message": "Too many live connections, retry later"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    body = sse_stream(discussion_events, last_event_id, SSE_HEARTBEAT, deadline=g.principal.exp)
+    response = Response(body, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"    # let nginx pass events through
+    return response
 
 
 # Get All React List
+@run_in(lookup_queries)
 def get_all_emojis():
     """
     Fetch all emojis from santova.Reacts using GetAllReacts SP.
     """
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    try:
-        # Execute stored procedure
-        cursor.execute("EXEC santova.GetAllReacts")
-        results = cursor.fetchall()
-        # Convert to list of dicts
-        return [{"R_Id": row[0], "EmojiName": row[1]} for row in results]
-    finally:
-        cursor.close()
-        conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Execute stored procedure
+            cursor.execute("EXEC santova.GetAllReacts")
+            results = cursor.fetchall()
+            return [Emoji(row[0], row[1]) for row in results]
+        finally:
+            cursor.close()
+
+# The emoji list barely changes; load it once (EMOJI_CATALOG_TTL)
+emoji_catalog = EmojiCatalog(get_all_emojis)
 
 @discussion_bp.route("/api/get-all-reacts", methods=["GET"])
 @token_required
@@ -168,31 +325,11 @@ def get_all_reacts_route(user_id, user_name):
     """
     API to get the list of all emojis (React list)
     """
-    data = get_all_emojis()
+    data = emoji_catalog.all()
     return jsonify({"success": True, "data": data})
 
 
 
-def insert_reaction(comment_id, user_id, r_id):
-    """
-    Inserts a reaction for a comment by a user.
-    """
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "EXEC santova.InsertCmtReaction @CommentID=%s, @UserID=%s, @R_Id=%s",
-            (comment_id, user_id, r_id)
-        )
-        conn.commit()
-        return True, "Reaction added successfully."
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
-    finally:
-        cursor.close()
-        conn.close()
-
 # insert mapped reaction count per count
 @discussion_bp.route("/api/react-comment", methods=["POST"])
 @token_required
@@ -207,45 +344,151 @@ def react_comment_route(user_id, user_name):
     if not comment_id or not r_id:
         return jsonify({"success": False, "message": "CommentID and R_Id are required"}), 400
 
-    success, message = insert_reaction(comment_id, user_id, r_id)
-    if success:
-        return jsonify({"success": True, "message": message})
-    else:
-        return jsonify({"success": False, "message": message}), 500
+    return _queue_reaction(ADD, comment_id, user_id, r_id, 500)
+
+
+def apply_reaction_batch(ops):
+    """
+    Applies coalesced reaction toggles, in order, in a single transaction.
+    ops: [(op, (CommentID, UserID, R_Id)), ...]
+    Returns [(success, message), ...], one per op.
 
-def delete_reaction(comment_id, user_id, r_id):
+    If the batch fails, every toggle is retried in its own transaction so
+    one bad row cannot fail the others.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            try:
+                results, deltas = _apply_reactions(cursor, ops)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                results, deltas = [], []
+                for op in ops:
+                    try:
+                        op_results, op_deltas = _apply_reactions(cursor, [op])
+                        conn.commit()
+                        results.extend(op_results)
+                        deltas.extend(op_deltas)
+                    except Exception as e:
+                        conn.rollback()
+                        results.append((False, str(e)))
+        finally:
+            cursor.close()
+
+    _publish_reaction_deltas(deltas)
+    return results
+
+
+def _publish_reaction_deltas(deltas):
     """
-    Deletes a user's specific emoji reaction from a comment.
-    Only the same user who reacted can remove it.
+    Applies committed count changes to the cached feed instead of
+    reloading it; the periodic reload (COMMENTS_CACHE_TTL) reconciles.
+    Must be called after the connection has gone back to the pool.
     """
-    conn = connect_to_database()
-    cursor = conn.cursor()
+    if deltas:
+        comment_store.apply_reaction_deltas(deltas, _emoji_names, time.monotonic())
+
+        # One event per comment, after the commit (also for queued toggles)
+        changes = {}
+        for comment_id, r_id, delta in deltas:
+            changes.setdefault(comment_id, []).append({"R_Id": r_id, "Delta": delta})
+        for comment_id, comment_changes in changes.items():
+            discussion_events.publish("reaction", {"CommentID": comment_id, "Changes": comment_changes})
+
+
+def _emoji_names():
     try:
-        # Check first if this reaction exists and belongs to the same user
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM santova.UserReactMapping 
-            WHERE CommentID = %s AND UserID = %s AND R_Id = %s
-        """, (comment_id, user_id, r_id))
-        count = cursor.fetchone()[0]
-
-        if count == 0:
-            return False, "No matching reaction found for this user."
-
-        # ✅ Execute delete SP
-        cursor.execute(
-            "EXEC santova.DeleteReact @CommentID=%s, @UserID=%s, @R_Id=%s",
-            (comment_id, user_id, r_id)
-        )
-
-        conn.commit()
-        return True, "Reaction deleted successfully."
+        return emoji_catalog.names()
     except Exception as e:
-        conn.rollback()
-        return False, str(e)
-    finally:
-        cursor.close()
-        conn.close()
+        # Only reactions new to a comment need a name; reconciliation fixes it
+        log.warning("loading emoji catalog failed", extra={"error": str(e)})
+        return {}
+
+
+def _apply_reactions(cursor, ops):
+    """
+    Sends all toggles to SQL Server as one batch (one round trip).
+    Deletes keep the old "must exist" check. The indexes of toggles that
+    actually changed a row come back in the final result set, so the
+    cached reaction counts can be adjusted exactly. Toggles run in order,
+    so one key may appear more than once.
+    Returns ([(success, message) per op], [(CommentID, R_Id, +1 | -1), ...]).
+    """
+    sql = ["DECLARE @Changed TABLE (Idx INT);"]
+    params = []
+    for idx, (op, key) in enumerate(ops):
+        if op == ADD:
+            sql.append(f"""
+                IF NOT EXISTS (
+                    SELECT 1
+                    FROM santova.UserReactMapping
+                    WHERE CommentID = %s AND UserID = %s AND R_Id = %s
+                )
+                    INSERT INTO @Changed VALUES ({idx});
+                EXEC santova.InsertCmtReaction @CommentID=%s, @UserID=%s, @R_Id=%s;""")
+            params.extend(key + key)
+        else:
+            sql.append(f"""
+                IF EXISTS (
+                    SELECT 1
+                    FROM santova.UserReactMapping
+                    WHERE CommentID = %s AND UserID = %s AND R_Id = %s
+                )
+                BEGIN
+                    INSERT INTO @Changed VALUES ({idx});
+                    EXEC santova.DeleteReact @CommentID=%s, @UserID=%s, @R_Id=%s;
+                END""")
+            params.extend(key + key)
+    sql.append("SELECT Idx FROM @Changed;")
+    cursor.execute("\n".join(sql), tuple(params))
+
+    # The stored procedures may emit their own result sets; ours is last
+    changed = []
+    while True:
+        if cursor.description:
+            changed = cursor.fetchall()
+        if not cursor.nextset():
+            break
+    changed = {row[0] for row in changed}
+
+    results = []
+    deltas = []
+    for idx, (op, key) in enumerate(ops):
+        comment_id, _, r_id = key
+        if op == ADD:
+            results.append((True, ADDED))
+            if idx in changed:
+                deltas.append((comment_id, r_id, 1))
+        elif idx in changed:
+            results.append((True, DELETED))
+            deltas.append((comment_id, r_id, -1))
+        else:
+            results.append((False, NO_MATCH))
+    return results, deltas
+
+
+# Coalesces reaction bursts into batched transactions (REACTION_DURABILITY)
+reaction_queue = ReactionQueue(apply_reaction_batch)
+atexit.register(reaction_queue.close)
+
+REACTION_WAIT_TIMEOUT = 10
+
+
+def _queue_reaction(op, comment_id, user_id, r_id, failure_status):
+    """
+    Queues a toggle and, in sync mode, waits for its batch to commit.
+    Returns the JSON response for the route.
+    """
+    future = reaction_queue.submit(op, comment_id, user_id, r_id)
+    if reaction_queue.durability == DURABILITY_ASYNC:
+        return jsonify({"success": True, "message": "Reaction queued.", "queued": True}), 202
+    try:
+        success, message = future.result(timeout=REACTION_WAIT_TIMEOUT)
+    except FutureTimeoutError:
+        return jsonify({"success": False, "message": "Reaction is still pending, please retry"}), 503
+    return jsonify({"success": success, "message": message}), (200 if success else failure_status)
 
 
 @discussion_bp.route("/api/delete-reaction", methods=["POST"])
@@ -263,10 +506,6 @@ def delete_reaction_route(user_id, user_name):
     if not comment_id or not r_id:
         return jsonify({"success": False, "message": "CommentID and R_Id are required"}), 400
 
-    success, message = delete_reaction(comment_id, user_id, r_id)
-    if success:
-        return jsonify({"success": True, "message": message}), 200
-    else:
-        return jsonify({"success": False, "message": message}), 400
+    return _queue_reaction(REMOVE, comment_id, user_id, r_id, 400)
 
 
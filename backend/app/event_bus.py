@@ -0,0 +1,219 @@
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+from app.serialization import encode
+
+
+class Event:
+    __slots__ = ("seq", "id", "type", "payload")
+
+    def __init__(self, seq, event_id, event_type, payload):
+        self.seq = seq
+        self.id = event_id
+        self.type = event_type
+        self.payload = payload      # encoded JSON bytes
+
+    def to_sse(self):
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+            self.id.encode("ascii"), self.type.encode("ascii"), self.payload
+        )
+
+
+class Subscription:
+    """
+    One connected client: events replayed from the history, then live
+    ones through a bounded queue. A client that falls `queue_size` events
+    behind is dropped (closed); it reconnects with Last-Event-ID and
+    catches up from the history instead of growing memory here.
+    """
+
+    def __init__(self, bus, replay, queue_size):
+        self._bus = bus
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.replay = replay
+        self.closed = False
+        self.overflowed = False
+
+    def offer(self, event):
+        """Queues `event`; returns False if this dropped the client."""
+        if self.closed:
+            return True
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+            self.close()
+            return False
+        return True
+
+    def get(self, timeout):
+        """Next live event, or None after `timeout` seconds or once closed."""
+        if self.closed:
+            return None
+        try:
+            event = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return event     # None is the close sentinel
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._bus._unsubscribe(self)
+        try:
+            self._queue.put_nowait(None)    # wake a waiting get()
+        except queue.Full:
+            pass
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for discussion activity.
+
+    Every event gets an ID "<epoch>-<seq>" and is kept in a ring buffer of
+    the last `history` events, so a reconnecting client (Last-Event-ID)
+    gets what it missed without a database query. If its ID is older than
+    the buffer, or from another process or server start, subscribe()
+    reports a reset and the client reloads the feed once.
+
+    The bus lives in one process: with several workers, each client only
+    sees events published by the worker it is connected to, plus
+    whatever the next feed reload brings. gunicorn.conf.py therefore
+    runs one worker unless told otherwise.
+    """
+
+    def __init__(self, history=None, queue_size=None, max_subscribers=None):
+        if history is None:
+            history = int(os.environ.get("SSE_HISTORY", 1000))
+        if queue_size is None:
+            queue_size = int(os.environ.get("SSE_QUEUE_SIZE", 256))
+        if max_subscribers is None:
+            max_subscribers = int(os.environ.get("SSE_MAX_CLIENTS", 1000))
+        self._new_epoch()
+        os.register_at_fork(after_in_child=self._new_epoch)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._closed = False
+        self._published = 0
+        self._dropped = 0
+
+    def _new_epoch(self):
+        # Per process, forked workers included: a Last-Event-ID from another
+        # worker names events this one never had
+        self.epoch = uuid.uuid4().hex[:12]
+
+    def publish(self, event_type, data):
+        payload = encode(data)
+        with self._lock:
+            seq = next(self._seq)
+            event = Event(seq, f"{self.epoch}-{seq}", event_type, payload)
+            self._history.append(event)
+            self._last_seq = seq
+            self._published += 1
+            subscribers = list(self._subscribers)
+        dropped = sum(1 for subscription in subscribers if not subscription.offer(event))
+        if dropped:
+            with self._lock:
+                self._dropped += dropped
+        return event
+
+    def _parse_id(self, last_event_id):
+        epoch, _, seq = (last_event_id or "").rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns (subscription, reset), or (None, False) when the bus is
+        closed or at `max_subscribers`. `reset` means the client missed
+        events that are no longer buffered and should reload the feed.
+        """
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                return None, False
+            replay, reset = [], False
+            if last_event_id:
+                seq = self._parse_id(last_event_id)
+                oldest = self._history[0].seq if self._history else self._last_seq + 1
+                if seq is None or seq > self._last_seq or seq < oldest - 1:
+                    reset = True
+                else:
+                    replay = [event for event in self._history if event.seq > seq]
+            subscription = Subscription(self, replay, self.queue_size)
+            self._subscribers.add(subscription)
+        return subscription, reset
+
+    def full(self):
+        with self._lock:
+            return self._closed or len(self._subscribers) >= self.max_subscribers
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def close(self):
+        """Ends every stream and refuses new ones (worker shutdown)."""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "published": self._published,
+                "buffered": len(self._history),
+                "dropped_slow_clients": self._dropped,
+                "last_event_id": f"{self.epoch}-{self._last_seq}",
+            }
+
+
+def sse_stream(bus, last_event_id, heartbeat, deadline=None):
+    """
+    Generator of SSE frames for one client: the retry hint, a reset or the
+    replayed events, then live events with a comment line every
+    `heartbeat` seconds so proxies keep the connection open. Ends when the
+    subscription closes or at `deadline` (time.time(); token expiry).
+
+    The subscription is taken on the first iteration, so a response that
+    is never sent leaves nothing behind.
+    """
+    yield b"retry: 3000\n\n"
+    subscription, reset = bus.subscribe(last_event_id)
+    if subscription is None:
+        return      # filled up since the route checked; the client retries
+    try:
+        if reset:
+            yield b"event: reset\ndata: {}\n\n"
+        for event in subscription.replay:
+            yield event.to_sse()
+        while True:
+            wait = heartbeat
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+                if wait <= 0:
+                    return
+            event = subscription.get(wait)
+            if event is None:
+                if subscription.closed or (deadline is not None and time.time() >= deadline):
+                    return
+                yield b": keepalive\n\n"
+            else:
+                yield event.to_sse()
+    finally:
+        subscription.close()
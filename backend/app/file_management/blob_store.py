@@ -0,0 +1,92 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: in-process locking only
+    fcntl = None
+
+from app.file_management.storage import UPLOAD_FOLDER
+
+# Same filesystem as the upload temp folder, so publishing is a rename
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, "blobs")
+
+_HEX = frozenset("0123456789abcdef")
+
+
+class BlobStore:
+    """
+    Content-addressed file storage: every distinct file is stored once at
+    <root>/ab/cd/<sha256>, however many users upload it.
+
+    Blobs are never rewritten. References live in the database (rows of
+    santova.FileManagement pointing at the blob's path); the caller asks
+    for removal once the last one is gone. `lock(digest)` serializes a
+    digest's "publish + insert row" against its "count refs + remove",
+    across threads and, where fcntl exists, across worker processes.
+    """
+
+    def __init__(self, root=BLOB_FOLDER, stripes=64):
+        self.root = root
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def path_for(self, digest):
+        digest = digest.lower()
+        if len(digest) != 64 or not _HEX.issuperset(digest):
+            raise ValueError("Not a SHA-256 hex digest")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def owns(self, path):
+        """True if `path` is a blob of this store (not a legacy per-user file)."""
+        root = os.path.abspath(self.root) + os.sep
+        return os.path.abspath(path).startswith(root)
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def put(self, tmp_path, digest):
+        """
+        Publishes a finished temp file under its digest. If the blob is
+        already stored the temp file is dropped instead.
+        Returns (path, created). Call with lock(digest) held.
+        """
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return path, True
+
+    def remove(self, path):
+        """Deletes an unreferenced blob. Call with lock(digest) held."""
+        if not self.owns(path):
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def digest_of(self, path):
+        return os.path.basename(path) if self.owns(path) else None
+
+    @contextmanager
+    def lock(self, digest):
+        digest = digest.lower()
+        with self._locks[int(digest[:4], 16) % len(self._locks)]:
+            if fcntl is None:
+                yield
+                return
+            lock_dir = os.path.join(self.root, ".locks")
+            os.makedirs(lock_dir, exist_ok=True)
+            with open(os.path.join(lock_dir, digest[:2] + ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+blob_store = BlobStore()
@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from app.file_management.storage import UPLOAD_FOLDER
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+SPOOL_FOLDER = os.path.join(UPLOAD_FOLDER, ".spool")
+
+_SPOOL_NAME = re.compile(r"downloads-(\d+)\.(log|\d+\.segment)$")
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True     # exists, owned by someone else
+    return True
+
+
+class DownloadCounter:
+    """
+    Takes download counting off the request path.
+
+    record() appends "<FileID> <UserID>" to a per-process spool file (one
+    O_APPEND write, so it survives a crash of this process) and bumps an
+    in-memory counter. A background thread flushes every `interval`
+    seconds or after `max_events` downloads: the spool is rotated into a
+    segment, the segments are summed per file, and `flush_fn({FileID:
+    count})` applies them in one batched statement. Segments are deleted
+    only after that commits; a failed flush is retried with the next one,
+    and segments left behind by a dead process are adopted on start.
+
+    Delivery is at-least-once: a crash between the commit and deleting the
+    segment replays that segment once.
+    """
+
+    def __init__(self, flush_fn, directory=SPOOL_FOLDER, interval=None, max_events=None):
+        if interval is None:
+            interval = float(os.environ.get("DOWNLOAD_FLUSH_INTERVAL", 5))
+        if max_events is None:
+            max_events = int(os.environ.get("DOWNLOAD_FLUSH_EVENTS", 500))
+        self.interval = interval
+        self.max_events = max_events
+        self.directory = directory
+        self._flush_fn = flush_fn
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._fd = None
+        self._segment_seq = 0
+        self._thread = None
+        self._closed = False
+
+        self._pending = Counter()       # FileID -> downloads not yet in the DB
+        self._pending_events = 0
+        self._by_user = Counter()       # UserID -> downloads since start
+        self._flushes = 0
+        self._flushed_events = 0
+        self._failed_flushes = 0
+
+    def _spool_path(self):
+        return os.path.join(self.directory, f"downloads-{os.getpid()}.log")
+
+    def _open_spool(self):
+        if self._fd is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._fd = os.open(self._spool_path(), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def record(self, file_id, user_id):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Download counter is closed")
+            self._open_spool()
+            os.write(self._fd, f"{int(file_id)} {int(user_id or 0)}\n".encode("ascii"))
+            self._pending[file_id] += 1
+            self._pending_events += 1
+            self._by_user[user_id] += 1
+            if self._pending_events >= self.max_events:
+                self._cond.notify()
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="download-counter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.interval
+                while not self._closed and self._pending_events < self.max_events:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("flushing download counts failed", extra={"error": str(e)})
+
+    def _rotate_locked(self):
+        """Moves the live spool aside as a segment; returns the in-memory counts it held."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._segment_seq += 1
+            os.replace(self._spool_path(),
+                       os.path.join(self.directory, f"downloads-{os.getpid()}.{self._segment_seq}.segment"))
+        pending, self._pending = self._pending, Counter()
+        self._pending_events = 0
+        return pending
+
+    def _segments(self):
+        """Own segments plus anything a dead process left behind."""
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            match = _SPOOL_NAME.match(name)
+            if not match:
+                continue
+            pid = int(match.group(1))
+            if pid == os.getpid() and match.group(2) != "log":
+                segments.append(os.path.join(self.directory, name))
+            elif pid != os.getpid() and not _pid_alive(pid):
+                with self._cond:
+                    self._segment_seq += 1
+                    adopted = os.path.join(self.directory, f"downloads-{os.getpid()}.{self._segment_seq}.segment")
+                try:
+                    os.replace(os.path.join(self.directory, name), adopted)
+                except FileNotFoundError:
+                    continue    # another worker adopted it first
+                segments.append(adopted)
+        return segments
+
+    def flush(self):
+        """Writes everything spooled so far to the database."""
+        with self._flush_lock:
+            with self._cond:
+                in_flight = self._rotate_locked()
+            segments = self._segments()
+
+            counts = Counter()
+            for path in segments:
+                with open(path) as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) == 2:     # a torn last line is dropped
+                            counts[int(parts[0])] += 1
+            if not counts:
+                for path in segments:
+                    os.remove(path)
+                return 0
+
+            try:
+                self._flush_fn(dict(counts))
+            except Exception:
+                with self._cond:
+                    # Still unflushed: keep them visible in stats
+                    self._pending.update(in_flight)
+                    self._failed_flushes += 1
+                raise
+
+            for path in segments:
+                os.remove(path)
+            with self._cond:
+                self._flushes += 1
+                self._flushed_events += sum(counts.values())
+            return sum(counts.values())
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self.flush()
+        except Exception as e:
+            log.error("flushing download counts failed", extra={"error": str(e)})
+
+    def pending(self, file_id):
+        """Downloads of `file_id` recorded here but not yet in DownloadCount."""
+        with self._cond:
+            return self._pending.get(file_id, 0)
+
+    def pending_for(self, file_ids):
+        with self._cond:
+            return sum(self._pending.get(file_id, 0) for file_id in file_ids)
+
+    def user_downloads(self, user_id):
+        """Downloads made by `user_id` through this process since it started."""
+        with self._cond:
+            return self._by_user.get(user_id, 0)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending_events": sum(self._pending.values()),
+                "pending_files": len(self._pending),
+                "flushes": self._flushes,
+                "flushed_events": self._flushed_events,
+                "failed_flushes": self._failed_flushes,
+                "interval": self.interval,
+                "max_events": self.max_events,
+            }
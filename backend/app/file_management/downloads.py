@@ -0,0 +1,85 @@
+import mimetypes
+import os
+
+from flask import request, current_app
+from werkzeug.http import http_date
+from werkzeug.utils import send_file
+
+from app.file_management.storage import UPLOAD_FOLDER
+from app.file_management.blob_store import blob_store
+
+# "x-accel-redirect" (nginx), "x-sendfile" (Apache/lighttpd) or empty to
+# stream from Flask. With X-Accel-Redirect, DOWNLOAD_ACCEL_PREFIX is the
+# internal nginx location that maps to the uploads folder.
+DOWNLOAD_OFFLOAD = os.environ.get("DOWNLOAD_OFFLOAD", "").lower()
+DOWNLOAD_ACCEL_PREFIX = os.environ.get("DOWNLOAD_ACCEL_PREFIX", "/protected-uploads/")
+
+# Shown in the browser rather than saved (SVG is excluded: it can run script)
+_INLINE_TYPES = ("video/", "audio/", "image/")
+_NEVER_INLINE = {"image/svg+xml"}
+
+
+def resolve_mimetype(stored, download_name):
+    """The MIME type saved at upload time, else one guessed from the name."""
+    mimetype = (stored or "").split(";", 1)[0].strip().lower()
+    if not mimetype or mimetype == "application/octet-stream":
+        mimetype = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+    return mimetype
+
+
+def is_inline(mimetype):
+    return mimetype.startswith(_INLINE_TYPES) and mimetype not in _NEVER_INLINE
+
+
+def counts_as_download(req=None):
+    """
+    Range requests from players scrubbing through a video are one download:
+    only whole-file requests and ranges starting at byte 0 count.
+    """
+    req = req or request
+    ranges = req.range
+    return ranges is None or not ranges.ranges or ranges.ranges[0][0] == 0
+
+
+def send_stored_file(file_path, download_name, mimetype, as_attachment):
+    """
+    Sends a stored upload with Range/If-Range support and ETag and
+    Last-Modified validators, or hands it to the front proxy when
+    DOWNLOAD_OFFLOAD is configured.
+    """
+    # Blobs are immutable and named by their hash: a perfect strong ETag
+    etag = blob_store.digest_of(file_path) or True
+
+    if DOWNLOAD_OFFLOAD == "x-accel-redirect":
+        response = _accel_redirect(file_path, download_name, mimetype, as_attachment, etag)
+    else:
+        response = send_file(
+            file_path,
+            request.environ,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            use_x_sendfile=DOWNLOAD_OFFLOAD == "x-sendfile",
+            response_class=current_app.response_class,
+            max_age=current_app.get_send_file_max_age,
+        )
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _accel_redirect(file_path, download_name, mimetype, as_attachment, etag):
+    # nginx serves the bytes (Range, sendfile); we only answer validators
+    relative = os.path.relpath(file_path, UPLOAD_FOLDER).replace(os.sep, "/")
+    stat = os.stat(file_path)
+    response = current_app.response_class(mimetype=mimetype)
+    response.headers["X-Accel-Redirect"] = DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + relative
+    disposition = "attachment" if as_attachment else "inline"
+    response.headers.set("Content-Disposition", disposition, filename=download_name)
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    if etag is True:
+        etag = f"{stat.st_mtime}-{stat.st_size}"
+    response.set_etag(etag)
+    return response.make_conditional(request)
@@ -0,0 +1,338 @@
+import bisect
+import datetime
+import decimal
+import os
+import threading
+import time
+import uuid
+
+from app.comment_store import InvalidCursor, encode_token, decode_token
+from app.serialization import RecordCache, mapping_to_struct
+
+SORT_KEYS = {
+    "uploadedAt": "UploadedDate",
+    "name": "FileName",
+    "size": "FileSize",
+    "type": "FileType",
+    "downloads": "DownloadCount",
+}
+
+MAX_PAGE_SIZE = 500
+
+
+def split_tags(value):
+    """GetFileData returns tags as one comma-separated string."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    return [tag.strip() for tag in value.split(",") if tag.strip()]
+
+
+def _norm(value):
+    return str(value).strip().lower() if value is not None else None
+
+
+def uploader_keys(row):
+    """Values the uploader filter matches: the uploader's ID and name."""
+    keys = set()
+    for column in ("UserID", "UploadedBy"):
+        if row.get(column) is not None:
+            keys.add(_norm(row[column]))
+    if row.get("UploadedByName"):
+        keys.add(_norm(row["UploadedByName"]))
+    return keys
+
+
+def parse_file_query(args):
+    """
+    Reads the listing filters and paging options from request args.
+    Raises ValueError for malformed values.
+    """
+    query = {
+        "process_id": None,
+        "file_type": None,
+        "uploader": None,
+        "tags": [],
+        "sort": "uploadedAt",
+        "descending": True,
+        "limit": None,
+        "offset": 0,
+        "cursor": None,
+    }
+
+    process_id = args.get("processId")
+    if process_id:
+        query["process_id"] = int(process_id)
+
+    file_type = args.get("fileType")
+    if file_type and file_type != "all":
+        query["file_type"] = _norm(file_type)
+
+    uploader = args.get("uploadedBy")
+    if uploader:
+        query["uploader"] = _norm(uploader)
+
+    # ?tag=a&tag=b or ?tags=a,b; every tag must match
+    tags = args.getlist("tag") + split_tags(args.get("tags"))
+    query["tags"] = sorted({_norm(tag) for tag in tags if tag.strip()})
+
+    sort = args.get("sort", "uploadedAt")
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    query["sort"] = sort
+    query["descending"] = args.get("order", "desc" if sort == "uploadedAt" else "asc") == "desc"
+
+    if args.get("limit"):
+        query["limit"] = max(1, min(int(args["limit"]), MAX_PAGE_SIZE))
+    if args.get("offset"):
+        query["offset"] = max(0, int(args["offset"]))
+    if args.get("cursor"):
+        query["cursor"] = args["cursor"]
+    return query
+
+
+def matches(row, query):
+    if query["process_id"] is not None and row.get("ProcessID") != query["process_id"]:
+        return False
+    if query["file_type"] is not None and _norm(row.get("FileType")) != query["file_type"]:
+        return False
+    if query["uploader"] is not None and query["uploader"] not in uploader_keys(row):
+        return False
+    if query["tags"]:
+        tags = {_norm(tag) for tag in row.get("tags") or []}
+        if not tags.issuperset(query["tags"]):
+            return False
+    return True
+
+
+# -- sort keys and cursors ----------------------------------------------
+
+def _sort_value(row, sort):
+    value = row.get(SORT_KEYS[sort])
+    if isinstance(value, str):
+        value = value.lower()
+    # None sorts after everything else
+    return (value is None, value if value is not None else 0)
+
+
+def _row_key(row, sort):
+    return (_sort_value(row, sort), row["FileID"])
+
+
+def _encode_cursor(key, sort, descending):
+    (is_none, value), file_id = key
+    if isinstance(value, datetime.datetime):
+        value = {"dt": value.isoformat()}
+    elif isinstance(value, decimal.Decimal):
+        value = {"dec": str(value)}
+    return encode_token({"s": sort, "d": descending, "n": is_none, "v": value, "id": file_id})
+
+
+def _decode_cursor(token, sort, descending):
+    data = decode_token(token)
+    if data.get("s") != sort or data.get("d") != descending or "id" not in data:
+        raise InvalidCursor("Cursor does not match this sort order")
+    value = data.get("v")
+    if isinstance(value, dict):
+        try:
+            if "dec" in value:
+                value = decimal.Decimal(value["dec"])
+            else:
+                value = datetime.datetime.fromisoformat(value["dt"])
+        except (KeyError, TypeError, ValueError, decimal.InvalidOperation):
+            raise InvalidCursor("Malformed cursor")
+    return ((bool(data.get("n")), value), data["id"])
+
+
+def paginate(rows, query, keys=None):
+    """
+    Sorts and pages `rows` (already filtered). `keys`, when given, are the
+    rows' precomputed ascending sort keys and `rows` must be in that order.
+    Returns (page, total, next_cursor).
+    """
+    sort, descending = query["sort"], query["descending"]
+    if keys is None:
+        rows = sorted(rows, key=lambda row: _row_key(row, sort))
+        keys = [_row_key(row, sort) for row in rows]
+    total = len(rows)
+
+    cursor = _decode_cursor(query["cursor"], sort, descending) if query["cursor"] else None
+    try:
+        if descending:
+            end = bisect.bisect_left(keys, cursor) if cursor else total - query["offset"]
+        else:
+            start = bisect.bisect_right(keys, cursor) if cursor else query["offset"]
+    except TypeError:
+        raise InvalidCursor("Cursor does not match this sort order")
+
+    if descending:
+        end = max(end, 0)
+        start = 0 if query["limit"] is None else max(end - query["limit"], 0)
+        page = rows[start:end][::-1]
+        has_more = start > 0
+    else:
+        end = total if query["limit"] is None else start + query["limit"]
+        page = rows[start:end]
+        has_more = end < total
+
+    next_cursor = None
+    if page and has_more and query["limit"] is not None:
+        next_cursor = _encode_cursor(_row_key(page[-1], sort), sort, descending)
+    return page, total, next_cursor
+
+
+def file_record(row):
+    """Serializable FileRecord Struct for a GetFileData row dict."""
+    return mapping_to_struct("FileRecord", row)
+
+
+def filter_files(files, query):
+    """Un-indexed path: filter and page a full GetFileData result."""
+    return paginate([row for row in files if matches(row, query)], query)
+
+
+class FileIndex:
+    """
+    In-process metadata index for the file browser.
+
+    Holds every live file once, with inverted indexes on process, type,
+    uploader and tag, and per-sort-key orderings built on first use.
+    An unfiltered page is a slice of the cached ordering (O(page)); a
+    filtered one intersects the posting sets (smallest first) and only
+    sorts the matches when they are few.
+
+    Write paths keep it current: deletes drop the file in place, uploads
+    mark it stale, and it is reloaded at least every `ttl` seconds.
+    """
+
+    def __init__(self, loader, ttl=None):
+        if ttl is None:
+            ttl = float(os.environ.get("FILE_INDEX_TTL", 60))
+        self.ttl = ttl
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._stale = True
+        self._files = {}
+        self._postings = {}     # (field, value) -> set of FileIDs
+        self._orders = {}       # sort -> (rows, keys), ascending
+        self._records = RecordCache(file_record)
+        self._version = 0       # bumped whenever the indexed rows change
+        self._new_epoch()
+        os.register_at_fork(after_in_child=self._new_epoch)
+
+    def _new_epoch(self):
+        # Per process, forked workers included, like the version it qualifies
+        self._epoch = uuid.uuid4().hex[:12]
+
+    def invalidate(self):
+        self._stale = True
+
+    def _ensure_loaded(self):
+        if (not self._stale and self._loaded_at is not None
+                and time.monotonic() - self._loaded_at <= self.ttl):
+            return
+        with self._lock:
+            if (self._stale or self._loaded_at is None
+                    or time.monotonic() - self._loaded_at > self.ttl):
+                self._stale = False
+                try:
+                    rows = self._loader()
+                except Exception:
+                    self._stale = True
+                    raise
+                self._build_locked(rows)
+                self._loaded_at = time.monotonic()
+
+    def _build_locked(self, rows):
+        files = {}
+        postings = {}
+        for row in rows:
+            files[row["FileID"]] = row
+            for posting in self._posting_keys(row):
+                postings.setdefault(posting, set()).add(row["FileID"])
+        self._files = files
+        self._postings = postings
+        self._orders = {}
+        self._records.clear()
+        self._version += 1
+
+    @staticmethod
+    def _posting_keys(row):
+        yield ("process", row.get("ProcessID"))
+        yield ("type", _norm(row.get("FileType")))
+        for uploader in uploader_keys(row):
+            yield ("uploader", uploader)
+        for tag in row.get("tags") or []:
+            yield ("tag", _norm(tag))
+
+    def remove(self, file_id):
+        """Drops a deleted file without reloading."""
+        with self._lock:
+            row = self._files.pop(file_id, None)
+            if row is None:
+                return
+            self._records.discard(file_id)
+            self._version += 1
+            for posting in self._posting_keys(row):
+                ids = self._postings.get(posting)
+                if ids is not None:
+                    ids.discard(file_id)
+                    if not ids:
+                        del self._postings[posting]
+            self._orders = {}
+
+    def _order(self, sort):
+        order = self._orders.get(sort)
+        if order is None:
+            rows = sorted(self._files.values(), key=lambda row: _row_key(row, sort))
+            order = self._orders[sort] = (rows, [_row_key(row, sort) for row in rows])
+        return order
+
+    def query(self, query):
+        """Returns (page, total, next_cursor) for a parse_file_query() dict."""
+        self._ensure_loaded()
+        with self._lock:
+            wanted = []
+            if query["process_id"] is not None:
+                wanted.append(("process", query["process_id"]))
+            if query["file_type"] is not None:
+                wanted.append(("type", query["file_type"]))
+            if query["uploader"] is not None:
+                wanted.append(("uploader", query["uploader"]))
+            wanted.extend(("tag", tag) for tag in query["tags"])
+
+            rows, keys = self._order(query["sort"])
+            if not wanted:
+                return paginate(rows, query, keys)
+
+            sets = sorted((self._postings.get(posting, set()) for posting in wanted), key=len)
+            ids = set(sets[0])
+            for other in sets[1:]:
+                ids &= other
+            # Few matches: sort just those; many: filter the ordering
+            if len(ids) * 8 < len(rows):
+                return paginate([self._files[file_id] for file_id in ids], query)
+            selected = [(row, key) for row, key in zip(rows, keys) if row["FileID"] in ids]
+            return paginate([row for row, _ in selected], query, [key for _, key in selected])
+
+    def version(self):
+        """
+        (epoch, version) of the indexed data, reloading it first if due.
+        The epoch differs per process, so versions never collide.
+        """
+        self._ensure_loaded()
+        return self._epoch, self._version
+
+    def records(self, rows):
+        """FileRecord Structs for rows returned by query(), built once per row."""
+        return [self._records.get(row["FileID"], row) for row in rows]
+
+    def stats(self):
+        return {
+            "files": len(self._files),
+            "postings": len(self._postings),
+            "orders": sorted(self._orders),
+            "ttl": self.ttl,
+        }
@@ -1,13 +1,27 @@
-from flask import Blueprint, request, jsonify, current_app
-from app.Database.connection import connect_to_database
+from flask import Blueprint, request, jsonify
+from app.Database.connection import get_connection
+from app.Database.pool import PoolError
+from app.Database.executor import listing_queries, lookup_queries, run_in
 from app.auth_middleware import token_required
+from app.file_management.storage import UploadTooLarge, parse_streaming_upload
+from app.file_management.blob_store import blob_store
+from app.file_management.downloads import counts_as_download, is_inline, resolve_mimetype, send_stored_file
+from app.file_management.download_counter import DownloadCounter
+from app.file_management.file_index import (
+    FileIndex, InvalidCursor, file_record, filter_files, matches, parse_file_query, split_tags
+)
+from app.file_management.media_jobs import artifact_cache, media_jobs
+from app.compression import conditional_on
+from app.streaming import batched, fetch_batches, prefetch, stream_format, stream_response
+import atexit
 import os
 from werkzeug.utils import secure_filename
 from flask import send_file
+from app.logs import get_logger
 
 file_bp = Blueprint("file_bp", __name__)
+log = get_logger(__name__)
 
-UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
 ALLOWED_EXTENSIONS = {
     # Documents
     "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "txt",
@@ -30,186 +44,382 @@ def allowed_file(filename):
 @token_required
 def upload_file_route(user_id, user_name):
     """
-    Uploads a file and saves metadata to DB
+    Uploads a file and saves metadata to DB.
+    The file is streamed to disk while its size and SHA-256 are computed,
+    then stored once per content in the blob store; it is never held in
+    memory.
     """
-    if "file" not in request.files:
+    try:
+        form, files = parse_streaming_upload(request)
+    except UploadTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+
+    if "file" not in files:
         return jsonify({"success": False, "message": "No file uploaded"}), 400
 
-    file = request.files["file"]
-    process_id = request.form.get("ProcessID")
-    description = request.form.get("Description")
-    file_type = request.form.get("FileType")  # ✅ dropdown-selected type (e.g. Document, Image, Video, etc.)
+    original_name, mime_type, upload = files["file"]
+    process_id = form.get("ProcessID")
+    description = form.get("Description")
+    file_type = form.get("FileType")  # ✅ dropdown-selected type (e.g. Document, Image, Video, etc.)
 
-    if not file or file.filename == "":
+    if not original_name:
+        upload.discard()
         return jsonify({"success": False, "message": "No file selected"}), 400
 
-    if not allowed_file(file.filename):
+    if not allowed_file(original_name):
+        upload.discard()
         return jsonify({"success": False, "message": "File type not allowed"}), 400
 
-    filename = secure_filename(file.filename)
+    filename = secure_filename(original_name)
     file_format = filename.rsplit(".", 1)[1].lower()
-    mime_type = file.content_type 
-    file_size = len(file.read())
-    file.seek(0)
+    file_size = upload.size
 
-    # Folder path: uploads/user_<id>/
-    user_folder = os.path.join(UPLOAD_FOLDER, f"user_{user_id}")
-    os.makedirs(user_folder, exist_ok=True)
-    file_path = os.path.join(user_folder, filename)
-    file.save(file_path)
+    try:
+        new_file_id, uploaded_by_name, _, jobs = save_uploaded_file(
+            upload.hexdigest(), upload.path,
+            user_id, process_id, filename, file_type, mime_type,
+            file_size, file_format, description
+        )
+    except PoolError:
+        raise
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
 
-    conn = connect_to_database()
-    cursor = conn.cursor()
+    return jsonify({
+        "success": True,
+        "message": "File uploaded successfully",
+        "NewFileID": new_file_id,
+        "UploadedByName": uploaded_by_name or user_name,
+        "MediaJobs": [job["JobID"] for job in jobs]
+    }), 201
 
-    try:
-        cursor.execute("""
-            EXEC santova.InsertFileData
-                @UserID = %s,
-                @ProcessID = %s,
-                @FileName = %s,
-                @FileType = %s, 
-                @MimeType = %s,
-                @FileSize = %s,
-                @FileFormat = %s,
-                @Description = %s,
-                @FilePath = %s
-        """, (
-            user_id,
-            process_id,
-            filename,
-            file_type,
-            mime_type,
-            file_size,
-            file_format,
-            description,
-            file_path
-        ))
-
-        # ✅ Fetch output from SP (FileID + UploadedByName)
-        result = cursor.fetchone()
-        new_file_id = result[0] if result else None
-        uploaded_by_name = result[1] if result and len(result) > 1 else user_name
-
-        conn.commit()
 
-        return jsonify({
-            "success": True,
-            "message": "File uploaded successfully",
-            "NewFileID": new_file_id,
-            "UploadedByName": uploaded_by_name
-        }), 201
+def save_uploaded_file(digest, tmp_path, user_id, process_id, filename, file_type,
+                       mime_type, file_size, file_format, description):
+    """
+    Stores the content under its SHA-256 (once, however many users upload
+    it) and inserts the metadata row pointing at it.
+    With tmp_path=None only an already stored blob is referenced.
+    Thumbnails, previews and text are then derived in the background.
+    Returns (FileID, UploadedByName, FilePath, media jobs), or None when
+    tmp_path is None and the content is not stored yet.
+    """
+    with blob_store.lock(digest):
+        if tmp_path is None:
+            if not blob_store.exists(digest):
+                return None
+            file_path, created = blob_store.path_for(digest), False
+        else:
+            file_path, created = blob_store.put(tmp_path, digest)
+
+        try:
+            new_file_id, uploaded_by_name = insert_file_record(
+                user_id, process_id, filename, file_type, mime_type,
+                file_size, file_format, description, file_path
+            )
+        except Exception:
+            if created:
+                blob_store.remove(file_path)    # nothing references it
+            raise
 
+    try:
+        jobs = media_jobs.enqueue(digest, file_path, file_format)
     except Exception as e:
-        conn.rollback()
-        return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        # The upload itself succeeded; previews are best effort
+        log.warning("queueing media jobs failed", extra={"error": str(e)})
+        jobs = []
+    return new_file_id, uploaded_by_name, file_path, jobs
 
 
-def get_files_from_db(process_id=None, file_type=None):
+def collect_blob(file_path):
     """
-    Fetch all files from SP regardless of user.
+    Removes a blob once no live FileManagement row references it.
+    Legacy per-user files are left alone.
     """
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    try:
-        # SQL Server SP call
-        sql = "EXEC santova.GetFileData @ProcessID=%s, @UserID=%s, @FileType=%s"
-        cursor.execute(sql, (process_id, None, file_type if file_type and file_type != 'all' else None))
-
-        columns = [column[0] for column in cursor.description]
-        rows = cursor.fetchall()
-        files = []
-        for row in rows:
-            file_dict = dict(zip(columns, row))
-            # Handle tags as list
-            if file_dict.get('tags'):
-                file_dict['tags'] = [tag.strip() for tag in file_dict['tags'].split(',') if tag.strip()]
-            files.append(file_dict)
-
-        return files
+    digest = blob_store.digest_of(file_path)
+    if digest is None:
+        return False
+
+    with blob_store.lock(digest):
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM santova.FileManagement
+                    WHERE FilePath = %s AND IsDeleted = 0
+                """, (file_path,))
+                references = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+        if references:
+            return False
+        return blob_store.remove(file_path)
+
+
+@run_in(lookup_queries)
+def insert_file_record(user_id, process_id, filename, file_type, mime_type,
+                       file_size, file_format, description, file_path):
+    """
+    Calls santova.InsertFileData and returns (FileID, UploadedByName).
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    except Exception as e:
-        print("Error fetching files from DB:", e)
-        raise e
+        try:
+            cursor.execute("""
+                EXEC santova.InsertFileData
+                    @UserID = %s,
+                    @ProcessID = %s,
+                    @FileName = %s,
+                    @FileType = %s, 
+                    @MimeType = %s,
+                    @FileSize = %s,
+                    @FileFormat = %s,
+                    @Description = %s,
+                    @FilePath = %s
+            """, (
+                user_id,
+                process_id,
+                filename,
+                file_type,
+                mime_type,
+                file_size,
+                file_format,
+                description,
+                file_path
+            ))
+
+            # ✅ Fetch output from SP (FileID + UploadedByName)
+            result = cursor.fetchone()
+            new_file_id = result[0] if result else None
+            uploaded_by_name = result[1] if result and len(result) > 1 else None
+
+            conn.commit()
+            file_index.invalidate()
+            return new_file_id, uploaded_by_name
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+@run_in(listing_queries)
+def get_files_from_db(process_id=None, file_type=None, user_id=None):
+    """
+    Fetch all files from SP regardless of user.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # SQL Server SP call
+            sql = "EXEC santova.GetFileData @ProcessID=%s, @UserID=%s, @FileType=%s"
+            cursor.execute(sql, (process_id, user_id, file_type if file_type and file_type != 'all' else None))
+
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+            files = []
+            for row in rows:
+                file_dict = dict(zip(columns, row))
+                # Handle tags as list
+                if file_dict.get('tags'):
+                    file_dict['tags'] = split_tags(file_dict['tags'])
+                files.append(file_dict)
+
+            return files
+
+        except Exception as e:
+            log.error("fetching files failed", extra={"error": str(e)})
+            raise e
+
+        finally:
+            cursor.close()
 
-    finally:
-        cursor.close()
-        conn.close()
 
+def stream_files_from_db(query, counted):
+    """
+    FileRecord batches of the GetFileData rows matching `query`, read with
+    fetchmany() in procedure order. `counted` is a one-item list that
+    receives the running number of matches.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            sql = "EXEC santova.GetFileData @ProcessID=%s, @UserID=%s, @FileType=%s"
+            cursor.execute(sql, (query["process_id"], None, query["file_type"]))
+            columns = [column[0] for column in cursor.description]
+            for rows in fetch_batches(cursor):
+                batch = []
+                for row in rows:
+                    file_dict = dict(zip(columns, row))
+                    if file_dict.get('tags'):
+                        file_dict['tags'] = split_tags(file_dict['tags'])
+                    if matches(file_dict, query):
+                        batch.append(file_record(file_dict))
+                counted[0] += len(batch)
+                yield batch
+        finally:
+            cursor.close()
 
 
+@run_in(lookup_queries)
 def delete_file(file_id: int, user_id: int):
     """
     Soft delete a file by setting IsDeleted = 1.
-    Only the owner can delete.
+    Only the owner can delete. The stored content is garbage collected
+    when this was its last reference.
     Returns (success: bool, message: str)
     """
-    conn = None
-    cursor = None
-    try:
-        conn = connect_to_database()
-        cursor = conn.cursor()
+    success, message, file_path = _delete_file_row(file_id, user_id)
+    if success:
+        file_index.remove(file_id)
+    if success and file_path:
+        # After the connection is back in the pool: GC needs its own
+        _collect_blob_quietly(file_path)
+    return success, message
 
-        # Execute the SP
-        cursor.execute(
-            "EXEC santova.DeleteUploadedData @FileID=%s, @UserID=%s",
-            (file_id, user_id)
-        )
 
-        # Fetch the SP result
-        row = cursor.fetchone()
-        conn.commit()
+def _delete_file_row(file_id, user_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT FilePath FROM santova.FileManagement WHERE FileID = %s",
+                (file_id,)
+            )
+            path_row = cursor.fetchone()
+            file_path = path_row[0] if path_row else None
+
+            # Execute the SP
+            cursor.execute(
+                "EXEC santova.DeleteUploadedData @FileID=%s, @UserID=%s",
+                (file_id, user_id)
+            )
+
+            # Fetch the SP result
+            row = cursor.fetchone()
+            conn.commit()
+
+            if row:
+                success = row[0] == 1
+                message = row[1] if len(row) > 1 else "No message returned"
+                log.info("DeleteUploadedData response", extra={"file_id": file_id, "user_id": user_id, "response": list(row)})
+                return success, message, file_path
+            else:
+                log.warning("no response from DeleteUploadedData", extra={"file_id": file_id, "user_id": user_id})
+                return False, "Delete failed: no response from database", None
+
+        except Exception as e:
+            log.error("deleting file failed", extra={"file_id": file_id, "user_id": user_id, "error": str(e)})
+            return False, f"Delete failed: {str(e)}", None
+
+        finally:
+            cursor.close()
 
-        if row:
-            success = row[0] == 1
-            message = row[1] if len(row) > 1 else "No message returned"
-            current_app.logger.info(f"DeleteFile SP response: {row}")
-            return success, message
-        else:
-            current_app.logger.warning(f"No response from DeleteUploadedData for FileID={file_id}")
-            return False, "Delete failed: no response from database"
 
+
+def _collect_blob_quietly(file_path):
+    # The delete itself succeeded; a failed GC is retried by the next delete
+    try:
+        if collect_blob(file_path):
+            log.info("removed unreferenced blob", extra={"path": file_path})
     except Exception as e:
-        current_app.logger.error(f"Error deleting file {file_id}: {str(e)}")
-        return False, f"Delete failed: {str(e)}"
+        log.error("collecting blob failed", extra={"path": file_path, "error": str(e)})
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
+# 🌐 ROUTES (JWT-Protected)
 
+# In-process metadata index for listings (FILE_INDEX_ENABLED, FILE_INDEX_TTL)
+FILE_INDEX_ENABLED = os.environ.get("FILE_INDEX_ENABLED", "1") == "1"
+file_index = FileIndex(get_files_from_db)
 
-# 🌐 ROUTES (JWT-Protected)
 
 @file_bp.route('/api/uploaded-details', methods=['GET'])
 @token_required  # ✅ Protect this route too
 def get_files_route(user_id, user_name):
     """
-    Fetch all files based on optional filters.
-    """
-    process_id_str = request.args.get('processId')
-    file_type = request.args.get('fileType', 'all')
+    Fetch files based on optional filters.
 
-    process_id = int(process_id_str) if process_id_str else None
+    Query params: processId, fileType, uploadedBy (user ID or name),
+    tag (repeatable) / tags (comma-separated), sort (uploadedAt, name,
+    size, type, downloads), order (asc|desc), limit, and offset or the
+    cursor returned as next_cursor. Without limit every match is returned.
+    stream=1 (or ndjson) writes the same envelope in chunks.
+    """
+    try:
+        query = parse_file_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid query parameter: {e}'}), 400
 
+    include_artifacts = 'artifacts' in request.args.get('include', '').split(',')
     try:
-        files = get_files_from_db()
+        fmt = stream_format()
+        if fmt:
+            return _stream_files(query, include_artifacts, fmt)
+
+        # Artifacts appear in the background, outside the index version
+        if FILE_INDEX_ENABLED and not include_artifacts:
+            cached = conditional_on(*file_index.version())
+            if cached is not None:
+                return cached
+
+        if FILE_INDEX_ENABLED:
+            files, total, next_cursor = file_index.query(query)
+        else:
+            # Process and type are filtered by the SP itself
+            files, total, next_cursor = filter_files(
+                get_files_from_db(query["process_id"], query["file_type"]), query
+            )
+
+        if include_artifacts:
+            files = with_artifacts(files)
+        elif FILE_INDEX_ENABLED:
+            files = file_index.records(files)
+        else:
+            files = [file_record(f) for f in files]
 
         return jsonify({
             'success': True,
-            'files': files
+            'files': files,
+            'total': total,
+            'next_cursor': next_cursor
         })
 
-    except ValueError:
-        return jsonify({'success': False, 'message': 'Invalid ProcessID format'}), 400
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except PoolError:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def _stream_files(query, include_artifacts, fmt):
+    if FILE_INDEX_ENABLED:
+        files, total, next_cursor = file_index.query(query)
+        if include_artifacts:
+            batches = (with_artifacts(batch) for batch in batched(files))
+        else:
+            batches = (file_index.records(batch) for batch in batched(files))
+        envelope = {'success': True, 'total': total, 'next_cursor': next_cursor}
+        return stream_response(envelope, 'files', batches, fmt)
+
+    # Straight from the cursor: rows come in procedure order, unpaged, and
+    # the connection is busy until the last batch, so no artifact lookups
+    if (include_artifacts or query["limit"] is not None or query["offset"]
+            or query["cursor"] or 'sort' in request.args):
+        return jsonify({
+            'success': False,
+            'message': 'stream cannot be combined with sort, paging or include=artifacts '
+                       'while the file index is disabled'
+        }), 400
+    counted = [0]
+    envelope = {'success': True, 'total': lambda: counted[0], 'next_cursor': None}
+    return stream_response(envelope, 'files', prefetch(stream_files_from_db(query, counted)), fmt)
+
+
 @file_bp.route("/api/delete-uploaded-file", methods=["POST"])
 @token_required
 def delete_file_route(user_id, user_name):
@@ -221,7 +431,7 @@ def delete_file_route(user_id, user_name):
     file_id = data.get("FileID")
 
     if not file_id:
-        current_app.logger.warning("Delete request missing FileID")
+        log.warning("delete request without FileID", extra={"user_id": user_id})
         return jsonify({"Success": False, "Message": "FileID is required"}), 400
 
     # Ensure numeric
@@ -234,7 +444,7 @@ def delete_file_route(user_id, user_name):
 
     # Return proper HTTP status based on success
     status_code = 200 if success else 403  # 403 Forbidden if not allowed
-    current_app.logger.info(f"Delete request for FileID={file_id} by UserID={user_id} => {message}")
+    log.info("delete request", extra={"file_id": file_id, "user_id": user_id, "success": success, "result": message})
     return jsonify({"Success": success, "Message": message}), status_code
 
 # download uploaded files
@@ -244,45 +454,227 @@ def delete_file_route(user_id, user_name):
 def download_file_route(user_id, user_name, file_id):
     """
     Downloads a file from the uploads folder based on DB record.
+    Supports Range/If-Range and conditional requests; media types are
+    served inline so browsers can stream them (?download=1 forces a save).
     """
-    conn = connect_to_database()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT FileName, FileFormat, FilePath
-            FROM santova.FileManagement
-            WHERE FileID = %s AND IsDeleted = 0
-        """, (file_id,))
-        file_row = cursor.fetchone()
-
-        if not file_row:
-            return jsonify({"success": False, "message": "File not found"}), 404
-            
-        print(file_row)
-
-        file_name, file_format, file_path = file_row
-
-        if not os.path.exists(file_path):
-            return jsonify({"success": False, "message": "File missing from server"}), 404
-
-        cursor.execute("""
-            UPDATE santova.FileManagement
-            SET DownloadCount = ISNULL(DownloadCount, 0) + 1
-            WHERE FileID = %s
-        """, (file_id,))
-        conn.commit()
-
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=f"{file_name}.{file_format}",
-            mimetype="application/octet-stream"
-        )
-
+        file_row = get_download_info(file_id)
+    except PoolError:
+        raise
     except Exception as e:
-        conn.rollback()
         return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
+    if not file_row:
+        return jsonify({"success": False, "message": "File not found"}), 404
+
+    file_name, file_format, file_path, stored_mimetype = file_row
+
+    if not os.path.exists(file_path):
+        return jsonify({"success": False, "message": "File missing from server"}), 404
+
+    if counts_as_download():
+        download_counter.record(file_id, user_id)
+
+    download_name = f"{file_name}.{file_format}"
+    mimetype = resolve_mimetype(stored_mimetype, download_name)
+    as_attachment = request.args.get("download") == "1" or not is_inline(mimetype)
+
+    # The DB connection is already back in the pool while the file streams
+    return send_stored_file(file_path, download_name, mimetype, as_attachment)
+
+
+@run_in(lookup_queries)
+def get_download_info(file_id):
+    """
+    Looks up (FileName, FileFormat, FilePath, MimeType) of a live file.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT FileName, FileFormat, FilePath, MimeType
+                FROM santova.FileManagement
+                WHERE FileID = %s AND IsDeleted = 0
+            """, (file_id,))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+
+# SQL Server allows 2100 parameters per statement
+DOWNLOAD_COUNT_BATCH = 1000
+
+
+def apply_download_counts(counts):
+    """
+    Adds {FileID: downloads} to DownloadCount in one transaction, one
+    UPDATE ... FROM (VALUES ...) per 1000 files.
+    """
+    items = sorted(counts.items())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for start in range(0, len(items), DOWNLOAD_COUNT_BATCH):
+                batch = items[start:start + DOWNLOAD_COUNT_BATCH]
+                values = ", ".join(["(%s, %s)"] * len(batch))
+                cursor.execute(f"""
+                    UPDATE f
+                    SET DownloadCount = ISNULL(f.DownloadCount, 0) + v.Downloads
+                    FROM santova.FileManagement AS f
+                    JOIN (VALUES {values}) AS v (FileID, Downloads)
+                        ON f.FileID = v.FileID
+                """, tuple(value for item in batch for value in item))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+# Download counts are spooled and flushed in batches (DOWNLOAD_FLUSH_*)
+download_counter = DownloadCounter(apply_download_counts)
+atexit.register(download_counter.close)
+
+
+@file_bp.route("/api/download-stats/file/<int:file_id>", methods=["GET"])
+@token_required
+def file_download_stats_route(user_id, user_name, file_id):
+    """
+    Download count of one file, including downloads not yet flushed to DB.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT FileName, ISNULL(DownloadCount, 0)
+                FROM santova.FileManagement
+                WHERE FileID = %s AND IsDeleted = 0
+            """, (file_id,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+
+    if not row:
+        return jsonify({"success": False, "message": "File not found"}), 404
+
+    pending = download_counter.pending(file_id)
+    return jsonify({
+        "success": True,
+        "FileID": file_id,
+        "FileName": row[0],
+        "DownloadCount": row[1] + pending,
+        "PendingDownloads": pending
+    })
+
+
+@file_bp.route("/api/download-stats/user/<int:stats_user_id>", methods=["GET"])
+@token_required
+def user_download_stats_route(user_id, user_name, stats_user_id):
+    """
+    Downloads of the files a user uploaded, plus the downloads that user
+    made through this server process since it started.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT FileID, ISNULL(DownloadCount, 0)
+                FROM santova.FileManagement
+                WHERE UserID = %s AND IsDeleted = 0
+            """, (stats_user_id,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+    pending = download_counter.pending_for(row[0] for row in rows)
+    return jsonify({
+        "success": True,
+        "UserID": stats_user_id,
+        "FilesUploaded": len(rows),
+        "DownloadsOfUploads": sum(row[1] for row in rows) + pending,
+        "PendingDownloads": pending,
+        "DownloadsMadeSinceStart": download_counter.user_downloads(stats_user_id)
+    })
+
+
+# 🖼️ Derived artifacts (thumbnails, previews, extracted text)
+
+@run_in(lookup_queries)
+def get_file_paths(file_ids):
+    """
+    {FileID: FilePath} for live files, in one round trip.
+    """
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            placeholders = ", ".join(["%s"] * len(file_ids))
+            cursor.execute(f"""
+                SELECT FileID, FilePath
+                FROM santova.FileManagement
+                WHERE FileID IN ({placeholders}) AND IsDeleted = 0
+            """, tuple(file_ids))
+            return dict(cursor.fetchall())
+        finally:
+            cursor.close()
+
+
+def with_artifacts(files):
+    """
+    FileRecords of listing rows with an "Artifacts" map of name -> URL.
+    Costs one query for the whole page.
+    """
+    paths = get_file_paths(f["FileID"] for f in files)
+    decorated = []
+    for f in files:
+        digest = blob_store.digest_of(paths[f["FileID"]]) if paths.get(f["FileID"]) else None
+        names = artifact_cache.artifacts(digest) if digest else []
+        decorated.append(file_record({
+            **f,
+            "Artifacts": {name: f"/api/file-artifacts/{f['FileID']}/{name}" for name in names}
+        }))
+    return decorated
+
+
+_ARTIFACT_MIMETYPES = {"text": "text/plain"}
+
+
+@file_bp.route("/api/file-artifacts/<int:file_id>/<artifact>", methods=["GET"])
+@token_required
+def file_artifact_route(user_id, user_name, file_id, artifact):
+    """
+    Serves a derived artifact: thumbnail, preview, poster or text.
+    """
+    file_path = get_file_paths([file_id]).get(file_id)
+    digest = blob_store.digest_of(file_path) if file_path else None
+    path = artifact_cache.path(digest, artifact) if digest else None
+    if path is None:
+        return jsonify({"success": False, "message": "Artifact not available"}), 404
+
+    response = send_file(
+        path,
+        mimetype=_ARTIFACT_MIMETYPES.get(artifact, "image/jpeg"),
+        conditional=True,
+        etag=f"{digest}-{artifact}",
+        max_age=86400,
+    )
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+@file_bp.route("/api/media-jobs/<job_id>", methods=["GET"])
+@token_required
+def media_job_status_route(user_id, user_name, job_id):
+    """
+    Status of a media post-processing job (queued, running, done, failed, skipped).
+    """
+    job = media_jobs.status(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+
+atexit.register(media_jobs.close)
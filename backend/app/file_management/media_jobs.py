@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.file_management.storage import UPLOAD_FOLDER
+from app.file_management.media_tasks import ARTIFACT_FILES, TaskRefused, TaskUnavailable, run_task, tasks_for
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+DERIVED_FOLDER = os.path.join(UPLOAD_FOLDER, "derived")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class ArtifactCache:
+    """
+    Derived files (thumbnails, previews, extracted text) keyed by the
+    source content's SHA-256, at <root>/ab/<sha256>/. Identical uploads
+    share one set of artifacts.
+    """
+
+    def __init__(self, root=DERIVED_FOLDER):
+        self.root = root
+
+    def directory(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def path(self, digest, artifact):
+        if artifact not in ARTIFACT_FILES:
+            return None
+        path = os.path.join(self.directory(digest), ARTIFACT_FILES[artifact])
+        return path if os.path.exists(path) else None
+
+    def artifacts(self, digest):
+        """Names of the artifacts available for `digest`."""
+        directory = self.directory(digest)
+        if not os.path.isdir(directory):
+            return []
+        present = set(os.listdir(directory))
+        return [name for name, file_name in ARTIFACT_FILES.items() if file_name in present]
+
+    def _done_marker(self, digest, kind):
+        return os.path.join(self.directory(digest), f".{kind}.done")
+
+    def is_done(self, digest, kind):
+        return os.path.exists(self._done_marker(digest, kind))
+
+    def mark_done(self, digest, kind, result):
+        os.makedirs(self.directory(digest), exist_ok=True)
+        with open(self._done_marker(digest, kind), "w") as f:
+            json.dump(result, f)
+
+
+class MediaJobQueue:
+    """
+    Local job queue feeding a process pool with media post-processing.
+
+    Jobs run in `workers` separate processes (the concurrency limit), so
+    decoding images, rendering PDFs and probing videos never blocks a
+    request thread or holds the GIL. A failed job is retried up to
+    `retries` times with a growing delay; a job whose tool is missing is
+    marked skipped. Status is kept for the last `history` jobs.
+    """
+
+    def __init__(self, cache=None, workers=None, retries=None, max_pending=None, history=1000):
+        if workers is None:
+            workers = int(os.environ.get("MEDIA_WORKERS", 2))
+        if retries is None:
+            retries = int(os.environ.get("MEDIA_JOB_RETRIES", 2))
+        if max_pending is None:
+            max_pending = int(os.environ.get("MEDIA_QUEUE_MAX", 1000))
+        self.cache = cache or ArtifactCache()
+        self.workers = workers
+        self.retries = retries
+        self.max_pending = max_pending
+        self.history = history
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = OrderedDict()      # job id -> job dict
+        self._active = {}               # (digest, kind) -> job id
+        self._pending = 0
+        self._closed = False
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: forking a threaded web worker can deadlock the child
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def enqueue(self, digest, source, fmt):
+        """
+        Queues every derivation that applies to a file of format `fmt`
+        and is not cached yet. Returns the job dicts (new or in flight).
+        """
+        jobs = []
+        for kind in tasks_for(fmt):
+            if self.cache.is_done(digest, kind):
+                continue
+            with self._lock:
+                if self._closed:
+                    break
+                active = self._active.get((digest, kind))
+                if active is not None:
+                    jobs.append(dict(self._jobs[active]))
+                    continue
+                now = time.time()
+                job = {
+                    "JobID": uuid.uuid4().hex,
+                    "Kind": kind,
+                    "Digest": digest,
+                    "Status": QUEUED,
+                    "Attempts": 0,
+                    "Error": None,
+                    "Artifacts": [],
+                    "CreatedAt": now,
+                    "UpdatedAt": now,
+                }
+                if self._pending >= self.max_pending:
+                    job["Status"] = SKIPPED
+                    job["Error"] = "Media queue is full"
+                    self._remember_locked(job)
+                    jobs.append(dict(job))
+                    continue
+                self._pending += 1
+                self._active[(digest, kind)] = job["JobID"]
+                self._remember_locked(job)
+                jobs.append(dict(job))
+            self._submit(job, source, fmt)
+        return jobs
+
+    def _remember_locked(self, job):
+        self._jobs[job["JobID"]] = job
+        while len(self._jobs) > self.history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest["Status"] in (QUEUED, RUNNING):
+                break
+            del self._jobs[oldest_id]
+
+    def _submit(self, job, source, fmt):
+        with self._lock:
+            job["Attempts"] += 1
+            job["Status"] = RUNNING
+            job["UpdatedAt"] = time.time()
+            try:
+                future = self._get_executor().submit(
+                    run_task, job["Kind"], source, self.cache.directory(job["Digest"]), fmt
+                )
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._executor = None   # a worker died; start a fresh pool
+                future = None
+                error = e
+        if future is None:
+            self._finished(job, source, fmt, error=error)
+        else:
+            future.add_done_callback(lambda f: self._finished(job, source, fmt, future=f))
+
+    def _finished(self, job, source, fmt, future=None, error=None):
+        result = None
+        if future is not None:
+            try:
+                result = future.result()
+            except BaseException as e:
+                error = e
+                if isinstance(e, BrokenProcessPool):
+                    with self._lock:
+                        self._executor = None
+
+        if error is None:
+            self.cache.mark_done(job["Digest"], job["Kind"], result)
+            self._settle(job, DONE, artifacts=result)
+        elif isinstance(error, TaskUnavailable):
+            # Not cached: runs again once the tool is installed
+            self._settle(job, SKIPPED, error=str(error))
+        elif isinstance(error, TaskRefused):
+            # Same input, same answer: no point retrying
+            log.warning("media job refused", extra={"kind": job["Kind"], "digest": job["Digest"], "error": str(error)})
+            self._settle(job, FAILED, error=str(error))
+        elif job["Attempts"] <= self.retries and not self._closed and os.path.exists(source):
+            with self._lock:
+                job["Status"] = QUEUED
+                job["Error"] = str(error)
+                job["UpdatedAt"] = time.time()
+            retry = threading.Timer(2 ** job["Attempts"], self._submit, args=(job, source, fmt))
+            retry.daemon = True
+            retry.start()
+        else:
+            log.error("media job failed", extra={"kind": job["Kind"], "digest": job["Digest"], "error": str(error)})
+            self._settle(job, FAILED, error=str(error))
+
+    def _settle(self, job, status, artifacts=None, error=None):
+        with self._lock:
+            job["Status"] = status
+            job["Artifacts"] = artifacts or []
+            job["Error"] = error
+            job["UpdatedAt"] = time.time()
+            self._pending -= 1
+            self._active.pop((job["Digest"], job["Kind"]), None)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["Status"]] = counts.get(job["Status"], 0) + 1
+            return {"workers": self.workers, "pending": self._pending, "jobs": counts}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+artifact_cache = ArtifactCache()
+media_jobs = MediaJobQueue(artifact_cache)
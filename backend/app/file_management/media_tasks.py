@@ -0,0 +1,261 @@
+"""
+CPU-heavy derivation steps for uploaded files.
+
+These run inside the media worker processes (see media_jobs.py), so this
+module must stay importable without Flask or a database connection.
+Every task takes (source path, artifact directory) and returns the names
+of the artifacts it wrote; outputs are written to a temp name and renamed
+into place, so readers never see half-written files.
+
+Optional tools: Pillow (image thumbnails), pdftoppm/pdftotext (poppler)
+and ffmpeg. A task whose tool is missing raises TaskUnavailable, which is
+recorded as "skipped" rather than retried.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+THUMBNAIL_SIZE = int(os.environ.get("MEDIA_THUMBNAIL_SIZE", 320))
+PREVIEW_SIZE = int(os.environ.get("MEDIA_PREVIEW_SIZE", 1280))
+TOOL_TIMEOUT = float(os.environ.get("MEDIA_TOOL_TIMEOUT", 120))
+TEXT_MAX_CHARS = int(os.environ.get("MEDIA_TEXT_MAX_CHARS", 1_000_000))
+# Limits on what an upload may expand to before we decode it
+MAX_IMAGE_PIXELS = int(os.environ.get("MEDIA_MAX_IMAGE_PIXELS", 100_000_000))
+MAX_XML_PART_BYTES = int(os.environ.get("MEDIA_MAX_XML_PART_MB", 64)) * 1024 * 1024
+MAX_XML_TOTAL_BYTES = int(os.environ.get("MEDIA_MAX_XML_TOTAL_MB", 256)) * 1024 * 1024
+
+# Artifact name -> file name inside the artifact directory
+ARTIFACT_FILES = {
+    "thumbnail": "thumbnail.jpg",
+    "preview": "preview.jpg",
+    "poster": "poster.jpg",
+    "text": "text.txt",
+}
+
+
+class TaskUnavailable(Exception):
+    """The tool a task needs is not installed on this host."""
+
+
+class TaskRefused(Exception):
+    """The source is over a size limit (e.g. a decompression bomb); not retried."""
+
+
+def _open_image(path):
+    # Image.open only reads the header; check the size before any decoding.
+    # (Pillow's own MAX_IMAGE_PIXELS merely warns up to twice its limit.)
+    try:
+        image = Image.open(path)
+    except Image.DecompressionBombError as e:
+        raise TaskRefused(str(e))
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        image.close()
+        raise TaskRefused(f"Image is {width}x{height}, over MEDIA_MAX_IMAGE_PIXELS ({MAX_IMAGE_PIXELS})")
+    return image
+
+
+def _output(directory, artifact):
+    return os.path.join(directory, ARTIFACT_FILES[artifact])
+
+
+def _tmp_path(directory, suffix):
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def _publish(tmp_path, directory, artifact):
+    os.replace(tmp_path, _output(directory, artifact))
+    return artifact
+
+
+def _run(args):
+    subprocess.run(args, check=True, timeout=TOOL_TIMEOUT,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def _require(tool):
+    path = shutil.which(tool)
+    if path is None:
+        raise TaskUnavailable(f"{tool} is not installed")
+    return path
+
+
+def _save_scaled(image, directory, artifact, size):
+    scaled = image.copy()
+    scaled.thumbnail((size, size))
+    if scaled.mode not in ("RGB", "L"):
+        scaled = scaled.convert("RGB")
+    tmp = _tmp_path(directory, ".jpg")
+    try:
+        scaled.save(tmp, "JPEG", quality=85, optimize=True)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return _publish(tmp, directory, artifact)
+
+
+def _thumbnail_from(image_path, directory):
+    if Image is None:
+        raise TaskUnavailable("Pillow is not installed")
+    with _open_image(image_path) as image:
+        image.seek(0)   # first frame of animated GIFs / multi-page TIFFs
+        image = ImageOps.exif_transpose(image)
+        return _save_scaled(image, directory, "thumbnail", THUMBNAIL_SIZE)
+
+
+# -- tasks ----------------------------------------------------------------
+
+def image_previews(source, directory):
+    """Thumbnail and screen-sized preview of an image."""
+    if Image is None:
+        raise TaskUnavailable("Pillow is not installed")
+    with _open_image(source) as image:
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        return [
+            _save_scaled(image, directory, "preview", PREVIEW_SIZE),
+            _save_scaled(image, directory, "thumbnail", THUMBNAIL_SIZE),
+        ]
+
+
+def pdf_first_page(source, directory):
+    """Render page 1 of a PDF as the preview, plus a thumbnail."""
+    pdftoppm = _require("pdftoppm")
+    prefix = _tmp_path(directory, "")
+    try:
+        _run([pdftoppm, "-f", "1", "-l", "1", "-singlefile", "-jpeg",
+              "-scale-to", str(PREVIEW_SIZE), source, prefix])
+        produced = [_publish(prefix + ".jpg", directory, "preview")]
+    finally:
+        for leftover in (prefix, prefix + ".jpg"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    try:
+        produced.append(_thumbnail_from(_output(directory, "preview"), directory))
+    except TaskUnavailable:
+        pass
+    return produced
+
+
+def video_poster(source, directory):
+    """Poster frame (one second in, or the first frame) plus a thumbnail."""
+    ffmpeg = _require("ffmpeg")
+    produced = []
+    for artifact, size in (("poster", PREVIEW_SIZE), ("thumbnail", THUMBNAIL_SIZE)):
+        tmp = _tmp_path(directory, ".jpg")
+        scale = f"scale='min({size},iw)':-2"
+        try:
+            try:
+                _run([ffmpeg, "-y", "-loglevel", "error", "-ss", "1", "-i", source,
+                      "-frames:v", "1", "-vf", scale, tmp])
+                if not os.path.getsize(tmp):
+                    raise subprocess.CalledProcessError(1, ffmpeg)
+            except subprocess.CalledProcessError:
+                # Shorter than a second
+                _run([ffmpeg, "-y", "-loglevel", "error", "-i", source,
+                      "-frames:v", "1", "-vf", scale, tmp])
+            produced.append(_publish(tmp, directory, artifact))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return produced
+
+
+_OOXML_PARTS = {
+    "docx": re.compile(r"word/(document|header\d*|footer\d*)\.xml$"),
+    "pptx": re.compile(r"ppt/slides/slide\d+\.xml$"),
+    "xlsx": re.compile(r"xl/sharedStrings\.xml$"),
+}
+
+
+def _ooxml_text(source, fmt):
+    pattern = _OOXML_PARTS[fmt]
+    chunks = []
+    with zipfile.ZipFile(source) as archive:
+        names = sorted((n for n in archive.namelist() if pattern.match(n)),
+                       key=lambda n: [int(d) if d.isdigit() else d for d in re.split(r"(\d+)", n)])
+        total = 0
+        for name in names:
+            # file_size is what read() inflates to (it stops there), so a
+            # small zip bomb is refused before anything is decompressed
+            size = archive.getinfo(name).file_size
+            total += size
+            if size > MAX_XML_PART_BYTES or total > MAX_XML_TOTAL_BYTES:
+                raise TaskRefused(f"{name} inflates to {size} bytes ({total} in total), over the MEDIA_MAX_XML_* limits")
+            root = ElementTree.fromstring(archive.read(name))
+            for element in root.iter():
+                tag = element.tag.rsplit("}", 1)[-1]
+                if tag == "t" and element.text:
+                    chunks.append(element.text)
+                elif tag in ("p", "br", "si"):
+                    chunks.append("\n")
+    return "".join(chunks)
+
+
+def extract_text(source, directory, fmt):
+    """Plain text of a document, for search and previews."""
+    if fmt == "pdf":
+        tmp = _tmp_path(directory, ".txt")
+        try:
+            _run([_require("pdftotext"), "-enc", "UTF-8", source, tmp])
+            with open(tmp, encoding="utf-8", errors="replace") as f:
+                text = f.read(TEXT_MAX_CHARS)
+        finally:
+            os.remove(tmp)
+    elif fmt in _OOXML_PARTS:
+        text = _ooxml_text(source, fmt)[:TEXT_MAX_CHARS]
+    elif fmt == "txt":
+        with open(source, "rb") as f:
+            text = f.read(TEXT_MAX_CHARS * 4).decode("utf-8", errors="replace")[:TEXT_MAX_CHARS]
+    else:
+        raise TaskUnavailable(f"No text extractor for .{fmt}")
+
+    tmp = _tmp_path(directory, ".txt")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(re.sub(r"\n{3,}", "\n\n", text).strip())
+    return [_publish(tmp, directory, "text")]
+
+
+TASKS = {
+    "image": image_previews,
+    "pdf_preview": pdf_first_page,
+    "poster": video_poster,
+    "text": extract_text,
+}
+
+_IMAGE_FORMATS = {"jpg", "jpeg", "png", "gif", "bmp", "tiff", "jfif"}
+_VIDEO_FORMATS = {"mp4", "mov", "avi", "mkv", "webm"}
+_TEXT_FORMATS = {"pdf", "docx", "pptx", "xlsx", "txt"}
+
+
+def tasks_for(fmt):
+    """Task kinds worth running for a file format."""
+    kinds = []
+    if fmt in _IMAGE_FORMATS:
+        kinds.append("image")
+    if fmt == "pdf":
+        kinds.append("pdf_preview")
+    if fmt in _VIDEO_FORMATS:
+        kinds.append("poster")
+    if fmt in _TEXT_FORMATS:
+        kinds.append("text")
+    return kinds
+
+
+def run_task(kind, source, directory, fmt):
+    """Worker-process entry point."""
+    os.makedirs(directory, exist_ok=True)
+    if kind == "text":
+        return TASKS[kind](source, directory, fmt)
+    return TASKS[kind](source, directory)
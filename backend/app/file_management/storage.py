@@ -0,0 +1,147 @@
+import hashlib
+import os
+import tempfile
+
+from werkzeug.formparser import FormDataParser
+
+UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
+
+# Partial uploads live next to the final folders so os.replace() stays on
+# one filesystem and is atomic.
+TMP_FOLDER = os.path.join(UPLOAD_FOLDER, ".tmp")
+
+CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+_MB = 1024 * 1024
+
+FILE_CATEGORIES = {
+    "document": {"pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "txt"},
+    "image": {"jpg", "jpeg", "png", "gif", "bmp", "tiff", "svg", "jfif"},
+    "video": {"mp4", "mov", "avi", "mkv", "webm"},
+    "design": {"drawio", "vsdx", "xml", "psd", "ai", "flowchart", "diagram"},
+}
+
+# Per-category size limits in bytes (UPLOAD_MAX_<CATEGORY>_MB)
+SIZE_LIMITS = {
+    "document": int(os.environ.get("UPLOAD_MAX_DOCUMENT_MB", 100)) * _MB,
+    "image": int(os.environ.get("UPLOAD_MAX_IMAGE_MB", 50)) * _MB,
+    "video": int(os.environ.get("UPLOAD_MAX_VIDEO_MB", 4096)) * _MB,
+    "design": int(os.environ.get("UPLOAD_MAX_DESIGN_MB", 200)) * _MB,
+}
+
+# Multipart boundaries and the small form fields around the file
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the size limit for its file type."""
+
+    def __init__(self, limit):
+        super().__init__(f"File exceeds the {limit // _MB} MB limit for this file type")
+        self.limit = limit
+
+
+def file_extension(filename):
+    return filename.rsplit(".", 1)[1].lower() if filename and "." in filename else ""
+
+
+def size_limit_for(filename):
+    """Size limit in bytes for `filename`'s type (the largest limit if unknown)."""
+    ext = file_extension(filename)
+    for category, extensions in FILE_CATEGORIES.items():
+        if ext in extensions:
+            return SIZE_LIMITS[category]
+    return max_upload_size()
+
+
+def max_upload_size():
+    return max(SIZE_LIMITS.values())
+
+
+class HashingFile:
+    """
+    Write-only temp file that counts bytes and hashes them as they arrive,
+    refusing to grow past `limit`.
+    """
+
+    def __init__(self, limit, directory=None):
+        directory = directory or TMP_FOLDER
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self.limit = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise UploadTooLarge(self.limit)
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    # werkzeug rewinds finished file parts
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def parse_streaming_upload(request):
+    """
+    Parses a multipart request, streaming every file part straight into a
+    HashingFile (no in-memory copy, no second write).
+
+    Returns (form, files) where files maps field name -> (filename,
+    content_type, HashingFile). Raises UploadTooLarge; partial files are
+    removed in that case.
+    """
+    if request.content_length is not None and request.content_length > max_upload_size() + FORM_OVERHEAD:
+        raise UploadTooLarge(max_upload_size())
+
+    created = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        limit = size_limit_for(filename)
+        if content_length is not None and content_length > limit:
+            raise UploadTooLarge(limit)
+        target = HashingFile(limit)
+        created.append(target)
+        return target
+
+    parser = FormDataParser(
+        stream_factory=stream_factory,
+        max_form_memory_size=request.max_form_memory_size,
+        max_form_parts=request.max_form_parts,
+        silent=False,
+    )
+    try:
+        _, form, files = parser.parse(
+            request.stream, request.mimetype, request.content_length, request.mimetype_params
+        )
+    except BaseException:
+        for target in created:
+            target.discard()
+        raise
+
+    parts = {}
+    for name, storage in files.items(multi=False):
+        target = storage.stream
+        target.close()
+        parts[name] = (storage.filename, storage.content_type, target)
+    for target in created:
+        if all(target is not part[2] for part in parts.values()):
+            target.discard()
+    return form, parts
+
@@ -0,0 +1,388 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from flask import Blueprint, request, jsonify
+from werkzeug.utils import secure_filename
+
+from app.Database.pool import PoolError
+from app.auth_middleware import token_required
+from app.file_management.file_management import allowed_file, save_uploaded_file
+from app.file_management.blob_store import blob_store
+from app.file_management.storage import TMP_FOLDER, CHUNK_SIZE, UploadTooLarge, size_limit_for
+
+upload_session_bp = Blueprint("upload_session_bp", __name__)
+
+SESSION_FOLDER = os.path.join(TMP_FOLDER, "sessions")
+MAX_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_MB", 64)) * 1024 * 1024
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class OffsetMismatch(ValueError):
+    """A chunk did not start where the upload currently ends."""
+
+    def __init__(self, expected):
+        super().__init__(f"Chunk must start at byte {expected}")
+        self.expected = expected
+
+
+class UploadSessionStore:
+    """
+    Resumable uploads for very large files.
+
+    Each session is a JSON metadata file plus a .part data file under
+    `directory`, so an interrupted upload can resume from the last stored
+    offset, even after a restart. Chunks must arrive in order; the SHA-256
+    is computed incrementally while they do, and recomputed from disk only
+    if that state was lost.
+    """
+
+    def __init__(self, directory=SESSION_FOLDER, ttl=None):
+        if ttl is None:
+            ttl = float(os.environ.get("UPLOAD_SESSION_TTL", 24 * 3600))
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._session_locks = {}
+        self._hashers = {}      # upload_id -> (offset, sha256)
+
+    def _paths(self, upload_id):
+        base = os.path.join(self.directory, upload_id)
+        return base + ".json", base + ".part"
+
+    def _save(self, session):
+        meta_path, _ = self._paths(session["UploadID"])
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, meta_path)
+
+    def session_lock(self, upload_id):
+        """Serializes requests on one session within this process."""
+        if not _UPLOAD_ID.fullmatch(upload_id) or not os.path.exists(self._paths(upload_id)[0]):
+            return threading.Lock()     # unknown session; get() will 404
+        with self._lock:
+            return self._session_locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, user_id, file_name, file_size, **fields):
+        self.purge_expired()
+        os.makedirs(self.directory, exist_ok=True)
+        limit = size_limit_for(file_name)
+        if file_size > limit:
+            raise UploadTooLarge(limit)
+
+        now = time.time()
+        session = {
+            "UploadID": uuid.uuid4().hex,
+            "UserID": user_id,
+            "FileName": file_name,
+            "FileSize": file_size,
+            "Offset": 0,
+            "CreatedAt": now,
+            "ExpiresAt": now + self.ttl,
+            **fields,
+        }
+        open(self._paths(session["UploadID"])[1], "wb").close()
+        self._save(session)
+        self._hashers[session["UploadID"]] = (0, hashlib.sha256())
+        return session
+
+    def get(self, upload_id, user_id):
+        """The session if it exists, has not expired and belongs to `user_id`."""
+        if not _UPLOAD_ID.fullmatch(upload_id):
+            return None
+        try:
+            with open(self._paths(upload_id)[0]) as f:
+                session = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if session["UserID"] != user_id or session["ExpiresAt"] < time.time():
+            return None
+        return session
+
+    def write_chunk(self, session, start, stream, length):
+        """
+        Appends `length` bytes read from `stream` at offset `start`.
+        Call with session_lock(upload_id) held. Returns the new offset.
+        """
+        upload_id = session["UploadID"]
+        if start != session["Offset"]:
+            raise OffsetMismatch(session["Offset"])
+        if start + length > session["FileSize"]:
+            raise UploadTooLarge(session["FileSize"])
+
+        offset, sha256 = self._hashers.get(upload_id, (None, None))
+        if offset != start:
+            sha256 = None   # hash state lost; recomputed on completion
+
+        _, part_path = self._paths(upload_id)
+        with open(part_path, "r+b") as f:
+            f.seek(start)
+            remaining = length
+            try:
+                while remaining:
+                    data = stream.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        raise ValueError("Chunk ended early")
+                    f.write(data)
+                    if sha256 is not None:
+                        sha256.update(data)
+                    remaining -= len(data)
+            except BaseException:
+                # Keep the file consistent with the stored offset
+                f.truncate(start)
+                self._hashers.pop(upload_id, None)
+                raise
+            f.truncate()
+
+        session["Offset"] = start + length
+        session["ExpiresAt"] = time.time() + self.ttl
+        self._save(session)
+        if sha256 is not None:
+            self._hashers[upload_id] = (session["Offset"], sha256)
+        return session["Offset"]
+
+    def finish(self, session):
+        """
+        Returns (part_path, sha256 hex) for a fully received upload and
+        forgets the session metadata; the caller moves the data file.
+        """
+        upload_id = session["UploadID"]
+        meta_path, part_path = self._paths(upload_id)
+        offset, sha256 = self._hashers.pop(upload_id, (None, None))
+        if offset != session["FileSize"]:
+            sha256 = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for data in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha256.update(data)
+        os.remove(meta_path)
+        self._forget(upload_id)
+        return part_path, sha256.hexdigest()
+
+    def abort(self, session):
+        upload_id = session["UploadID"]
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._hashers.pop(upload_id, None)
+        self._forget(upload_id)
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
+
+    def purge_expired(self):
+        """Removes sessions whose clients never came back."""
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    session = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if session.get("ExpiresAt", 0) < now:
+                self.abort(session)
+
+    def status(self, session):
+        return {
+            "UploadID": session["UploadID"],
+            "FileName": session["FileName"],
+            "FileSize": session["FileSize"],
+            "Offset": session["Offset"],
+            "Complete": session["Offset"] == session["FileSize"],
+            "ChunkSize": CHUNK_SIZE,
+            "MaxChunkSize": MAX_CHUNK_SIZE,
+            "ExpiresAt": session["ExpiresAt"],
+        }
+
+
+upload_sessions = UploadSessionStore()
+
+
+def _not_found():
+    return jsonify({"success": False, "message": "Upload session not found"}), 404
+
+
+@upload_session_bp.route("/api/file-management/uploads", methods=["POST"])
+@token_required
+def create_upload_session_route(user_id, user_name):
+    """
+    Starts a resumable upload.
+    Body JSON: { "FileName": "demo.mkv", "FileSize": 123, "ProcessID": 1,
+                 "FileType": "Video", "Description": "...", "MimeType": "video/x-matroska",
+                 "SHA256": "<optional hex digest>" }
+
+    When SHA256 names content that is already stored (same size), the
+    file is saved right away without uploading a byte (201, "Deduplicated").
+    """
+    data = request.json or {}
+    file_name = data.get("FileName")
+    file_size = data.get("FileSize")
+
+    if not file_name or not allowed_file(file_name):
+        return jsonify({"success": False, "message": "File type not allowed"}), 400
+    if not isinstance(file_size, int) or file_size <= 0:
+        return jsonify({"success": False, "message": "FileSize must be a positive integer"}), 400
+
+    digest = data.get("SHA256")
+    if digest:
+        try:
+            blob_path = blob_store.path_for(digest)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        if os.path.exists(blob_path) and os.path.getsize(blob_path) == file_size:
+            filename = secure_filename(file_name)
+            try:
+                saved = save_uploaded_file(
+                    digest.lower(), None,
+                    user_id, data.get("ProcessID"), filename, data.get("FileType"),
+                    data.get("MimeType"), file_size, filename.rsplit(".", 1)[1].lower(),
+                    data.get("Description")
+                )
+            except PoolError:
+                raise
+            except Exception as e:
+                return jsonify({"success": False, "message": str(e)}), 500
+            if saved is not None:
+                new_file_id, uploaded_by_name, _, _ = saved
+                return jsonify({
+                    "success": True,
+                    "message": "File uploaded successfully",
+                    "NewFileID": new_file_id,
+                    "UploadedByName": uploaded_by_name or user_name,
+                    "SHA256": digest.lower(),
+                    "Deduplicated": True
+                }), 201
+
+    try:
+        session = upload_sessions.create(
+            user_id, file_name, file_size,
+            ProcessID=data.get("ProcessID"),
+            FileType=data.get("FileType"),
+            Description=data.get("Description"),
+            MimeType=data.get("MimeType"),
+        )
+    except UploadTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+
+    return jsonify({"success": True, **upload_sessions.status(session)}), 201
+
+
+@upload_session_bp.route("/api/file-management/uploads/<upload_id>", methods=["GET"])
+@token_required
+def upload_session_status_route(user_id, user_name, upload_id):
+    """
+    Reports how many bytes have been stored, so a client can resume.
+    """
+    session = upload_sessions.get(upload_id, user_id)
+    if session is None:
+        return _not_found()
+    return jsonify({"success": True, **upload_sessions.status(session)})
+
+
+@upload_session_bp.route("/api/file-management/uploads/<upload_id>", methods=["PUT"])
+@token_required
+def upload_chunk_route(user_id, user_name, upload_id):
+    """
+    Stores one chunk. Headers: Content-Range: bytes <start>-<end>/<total>
+    The body is the raw chunk; it must start at the current Offset.
+    """
+    match = _CONTENT_RANGE.fullmatch(request.headers.get("Content-Range", ""))
+    if not match:
+        return jsonify({"success": False, "message": "Content-Range header is required"}), 400
+    start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+    length = end - start + 1
+    if length <= 0 or (request.content_length is not None and request.content_length != length):
+        return jsonify({"success": False, "message": "Content-Range does not match the body"}), 400
+    if length > MAX_CHUNK_SIZE:
+        return jsonify({"success": False, "message": "Chunk is too large"}), 413
+
+    with upload_sessions.session_lock(upload_id):
+        session = upload_sessions.get(upload_id, user_id)
+        if session is None:
+            return _not_found()
+        if total != "*" and int(total) != session["FileSize"]:
+            return jsonify({"success": False, "message": "Content-Range total does not match FileSize"}), 400
+        try:
+            offset = upload_sessions.write_chunk(session, start, request.stream, length)
+        except OffsetMismatch as e:
+            return jsonify({"success": False, "message": str(e), "Offset": e.expected}), 409
+        except UploadTooLarge:
+            return jsonify({"success": False, "message": "Chunk goes past FileSize"}), 413
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e), "Offset": session["Offset"]}), 400
+
+    return jsonify({"success": True, "Offset": offset, "Complete": offset == session["FileSize"]})
+
+
+@upload_session_bp.route("/api/file-management/uploads/<upload_id>/complete", methods=["POST"])
+@token_required
+def complete_upload_session_route(user_id, user_name, upload_id):
+    """
+    Finishes a resumable upload: moves the file into place and saves its
+    metadata. Optional body JSON: { "SHA256": "<hex digest to verify>" }
+    """
+    data = request.get_json(silent=True) or {}
+
+    with upload_sessions.session_lock(upload_id):
+        session = upload_sessions.get(upload_id, user_id)
+        if session is None:
+            return _not_found()
+        if session["Offset"] != session["FileSize"]:
+            return jsonify({"success": False, "message": "Upload is incomplete", "Offset": session["Offset"]}), 409
+
+        part_path, sha256 = upload_sessions.finish(session)
+
+    expected = data.get("SHA256")
+    if expected and expected.lower() != sha256:
+        os.remove(part_path)
+        return jsonify({"success": False, "message": "Checksum mismatch"}), 422
+
+    filename = secure_filename(session["FileName"])
+    file_format = filename.rsplit(".", 1)[1].lower()
+
+    try:
+        new_file_id, uploaded_by_name, _, jobs = save_uploaded_file(
+            sha256, part_path,
+            user_id, session["ProcessID"], filename, session["FileType"], session["MimeType"],
+            session["FileSize"], file_format, session["Description"]
+        )
+    except PoolError:
+        raise
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    return jsonify({
+        "success": True,
+        "message": "File uploaded successfully",
+        "NewFileID": new_file_id,
+        "UploadedByName": uploaded_by_name or user_name,
+        "SHA256": sha256,
+        "MediaJobs": [job["JobID"] for job in jobs]
+    }), 201
+
+
+@upload_session_bp.route("/api/file-management/uploads/<upload_id>", methods=["DELETE"])
+@token_required
+def abort_upload_session_route(user_id, user_name, upload_id):
+    """
+    Abandons a resumable upload and removes its partial data.
+    """
+    with upload_sessions.session_lock(upload_id):
+        session = upload_sessions.get(upload_id, user_id)
+        if session is None:
+            return _not_found()
+        upload_sessions.abort(session)
+    return jsonify({"success": True, "message": "Upload cancelled"})
@@ -1,45 +1,146 @@
-from flask import Blueprint, jsonify, request
-from app.Database.connection import connect_to_database
-import jwt
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Blueprint, jsonify, g
+from app.Database.connection import get_connection
+from app.Database.pool import PoolError
+from app.Database.executor import lookup_queries, run_in
+from app.auth_middleware import token_required
+from app.serialization import Company
+from app.logs import get_logger
 
 process_api = Blueprint('processes_api', __name__)
+log = get_logger(__name__)
 
-# Example secret key for JWT decoding
-JWT_SECRET = "your_jwt_secret_here"
 
-@process_api.route('/api/processes', methods=['GET'])
-def get_all_processes():
-    try:
-        token = request.headers.get("Authorization")
-        if not token:
-            return jsonify({"error": "Authorization token missing"}), 401
-        if token.startswith("Bearer "):
-            token = token[7:]
+class CompanyProcessCache:
+    """
+    Company rows for the upload popup, cached per company set.
+
+    Users whose tokens carry the same CompanyIds share one entry (the key
+    is the frozenset of IDs; an empty set means "all companies"). Entries
+    live for `ttl` seconds and at most `max_entries` sets are kept. A miss
+    loads under a per-key lock, so a burst of popups for the same set runs
+    one query.
+    """
+
+    def __init__(self, loader, ttl=None, max_entries=None):
+        if ttl is None:
+            ttl = float(os.environ.get("PROCESS_CACHE_TTL", 300))
+        if max_entries is None:
+            max_entries = int(os.environ.get("PROCESS_CACHE_ENTRIES", 1024))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # frozenset -> (rows, loaded_at)
+        self._loading = {}              # frozenset -> lock held while loading
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, company_ids):
+        key = frozenset(company_ids or ())
+        with self._lock:
+            rows = self._fresh_locked(key)
+            if rows is not None:
+                self._hits += 1
+                return rows
+            self._misses += 1
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                rows = self._fresh_locked(key)
+                if rows is not None:
+                    return rows
+                generation = self._generation
+            rows = self._loader(sorted(key))
+            with self._lock:
+                # Skip the store if an invalidation ran while we were loading
+                if generation == self._generation:
+                    self._entries[key] = (rows, time.monotonic())
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                self._loading.pop(key, None)
+            return rows
+
+    def _fresh_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        rows, loaded_at = entry
+        if time.monotonic() - loaded_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return rows
+
+    def invalidate(self, company_ids=None):
+        """
+        Drops every cached set containing any of `company_ids` (plus the
+        "all companies" set), or everything when called without IDs.
+        """
+        with self._lock:
+            self._generation += 1
+            if company_ids is None:
+                self._entries.clear()
+                return
+            changed = set(company_ids)
+            for key in list(self._entries):
+                if not key or key & changed:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
 
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        company_ids = payload.get("CompanyIds")  # this is a list
 
-        conn = connect_to_database()
+@run_in(lookup_queries)
+def get_companies_from_db(company_ids):
+    with get_connection() as conn:
         cursor = conn.cursor()
 
         if company_ids:
             placeholders = ",".join(["%s"] * len(company_ids))
             cursor.execute(
                 f"SELECT CompanyId, Name AS CompanyName FROM santova.Company WHERE CompanyId IN ({placeholders})",
-                company_ids
+                tuple(company_ids)
             )
         else:
             cursor.execute("SELECT CompanyId, Name AS CompanyName FROM santova.Company")
 
-        columns = [column[0] for column in cursor.description]
-        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        rows = [Company(*row) for row in cursor.fetchall()]
 
         cursor.close()
-        conn.close()
+    return rows
 
+
+process_cache = CompanyProcessCache(get_companies_from_db)
+
+
+def invalidate_processes(company_ids=None):
+    """Call after editing santova.Company rows."""
+    process_cache.invalidate(company_ids)
+
+
+@process_api.route('/api/processes', methods=['GET'])
+@token_required
+def get_all_processes(user_id, user_name):
+    try:
+        rows = process_cache.get(g.principal.company_ids)
         return jsonify({"processes": rows})
+    except PoolError:
+        raise
     except Exception as e:
-        print("Error fetching processes:", e)
+        log.exception("fetching processes failed")
         return jsonify({"error": str(e)}), 500
-
-
@@ -0,0 +1,48 @@
+"""
+Per-worker setup and teardown for the production server (gunicorn.conf.py).
+
+The app is imported once in the master and forked into the workers, so
+nothing that owns a socket, thread or process pool may exist before the
+fork: the connection pool, flusher threads and media executor are all
+created lazily, on first use inside a worker. These hooks bracket a
+worker's life:
+
+    start_worker()   after fork: open the worker's own DB connections
+    begin_drain()    on SIGTERM: end SSE streams, which would otherwise
+                     hold the graceful shutdown until it times out
+    stop_worker()    on exit: flush queued writes, then close the DB
+                     executors and the pool
+"""
+from app.Database import close_pool, get_pool
+from app.Database.executor import EXECUTORS
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+
+def start_worker():
+    # Creating the pool warms DB_POOL_MIN_SIZE connections, so the first
+    # requests don't pay for them
+    get_pool()
+
+
+def begin_drain():
+    from app.discussion import discussion_events
+    discussion_events.close()
+
+
+def stop_worker():
+    from app.discussion import discussion_events, reaction_queue
+    from app.file_management.file_management import download_counter, media_jobs
+
+    discussion_events.close()
+    # Queued reaction toggles and download counts still need the pool
+    for flush in (reaction_queue.close, download_counter.close):
+        try:
+            flush()
+        except Exception as e:
+            log.error("flushing on worker exit failed", extra={"error": str(e)})
+    media_jobs.close()
+    for executor in EXECUTORS:
+        executor.close()
+    close_pool()
@@ -0,0 +1,85 @@
+"""
+Leveled, structured logging for the backend.
+
+    log = get_logger(__name__)
+    log.error("rulebook refresh failed", extra={"error": str(e)})
+    log.debug("add-comment payload", extra={"keys": sorted(data), "sample": 0.01})
+
+configure_logging() (called by create_app) sends the "orbis" loggers to
+stderr, one JSON object per line: ts, level, logger, msg, the `extra`
+fields, and the traceback for log.exception(). LOG_FORMAT=text gives
+plain lines for local work.
+
+LOG_LEVEL (INFO) is the threshold; a debug call below it costs one level
+check. DEBUG and INFO records that pass are sampled: LOG_SAMPLE_RATE of
+them are kept (1.0, all), or the record's own `sample` rate, so chatty
+per-request lines can stay in the code without flooding the log.
+WARNING and above are always kept.
+"""
+import json
+import logging
+import os
+import random
+
+ROOT_LOGGER = "orbis"
+
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+
+def get_logger(name):
+    """Logger for a module: "app.discussion" -> "orbis.discussion"."""
+    if name.startswith("app."):
+        name = name[4:]
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """Keeps `rate` of the records below WARNING (or the record's `sample`)."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, "sample", self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+_configured = False
+
+
+def configure_logging():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler()
+    if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    handler.addFilter(SampleFilter(float(os.environ.get("LOG_SAMPLE_RATE", 1.0))))
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.addHandler(handler)
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
@@ -0,0 +1,252 @@
+"""
+Request and database metrics, exposed at /metrics in Prometheus text format.
+
+Counters and histograms are sharded per thread: each thread writes to
+its own dict, so recording a value takes no lock and never contends with
+other request threads (a shard has a single writer; a scrape copies each
+shard, which is atomic for a dict under the GIL, and merges them). Shards
+of finished threads are kept so counters never go backwards.
+
+    REQUESTS = counter("orbis_http_requests_total", "...", ("route", "status"))
+    REQUESTS.inc("/api/get-comments", "200")
+    LATENCY.observe(0.012, "/api/get-comments")
+
+Values are per process: with several gunicorn workers each scrape sees
+the worker that answered it, labelled by `pid`, and dashboards sum over
+workers.
+
+Metrics.init_app(app) records, per blueprint and route template:
+latency, status counts, response bytes and unhandled exceptions. The DB
+layer (app/Database/instrumented.py) records connection-acquire time and
+per-statement duration, rows and errors.
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import g, got_request_exception, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._shards = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def shard(self):
+        """This thread's dict of (name, labels) -> value."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def set_collector(self, key, collect):
+        """
+        `collect()` returns [(name, help, [(labels dict, value), ...])] of
+        gauges, read at scrape time. Setting `key` again replaces it.
+        """
+        with self._lock:
+            self._collectors[key] = collect
+
+    def _merged(self):
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for key, value in shard.copy().items():
+                if isinstance(value, list):
+                    value = list(value)
+                    total = merged.get(key)
+                    if total is None:
+                        merged[key] = value
+                    else:
+                        for i, v in enumerate(value):
+                            total[i] += v
+                else:
+                    merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self):
+        """All metrics in Prometheus text exposition format 0.0.4."""
+        merged = self._merged()
+        by_name = {}
+        for (name, labels), value in merged.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        pid = str(os.getpid())
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+            collectors = list(self._collectors.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(by_name.get(metric.name, ()), key=lambda item: item[0]):
+                lines.extend(metric.samples(dict(zip(metric.labelnames, labels), pid=pid), value))
+        for collect in collectors:
+            try:
+                gauges = collect()
+            except Exception as e:
+                lines.append(f"# collector error: {type(e).__name__}")
+                continue
+            for name, help_text, samples in gauges:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(dict(labels, pid=pid))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+
+    def inc(self, *labels, value=1):
+        shard = self._registry.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def samples(self, labels, value):
+        return [f"{self.name}{_labels(labels)} {_number(value)}"]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._registry = registry
+
+    def observe(self, value, *labels):
+        shard = self._registry.shard()
+        key = (self.name, labels)
+        cell = shard.get(key)
+        if cell is None:
+            # One count per bucket, then +Inf, then the sum
+            cell = shard[key] = [0] * (len(self.buckets) + 2)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def samples(self, labels, cell):
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), cell[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels(dict(labels, le=_number(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {_number(cell[-1])}")
+        lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+registry = Registry()
+
+
+def counter(name, help_text, labelnames=()):
+    return registry.register(Counter(registry, name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+    return registry.register(Histogram(registry, name, help_text, labelnames, buckets))
+
+
+# -- HTTP -------------------------------------------------------------
+
+HTTP_REQUESTS = counter("orbis_http_requests_total", "HTTP requests by route and status.",
+                        ("blueprint", "route", "method", "status"))
+HTTP_LATENCY = histogram("orbis_http_request_duration_seconds",
+                         "Time from the request reaching Flask to the response headers.",
+                         ("blueprint", "route", "method"))
+HTTP_RESPONSE_BYTES = histogram("orbis_http_response_bytes",
+                                "Response body size as sent (after compression); streamed responses excluded.",
+                                ("blueprint", "route"), buckets=BYTES_BUCKETS)
+HTTP_EXCEPTIONS = counter("orbis_http_exceptions_total", "Unhandled exceptions raised by views.",
+                          ("blueprint", "route", "exception"))
+
+# -- database ---------------------------------------------------------
+
+DB_ACQUIRE = histogram("orbis_db_connection_acquire_seconds",
+                       "Time to check a connection out of the pool.")
+DB_STATEMENT = histogram("orbis_db_statement_duration_seconds",
+                         "Statement time from execute to its last fetch, by procedure or table.",
+                         ("statement",))
+DB_ROWS = counter("orbis_db_rows_fetched_total", "Rows fetched, by procedure or table.", ("statement",))
+DB_ERRORS = counter("orbis_db_errors_total", "Statements that raised, by procedure or table.", ("statement",))
+
+
+def _route():
+    rule = request.url_rule
+    return request.blueprint or "app", rule.rule if rule is not None else "unmatched"
+
+
+class Metrics:
+    """Flask hooks for the HTTP metrics; one shared instance, `metrics`."""
+
+    def init_app(self, app):
+        # after_request hooks run in reverse order of registration: init
+        # this first so it sees the final response (compressed, with CORS)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        got_request_exception.connect(self._exception, app, weak=False)
+
+    def _start(self):
+        g.metrics_start = time.perf_counter()
+
+    def _finish(self, response):
+        start = g.pop("metrics_start", None)
+        blueprint, route = _route()
+        HTTP_REQUESTS.inc(blueprint, route, request.method, str(response.status_code))
+        if start is not None:
+            HTTP_LATENCY.observe(time.perf_counter() - start, blueprint, route, request.method)
+        if not response.is_streamed and response.content_length is not None:
+            HTTP_RESPONSE_BYTES.observe(response.content_length, blueprint, route)
+        return response
+
+    def _exception(self, sender, exception, **extra):
+        blueprint, route = _route()
+        HTTP_EXCEPTIONS.inc(blueprint, route, type(exception).__name__)
+
+
+metrics = Metrics()
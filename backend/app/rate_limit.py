@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by an arbitrary string (client IP, account email).
+
+    Each key gets `burst` tokens, refilled at `rate` tokens per second; an
+    attempt spends one. Buckets that have refilled completely carry no
+    state, so the least recently used are dropped once more than
+    `max_keys` are tracked. Limits are per process: with N workers a
+    client can get up to N times the configured rate.
+    """
+
+    def __init__(self, rate, burst, max_keys=100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._allowed = 0
+        self._rejected = 0
+
+    def _level_locked(self, key, now):
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def allow(self, key, cost=1):
+        """
+        Spends `cost` tokens from `key`'s bucket. Returns (allowed,
+        retry_after): retry_after is the seconds until the attempt would
+        succeed, 0 when allowed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._level_locked(key, now)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                self._rejected += 1
+                return False, (cost - tokens) / self.rate
+            self._buckets[key] = (tokens - cost, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            self._allowed += 1
+            return True, 0
+
+    def reset(self, key):
+        """Refills `key`'s bucket, e.g. after a successful login."""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._buckets),
+                "rate": self.rate,
+                "burst": self.burst,
+                "allowed": self._allowed,
+                "rejected": self._rejected,
+            }
+
+
+def per_minute(env_name, default_rate, default_burst):
+    """A limiter configured as "<attempts per minute>" and "<env_name>_BURST"."""
+    rate = float(os.environ.get(env_name, default_rate))
+    burst = float(os.environ.get(f"{env_name}_BURST", default_burst))
+    return RateLimiter(rate / 60.0, burst)
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+ADD = "add"
+REMOVE = "remove"
+
+ADDED = "Reaction added successfully."
+DELETED = "Reaction deleted successfully."
+NO_MATCH = "No matching reaction found for this user."
+
+DURABILITY_SYNC = "sync"
+DURABILITY_ASYNC = "async"
+
+
+class ReactionQueue:
+    """
+    Write-behind queue for reaction toggles.
+
+    Toggles queued while the previous batch is being written, or within
+    `window` seconds of the first one, are coalesced per (CommentID,
+    UserID, R_Id). At most two operations per key reach the database:
+    a leading remove (its result tells whether the row existed) and,
+    when the last toggle is an add after it, that add; a key whose first
+    toggle is an add only sends its last toggle. Each flush hands the
+    operations to `flush_fn` in one call, which applies them in order in
+    a single transaction and returns one (success, message) per
+    operation.
+
+    Every caller gets the result its own toggle would have had run on
+    its own, in order: adds succeed, and a remove succeeds when the
+    reaction existed at that point (add-then-remove: both succeed). If
+    the database rejects a key for any other reason, every caller of
+    that key gets the error.
+
+    Durability modes:
+      sync   submit() callers wait for the batch that carries their toggle
+             to commit (group commit): same guarantees as before, far
+             fewer transactions. The window defaults to 0, so a toggle is
+             written as soon as the flusher is free and batches form only
+             while a write is in flight.
+      async  callers get an acknowledgement as soon as the toggle is
+             queued; the window (default 50 ms) lets bursts coalesce, and
+             toggles still in it are lost if the process dies.
+    """
+
+    def __init__(self, flush_fn, window=None, max_batch=None, durability=None):
+        if durability is None:
+            durability = os.environ.get("REACTION_DURABILITY", DURABILITY_SYNC)
+        if durability not in (DURABILITY_SYNC, DURABILITY_ASYNC):
+            raise ValueError(f"Unknown reaction durability mode: {durability}")
+        if window is None:
+            default_ms = 50 if durability == DURABILITY_ASYNC else 0
+            window = float(os.environ.get("REACTION_FLUSH_WINDOW_MS", default_ms)) / 1000.0
+        if max_batch is None:
+            max_batch = int(os.environ.get("REACTION_MAX_BATCH", 500))
+
+        self.window = window
+        self.max_batch = max_batch
+        self.durability = durability
+        self._flush_fn = flush_fn
+        self._cond = threading.Condition()
+        self._pending = {}      # key -> [(op, future), ...] in submission order
+        self._first_at = None
+        self._thread = None
+        self._closed = False
+
+        self._submitted = 0
+        self._coalesced = 0
+        self._batches = 0
+        self._db_ops = 0
+        self._failed_ops = 0
+
+    def submit(self, op, comment_id, user_id, r_id):
+        """
+        Queue one toggle and return a Future resolving to (success, message).
+        """
+        if op not in (ADD, REMOVE):
+            raise ValueError(f"Unknown reaction operation: {op}")
+        key = (comment_id, user_id, r_id)
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Reaction queue is closed")
+            self._submitted += 1
+            waiters = self._pending.get(key)
+            if waiters is None:
+                self._pending[key] = [(op, future)]
+            else:
+                self._coalesced += 1
+                waiters.append((op, future))
+            if self._first_at is None:
+                # First toggle of a window: wake the flusher to start timing
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify()
+            self._ensure_thread()
+        return future
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="reaction-flusher", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        """Wait for the window to elapse, then detach the pending toggles."""
+        with self._cond:
+            while True:
+                if self._pending:
+                    remaining = self._first_at + self.window - time.monotonic()
+                    if remaining <= 0 or len(self._pending) >= self.max_batch or self._closed:
+                        break
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            batch, self._pending = self._pending, {}
+            self._first_at = None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    @staticmethod
+    def _plan(waiters):
+        """The operations that decide every waiter's result (see class doc)."""
+        first, last = waiters[0][0], waiters[-1][0]
+        if first == ADD:
+            return [last]
+        if last == ADD:
+            return [REMOVE, ADD]
+        return [REMOVE]
+
+    @staticmethod
+    def _resolve(waiters, db_results):
+        """Per-waiter (success, message), replaying the toggles in order."""
+        for result in db_results:
+            if not result[0] and result[1] != NO_MATCH:
+                return [result] * len(waiters)
+        if waiters[0][0] == ADD:
+            results, present = [(True, ADDED)], True
+        else:
+            results, present = [db_results[0]], False
+        for op, _ in waiters[1:]:
+            if op == ADD:
+                results.append((True, ADDED))
+                present = True
+            else:
+                results.append((True, DELETED) if present else (False, NO_MATCH))
+                present = False
+        return results
+
+    def _flush(self, batch):
+        plan = [(key, self._plan(waiters)) for key, waiters in batch.items()]
+        ops = [(op, key) for key, key_ops in plan for op in key_ops]
+        try:
+            results = self._flush_fn(ops)
+        except Exception as e:
+            results = [(False, str(e))] * len(ops)
+
+        failed = 0
+        position = 0
+        for key, key_ops in plan:
+            db_results = results[position:position + len(key_ops)]
+            position += len(key_ops)
+            failed += sum(1 for success, _ in db_results if not success)
+            waiters = batch[key]
+            for (_, future), result in zip(waiters, self._resolve(waiters, db_results)):
+                future.set_result(result)
+
+        with self._cond:
+            self._batches += 1
+            self._db_ops += len(ops)
+            self._failed_ops += failed
+
+    def flush(self):
+        """Synchronously apply whatever is pending (used on shutdown)."""
+        with self._cond:
+            batch, self._pending = self._pending, {}
+            self._first_at = None
+        if batch:
+            self._flush(batch)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "durability": self.durability,
+                "window_ms": self.window * 1000.0,
+                "pending": len(self._pending),
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "batches": self._batches,
+                "db_ops": self._db_ops,
+                "failed_ops": self._failed_ops,
+            }
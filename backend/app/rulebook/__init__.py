@@ -1,3 +1,4 @@
 from .rulebook import get_rulebook_data
+from .cache import RulebookCache, rulebook_cache
 
-__all__ = ['get_rulebook_data']
\ No newline at end of file
+__all__ = ['get_rulebook_data', 'RulebookCache', 'rulebook_cache']
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+from werkzeug.http import generate_etag
+
+from .html_text import html_to_text_many
+from .rulebook import build_rule, fetch_rulebook_rows
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+# (html, text) stand-in for rules not seen yet; never equal to a row's body, NULL included
+_MISSING = (object(), None)
+
+
+class RulebookCache:
+    """
+    Keeps the converted rulebook and its serialized JSON body in memory.
+
+    Converted rule text is keyed by (rule_id, rule_version), so a refresh
+    only re-parses the HTML of rules whose version (or body) changed.
+    After the first load a daemon thread refreshes the data every `ttl`
+    seconds; readers always get the last good snapshot and never wait on
+    the database once it is warm.
+    """
+
+    def __init__(self, ttl=None, loader=fetch_rulebook_rows):
+        if ttl is None:
+            ttl = float(os.environ.get("RULEBOOK_CACHE_TTL", 300))
+        self.ttl = ttl
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self._texts = {}        # (rule_id, rule_version) -> (html, text)
+        self._body = None
+        self._etag = None
+        self._loaded_at = None
+
+    def get(self, app):
+        """
+        Return (body, etag) for the current rulebook, loading it on first use.
+        `app` is the Flask app whose JSON provider serializes the body.
+        """
+        if self._body is None:
+            with self._lock:
+                if self._body is None:
+                    self._app = app
+                    self._refresh_locked()
+                    self._start_refresher()
+        return self._body, self._etag
+
+    def refresh(self):
+        """Reload rows from the database and rebuild the cached body."""
+        with self._lock:
+            if self._app is not None:
+                self._refresh_locked()
+
+    def invalidate(self):
+        """Drop the cached body; the next request reloads synchronously."""
+        with self._lock:
+            self._body = None
+            self._etag = None
+
+    def _refresh_locked(self):
+        rows = self._loader()
+
+        # Only rows whose version (or body) changed are converted again
+        changed = [row for row in rows
+                   if self._texts.get((row[0], row[1]), _MISSING)[0] != row[5]]
+        converted = dict(zip(((row[0], row[1]) for row in changed),
+                             html_to_text_many(row[5] for row in changed)))
+
+        texts = {}
+        rules = []
+        for row in rows:
+            key = (row[0], row[1])
+            if key in converted:
+                text = converted[key]
+            else:
+                text = self._texts[key][1]
+            texts[key] = (row[5], text)
+            rules.append(build_rule(row, text))
+
+        with self._app.app_context():
+            body = self._app.json.response({'staus': 'success', 'message': rules}).get_data()
+
+        self._texts = texts
+        if body != self._body:
+            self._body = body
+            self._etag = generate_etag(body)
+        self._loaded_at = time.time()
+
+    def _start_refresher(self):
+        if self.ttl <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="rulebook-cache", daemon=True)
+        self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.ttl)
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the last good snapshot
+                log.error("refreshing rulebook cache failed", extra={"error": str(e)})
+
+    def stats(self):
+        return {
+            "rules": len(self._texts),
+            "etag": self._etag,
+            "loaded_at": self._loaded_at,
+            "ttl": self.ttl,
+        }
+
+
+rulebook_cache = RulebookCache()
@@ -0,0 +1,201 @@
+"""
+Streaming HTML-to-text conversion for rule bodies.
+
+Produces exactly what
+
+    BeautifulSoup(html, "html.parser").get_text(separator="\\n", strip=True)
+
+returns, but drives the same `html.parser` tokenizer directly instead of
+building a parse tree: text runs are collected between tag events,
+stripped, and joined as they are closed.
+"""
+import threading
+from html.entities import html5
+from html.parser import HTMLParser
+
+# Named entities as bs4 resolves them: trailing ";" dropped, first name wins.
+_ENTITIES = {}
+for _name, _char in sorted(html5.items()):
+    _ENTITIES.setdefault(_name[:-1] if _name.endswith(";") else _name, _char)
+del _name, _char
+
+# Tags whose text bs4 stores as Script/Stylesheet/... strings, which
+# get_text() skips.
+_STRING_CONTAINERS = frozenset(("rt", "rp", "style", "script", "template"))
+
+# bs4's HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS
+_VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+    "link", "menuitem", "meta", "param", "source", "track", "wbr",
+    "basefont", "bgsound", "command", "frame", "image", "isindex",
+    "nextid", "spacer",
+))
+
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Single-pass text extractor. Reusable: call `convert()` repeatedly.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self._clear()
+
+    def _clear(self):
+        self._strings = []
+        self._data = []
+        self._stack = []
+        self._open = {}
+        self._containers = 0
+        self._closed_void = []
+
+    def convert(self, text):
+        self.reset()
+        self._clear()
+        try:
+            self.feed(text)
+            self.close()
+            self._end_data()
+            return "\n".join(self._strings)
+        finally:
+            self._strings = []
+
+    # -- bookkeeping mirroring bs4's tag stack --------------------------
+
+    def _end_data(self):
+        if self._data:
+            text = "".join(self._data).strip()
+            self._data = []
+            if text and not self._containers:
+                self._strings.append(text)
+
+    def _push(self, name):
+        self._stack.append(name)
+        self._open[name] = self._open.get(name, 0) + 1
+        if name in _STRING_CONTAINERS:
+            self._containers += 1
+
+    def _pop_to(self, name):
+        if not self._open.get(name):
+            return
+        while self._stack:
+            popped = self._stack.pop()
+            self._open[popped] -= 1
+            if popped in _STRING_CONTAINERS:
+                self._containers -= 1
+            if popped == name:
+                return
+
+    # -- tokenizer callbacks ----------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        if tag in _VOID_ELEMENTS:
+            # Closed immediately; a later explicit </tag> is swallowed.
+            self._closed_void.append(tag)
+        else:
+            self._push(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_data()
+        self._push(tag)
+        if tag in self._closed_void:
+            self._closed_void.remove(tag)
+        else:
+            self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void:
+            self._closed_void.remove(tag)
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        self._data.append(_ENTITIES.get(name) or "&" + name)
+
+    def handle_charref(self, name):
+        if name.startswith("x"):
+            code = int(name.lstrip("x"), 16)
+        elif name.startswith("X"):
+            code = int(name.lstrip("X"), 16)
+        else:
+            code = int(name)
+
+        data = None
+        if code < 256:
+            # Numeric references in the C1 range usually mean windows-1252
+            try:
+                data = bytearray([code]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._data.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            # CDATA text is kept even inside script/style
+            text = data[len("CDATA["):].strip()
+            if text:
+                self._strings.append(text)
+
+
+_local = threading.local()
+
+
+def _extractor():
+    extractor = getattr(_local, "extractor", None)
+    if extractor is None:
+        extractor = _local.extractor = HTMLTextExtractor()
+    return extractor
+
+
+def html_to_text(text):
+    """
+    Convert one HTML fragment to newline-separated, stripped plain text.
+    """
+    if text is None:
+        return ""
+    if isinstance(text, bytes):
+        # Let bs4 sniff the encoding exactly as before
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(text, "html.parser").get_text(separator="\n", strip=True)
+    if "<" not in text and "&" not in text:
+        # Plain text: a single string, stripped
+        return text.strip()
+    return _extractor().convert(text)
+
+
+def html_to_text_many(texts):
+    """
+    Convert a whole result set at once, reusing one parser and converting
+    repeated bodies only once. Returns a list in input order.
+    """
+    seen = {}
+    results = []
+    for text in texts:
+        if isinstance(text, str):
+            converted = seen.get(text)
+            if converted is None:
+                converted = seen[text] = html_to_text(text)
+        else:
+            converted = html_to_text(text)
+        results.append(converted)
+    return results
@@ -1,44 +1,66 @@
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.Database.connection import get_connection
+from app.Database.executor import listing_queries, run_in
+from app.serialization import Rule
+from app.streaming import fetch_batches
+from .html_text import html_to_text, html_to_text_many
 
 def format_html_text(text):
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(text, "html.parser")
-    # Get all text, separated by newlines
-    text = soup.get_text(separator="\n", strip=True)
-    return text    
+    # Same text as BeautifulSoup(text, "html.parser").get_text(separator="\n", strip=True),
+    # without building a parse tree
+    return html_to_text(text)
+
+@run_in(listing_queries)
+def fetch_rulebook_rows():
+    """
+    Runs santova.GetRuleBookForPlatForm and returns the raw rows.
+    """
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.callproc('santova.GetRuleBookForPlatForm')
+        rows = cursor.fetchall()
+        cursor.close()
+
+    return rows
+
+def stream_rulebook():
+    """
+    Rule records in batches, read with fetchmany() and converted batch by
+    batch; used by the streaming mode of the rulebook endpoint.
+    """
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.callproc('santova.GetRuleBookForPlatForm')
+            for rows in fetch_batches(cursor):
+                texts = html_to_text_many(row[5] for row in rows)
+                yield [build_rule(row, text) for row, text in zip(rows, texts)]
+        finally:
+            cursor.close()
+
+def build_rule(row, rule_text):
+    """
+    Shapes one GetRuleBookForPlatForm row into the API record.
+    `rule_text` is the already converted plain text of row[5].
+    """
+    return Rule(
+        rule_id=row[0],
+        rule_version=row[1],
+        rule_status=row[2],
+        rule_description=row[3],
+        rule_subject=row[4],
+        rule=rule_text,
+        rule_stage=row[6],
+        rule_process_name=row[7],
+        rule_process_owner=row[8]
+    )
 
 def get_rulebook_data():
     """
     Retrieves the rulebook data from the database.
-    
-    Returns:
-        list: A list of dictionaries containing rulebook data.
-    """
-    from Database import connect_to_database
-    connection = connect_to_database()
-    
-    cursor = connection.cursor()
-    cursor.callproc('santova.GetRuleBookForPlatForm')
-    
-    rulebook_data = []
-    for row in cursor.fetchall():
-        rulebook_data.append({
-            'rule_id': row[0],
-            'rule_version': row[1],
-            'rule_status': row[2],
-            'rule_description': row[3],
-            'rule_subject': row[4],
-            'rule': format_html_text(row[5]),
-            'rule_stage': row[6],
-            'rule_process_name': row[7],
-            'rule_process_owner': row[8]
-        })
-        #print(format_html_text(row[5]))
-    
-    cursor.close()
-    connection.close()
-    
-    return rulebook_data
 
+    Returns:
+        list: A list of Rule records containing rulebook data.
+    """
+    rows = fetch_rulebook_rows()
+    texts = html_to_text_many(row[5] for row in rows)
+    return [build_rule(row, text) for row, text in zip(rows, texts)]
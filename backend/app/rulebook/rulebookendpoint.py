@@ -1,9 +1,21 @@
-from flask import Blueprint,jsonify
-from .rulebook import get_rulebook_data
+from flask import Blueprint, current_app, request
+from app.streaming import prefetch, stream_format, stream_response
+from .cache import rulebook_cache
+from .rulebook import stream_rulebook
 
 rulebook_blueprint = Blueprint('rulebook', __name__)
 
 @rulebook_blueprint.route('/',methods=['GET'])
 def index():
-    return jsonify({'staus': 'success', 'message': get_rulebook_data()})
-# ...existing code...
\ No newline at end of file
+    # ?stream=1 / ndjson: read through from the database in chunks
+    fmt = stream_format()
+    if fmt:
+        return stream_response({'staus': 'success'}, 'message', prefetch(stream_rulebook()), fmt)
+
+    body, etag = rulebook_cache.get(current_app._get_current_object())
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate (cheap 304) every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+# ...existing code...
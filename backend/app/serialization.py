@@ -0,0 +1,255 @@
+"""
+Response serialization on msgspec.
+
+Rows headed for JSON are built as msgspec Structs instead of dicts: a
+Struct is a fixed-layout object (no per-row hash table), and the provider
+below encodes lists of them in C. Payloads without Structs keep going
+through Flask's stdlib encoder unchanged.
+
+Output matches what jsonify produced before: keys sorted, dates as HTTP
+dates ("Tue, 15 Nov 1994 08:12:31 GMT"), Decimal and UUID as strings.
+msgspec writes datetimes as ISO 8601 natively, so every Struct builder
+here converts date values when the Struct is made; a payload that mixes
+Structs with raw datetime values would get ISO dates for the latter.
+"""
+import dataclasses
+import datetime
+import decimal
+import functools
+import keyword
+import uuid
+from typing import Any, Optional
+
+import msgspec
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+
+def json_value(value):
+    """`value` as jsonify renders it, for values msgspec would render differently."""
+    if isinstance(value, datetime.date):
+        return http_date(value)
+    return value
+
+
+# -- fixed schemas ------------------------------------------------------
+
+class Reaction(msgspec.Struct):
+    R_Id: Any
+    EmojiName: str
+    ReactionCount: int
+
+
+class Comment(msgspec.Struct):
+    CommentID: int
+    CommentText: str
+    UserID: Any
+    UserName: str
+    CreatedDate: Optional[str]      # HTTP date
+    ParentID: Optional[int]
+    Reactions: list
+
+
+class CommentNode(msgspec.Struct):
+    """A comment with its nested replies (tree and thread views)."""
+    CommentID: int
+    CommentText: str
+    UserID: Any
+    UserName: str
+    CreatedDate: Optional[str]
+    ParentID: Optional[int]
+    Reactions: list
+    ReplyCount: int
+    ThreadReplyCount: int
+    Replies: list
+    HasMoreReplies: bool
+
+
+class Emoji(msgspec.Struct):
+    R_Id: Any
+    EmojiName: Any
+
+
+class Company(msgspec.Struct):
+    CompanyId: Any
+    CompanyName: Any
+
+
+class Rule(msgspec.Struct):
+    rule_id: Any
+    rule_version: Any
+    rule_status: Any
+    rule_description: Any
+    rule_subject: Any
+    rule: Any
+    rule_stage: Any
+    rule_process_name: Any
+    rule_process_owner: Any
+
+
+def comment_record(comment):
+    """Comment Struct for a comment dict (see get_comments_with_reacts)."""
+    return Comment(
+        comment["CommentID"],
+        comment["CommentText"],
+        comment["UserID"],
+        comment["UserName"],
+        json_value(comment["CreatedDate"]),
+        comment["ParentID"],
+        [Reaction(r["R_Id"], r["EmojiName"], r["ReactionCount"]) for r in comment["Reactions"]],
+    )
+
+
+# -- stored-procedure rows ---------------------------------------------
+#
+# Procedures like GetAllUser and GetFileData define their own columns, so
+# their Structs are generated from cursor.description, once per column set.
+
+@functools.lru_cache(maxsize=64)
+def _row_layout(name, columns):
+    """(Struct type, positions to read) for a column tuple, as dict(zip()) would keep them."""
+    last = {column: index for index, column in enumerate(columns)}
+    names = list(dict.fromkeys(columns))    # first-seen order, last value wins
+    fields, rename = [], {}
+    for position, column in enumerate(names):
+        if column.isidentifier() and not keyword.iskeyword(column) and not column.startswith("_"):
+            fields.append((column, Any))
+        else:
+            fields.append((f"field_{position}", Any))
+            rename[f"field_{position}"] = column
+    struct = msgspec.defstruct(name, fields, rename=rename or None)
+    return struct, tuple(last[column] for column in names)
+
+
+def row_type(name, columns):
+    """The generated Struct type for rows with these column names."""
+    return _row_layout(name, tuple(columns))[0]
+
+
+def rows_to_structs(name, columns, rows, convert=None):
+    """
+    Builds one Struct per DB row without an intermediate dict.
+    `convert` optionally maps {column: function} over values first.
+    """
+    struct, positions = _row_layout(name, tuple(columns))
+    rows = list(rows)
+    converters = dict(convert or {})
+    # Date columns become HTTP dates; the column type shows in its first non-null value
+    for index in positions:
+        if columns[index] in converters:
+            continue
+        for row in rows:
+            if row[index] is not None:
+                if isinstance(row[index], datetime.date):
+                    converters[columns[index]] = http_date
+                break
+    if not converters:
+        if positions == tuple(range(len(columns))):
+            return [struct(*row) for row in rows]
+        return [struct(*[row[i] for i in positions]) for row in rows]
+
+    steps = [(converters.get(columns[i]), i) for i in positions]
+    return [
+        struct(*[row[i] if fn is None or row[i] is None else fn(row[i]) for fn, i in steps])
+        for row in rows
+    ]
+
+
+def mapping_to_struct(name, mapping):
+    """Struct for a dict already built elsewhere (keys become the columns)."""
+    struct = row_type(name, tuple(mapping))
+    return struct(*[json_value(value) for value in mapping.values()])
+
+
+def struct_get(record, column, default=None):
+    """record.get(column) for both dicts and generated Structs."""
+    if isinstance(record, dict):
+        return record.get(column, default)
+    return getattr(record, column, default)
+
+
+class RecordCache:
+    """
+    Memoizes the Struct made for a long-lived row dict (cached snapshots
+    keep the same dict until it changes). An entry is reused only while
+    its source dict is the very same object, so copy-on-write updates are
+    picked up; owners clear() when they reload.
+    """
+
+    def __init__(self, convert):
+        self._convert = convert
+        self._records = {}      # key -> (source dict, Struct)
+
+    def get(self, key, source):
+        entry = self._records.get(key)
+        if entry is not None and entry[0] is source:
+            return entry[1]
+        record = self._convert(source)
+        self._records[key] = (source, record)
+        return record
+
+    def discard(self, key):
+        self._records.pop(key, None)
+
+    def clear(self):
+        self._records = {}
+
+
+# -- Flask provider -----------------------------------------------------
+
+def _enc_hook(o):
+    # Same fallbacks as flask.json.provider._default
+    if isinstance(o, datetime.date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+_encoder = msgspec.json.Encoder(enc_hook=_enc_hook, order="sorted")
+
+
+def encode(obj):
+    """JSON bytes for `obj`, sorted keys and jsonify's fallbacks (see module doc)."""
+    return _encoder.encode(obj)
+
+
+def _has_structs(obj, depth=2):
+    """True when the payload (or a value up to `depth` levels down) holds Structs."""
+    if isinstance(obj, msgspec.Struct):
+        return True
+    if depth <= 0:
+        return False
+    if isinstance(obj, dict):
+        return any(_has_structs(value, depth - 1) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return bool(obj) and _has_structs(obj[0], depth - 1)
+    return False
+
+
+class MsgspecJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes Struct payloads with msgspec and
+    leaves everything else to the default provider.
+    """
+
+    def _fast(self, obj, kwargs):
+        compact = self.compact if self.compact is not None else not self._app.debug
+        return compact and not kwargs and _has_structs(obj)
+
+    def dumps(self, obj, **kwargs):
+        if self._fast(obj, kwargs):
+            return encode(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self._fast(obj, {}):
+            # Straight to bytes; no str round trip
+            body = encode(obj) + b"\n"
+            return self._app.response_class(body, mimetype=self.mimetype)
+        return super().response(obj)
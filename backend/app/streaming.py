@@ -0,0 +1,131 @@
+"""
+Chunked JSON responses for large listings.
+
+A streamed response sends the same envelope a list endpoint returns
+({"success": true, "data": [...], ...}), but the list is written batch by
+batch while the rows are read, so neither the full row list nor the full
+body is ever held in memory and the first bytes leave after one batch.
+
+Clients opt in per request:
+
+    ?stream=1         one JSON document, same envelope as without it
+    ?stream=ndjson    (or Accept: application/x-ndjson) the envelope
+                      without the list on the first line, then one record
+                      per line; values only known at the end (a row
+                      count) are left out of that first line
+
+Envelope values given as callables are evaluated when they are written;
+keys are written in sorted order (as jsonify does), so a value such as a
+row count that sorts after the list key can be computed while streaming.
+
+An error after the first byte cannot change the status code anymore: the
+stream is cut short, which clients see as truncated JSON.
+"""
+import os
+
+from flask import Response, request, stream_with_context
+
+from app.serialization import encode
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 500))
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def stream_format():
+    """"json", "ndjson" or None (no streaming) for the current request."""
+    value = request.args.get("stream", "").lower()
+    if value == "ndjson" or (value in ("1", "true") and
+                             request.accept_mimetypes.best == NDJSON_MIMETYPE):
+        return "ndjson"
+    if value in ("1", "true", "json"):
+        return "json"
+    return None
+
+
+def fetch_batches(cursor, size=None):
+    """Yields lists of rows from `cursor` via fetchmany()."""
+    size = size or STREAM_BATCH_SIZE
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def batched(records, size=None):
+    """Splits an in-memory sequence into lists of `size`."""
+    size = size or STREAM_BATCH_SIZE
+    for start in range(0, len(records), size):
+        yield records[start:start + size]
+
+
+def prefetch(batches):
+    """
+    Reads the first batch now, so errors before any row (pool timeout,
+    failed EXEC) still become a normal error response, and returns an
+    iterator over all batches. Closing it closes `batches`, which lets a
+    generator holding a pooled connection release it on disconnect.
+    """
+    first = next(batches, None)
+
+    def rest():
+        try:
+            if first is not None:
+                yield first
+                yield from batches
+        finally:
+            batches.close()
+    return rest()
+
+
+def _resolve(value):
+    return value() if callable(value) else value
+
+
+def _json_body(envelope, key, batches):
+    keys = sorted([*envelope, key])
+    position = keys.index(key)
+    head = b",".join(encode(k) + b":" + encode(_resolve(envelope[k])) for k in keys[:position])
+    yield b"{" + head + (b"," if head else b"") + encode(key) + b":["
+    first = True
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            chunk = encode(batch)[1:-1]     # "[a,b]" -> "a,b"
+            yield chunk if first else b"," + chunk
+            first = False
+    except Exception:
+        log.exception("streaming response failed")
+        return
+    tail = b"".join(b"," + encode(k) + b":" + encode(_resolve(envelope[k])) for k in keys[position + 1:])
+    yield b"]" + tail + b"}\n"
+
+
+def _ndjson_body(envelope, batches):
+    # Deferred values are only known at the end; the head line carries the rest
+    yield encode({k: v for k, v in envelope.items() if not callable(v)}) + b"\n"
+    try:
+        for batch in batches:
+            if batch:
+                yield b"\n".join(encode(record) for record in batch) + b"\n"
+    except Exception:
+        log.exception("streaming response failed")
+
+
+def stream_response(envelope, key, batches, fmt="json"):
+    """
+    Response writing `envelope` with `key` holding the records yielded by
+    `batches` (an iterator of lists of serializable records).
+    """
+    if fmt == "ndjson":
+        body, mimetype = _ndjson_body(envelope, batches), NDJSON_MIMETYPE
+    else:
+        body, mimetype = _json_body(envelope, key, batches), "application/json"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["X-Accel-Buffering"] = "no"    # let nginx pass chunks through
+    return response
@@ -0,0 +1,191 @@
+"""
+Per-request tracing of database calls.
+
+Every request gets an ID, either the X-Request-ID it came with or a new
+one, and it is echoed in the response. The instrumented cursors
+(app/Database/instrumented.py) report each finished statement here, with
+its text, parameter shape (types only, never values), duration, rows
+and the request ID. Calls made on DB executor threads count towards the
+request that submitted them; executor calls run in a copy of the
+request's context.
+
+  - Slow queries: statements over DB_SLOW_QUERY_MS (500) are logged with
+    all of the above, whether they run in a request or in a background
+    flusher.
+  - Repeated statements: at the end of a request, a statement text run
+    DB_REPEAT_THRESHOLD (5) or more times is logged and counted as a
+    likely N+1.
+  - X-Debug-Trace: with DB_TRACE_HEADER=1, a request sent with
+    "X-Debug-Trace: 1" gets a response header summarizing its DB calls:
+
+        X-Debug-Trace: calls=2; db_ms=41.7; santova.GetAllUser=1x38.2ms; SELECT santova.Company=1x3.5ms
+
+    It is off by default because it names procedures and tables to the
+    client.
+"""
+import contextvars
+import os
+import re
+import time
+import uuid
+
+from flask import g, request
+
+from app.logs import get_logger
+from app.metrics import counter, histogram
+
+log = get_logger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 500))
+REPEAT_THRESHOLD = int(os.environ.get("DB_REPEAT_THRESHOLD", 5))
+TRACE_HEADER_ENABLED = os.environ.get("DB_TRACE_HEADER", "0").lower() in ("1", "true", "yes")
+
+MAX_STATEMENT_TEXT = 300
+_REQUEST_ID = re.compile(r"^[\w.:-]{1,64}$")
+_WHITESPACE = re.compile(r"\s+")
+
+DB_SLOW_QUERIES = counter("orbis_db_slow_queries_total",
+                          "Statements slower than DB_SLOW_QUERY_MS.", ("statement",))
+DB_REPEATED = counter("orbis_db_repeated_statements_total",
+                      "Requests that ran one statement DB_REPEAT_THRESHOLD or more times.",
+                      ("route", "statement"))
+DB_CALLS_PER_REQUEST = histogram("orbis_db_calls_per_request", "Database round trips per request.",
+                                 ("route",), buckets=(0, 1, 2, 3, 5, 10, 20, 50))
+
+_current = contextvars.ContextVar("request_trace", default=None)
+
+
+def statement_text(sql):
+    """SQL with whitespace collapsed, truncated for logs."""
+    text = _WHITESPACE.sub(" ", sql).strip()
+    if len(text) > MAX_STATEMENT_TEXT:
+        text = text[:MAX_STATEMENT_TEXT] + "..."
+    return text
+
+
+def params_shape(args):
+    """The types of the parameters passed with a statement, e.g. "(int, str, NoneType)"."""
+    if not args or args[0] is None:
+        return ""
+    params = args[0]
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+    return type(params).__name__
+
+
+class Call:
+    __slots__ = ("statement", "text", "shape", "seconds", "rows", "error")
+
+    def __init__(self, statement, text, shape, seconds, rows, error):
+        self.statement = statement
+        self.text = text
+        self.shape = shape
+        self.seconds = seconds
+        self.rows = rows
+        self.error = error
+
+
+class RequestTrace:
+    __slots__ = ("request_id", "calls")
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.calls = []     # appended from request and executor threads
+
+    def summary(self):
+        by_statement = {}
+        for call in self.calls:
+            entry = by_statement.setdefault(call.statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += call.seconds
+        total_ms = sum(call.seconds for call in self.calls) * 1000.0
+        parts = [f"calls={len(self.calls)}", f"db_ms={total_ms:.1f}"]
+        for statement, (count, seconds) in sorted(by_statement.items(), key=lambda item: -item[1][1]):
+            parts.append(f"{statement}={count}x{seconds * 1000.0:.1f}ms")
+        return "; ".join(parts)
+
+
+def current_request_id():
+    trace = _current.get()
+    return trace.request_id if trace is not None else None
+
+
+def record_statement(statement, sql, args, seconds, rows, error=None):
+    """Called by InstrumentedCursor when a statement is finished."""
+    trace = _current.get()
+    if trace is None and seconds * 1000.0 < SLOW_QUERY_MS:
+        return      # background work, nothing to log
+    call = Call(statement, statement_text(sql), params_shape(args), seconds, rows, error)
+    if trace is not None:
+        trace.calls.append(call)
+    if seconds * 1000.0 >= SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.inc(statement)
+        log.warning("slow query", extra={
+            "statement": call.text,
+            "params": call.shape,
+            "duration_ms": round(seconds * 1000.0, 1),
+            "rows": rows,
+            "error": error,
+            "request_id": trace.request_id if trace is not None else None,
+        })
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+class Tracing:
+    """Flask hooks for request IDs and DB call tracing; one shared instance, `tracing`."""
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    def _start(self):
+        request_id = request.headers.get("X-Request-ID", "")
+        if not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.trace_token = _current.set(RequestTrace(request_id))
+
+    def _finish(self, response):
+        trace = _current.get()
+        if trace is None:
+            return response
+        response.headers["X-Request-ID"] = trace.request_id
+        calls = list(trace.calls)
+        route = _route()
+        DB_CALLS_PER_REQUEST.observe(len(calls), route)
+
+        repeats = {}
+        for call in calls:
+            repeats[call.text] = repeats.get(call.text, 0) + 1
+        for text, count in repeats.items():
+            if count >= REPEAT_THRESHOLD:
+                statement = next(call.statement for call in calls if call.text == text)
+                DB_REPEATED.inc(route, statement)
+                log.warning("repeated statement in one request", extra={
+                    "route": route,
+                    "statement": text,
+                    "count": count,
+                    "request_id": trace.request_id,
+                })
+
+        if TRACE_HEADER_ENABLED and request.headers.get("X-Debug-Trace") == "1":
+            response.headers["X-Debug-Trace"] = trace.summary()
+        return response
+
+    def _teardown(self, exc):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)      # reset from a different context (streamed response)
+
+
+tracing = Tracing()
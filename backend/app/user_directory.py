@@ -0,0 +1,225 @@
+import bisect
+import os
+import threading
+import time
+import uuid
+
+import msgspec
+
+from app.serialization import struct_get
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+MAX_SEARCH_LIMIT = 50
+
+
+def display_name(user):
+    first = struct_get(user, "FirstName") or ""
+    last = struct_get(user, "LastName") or ""
+    return f"{first} {last}".strip()
+
+
+def _norm(text):
+    return " ".join(str(text or "").lower().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _fingerprint(user):
+    return msgspec.json.encode(user, order="sorted")
+
+
+class _DirectorySnapshot:
+    """
+    One loaded copy of the user table plus its search indexes.
+
+    users: in the order santova.GetAllUser returns them (the listing).
+    by_name / rank: display-name order, used to order search results.
+    prefix_keys: sorted (term, UserId) over every name word, the full name
+        and the e-mail; a prefix query is one bisect range.
+    trigrams: trigram -> set of UserIds over the full name and e-mail,
+        for substring matches ("ann" finds "Joanne").
+    """
+
+    __slots__ = ("version", "users", "by_name", "by_id", "rank", "haystacks", "prefix_keys", "trigrams")
+
+    def __init__(self, version, users):
+        self.version = version
+        self.users = list(users)    # procedure order, as /api/users has always returned them
+        self.by_name = sorted(self.users, key=lambda u: (_norm(display_name(u)), u.UserId))
+        self.by_id = {u.UserId: u for u in self.users}
+        self.rank = {u.UserId: i for i, u in enumerate(self.by_name)}
+        self.haystacks = {}
+        prefix_keys = []
+        trigrams = {}
+        for user in self.users:
+            user_id = user.UserId
+            name = _norm(display_name(user))
+            email = _norm(struct_get(user, "Email"))
+            self.haystacks[user_id] = (name, email)
+            for term in {name, email, *name.split()}:
+                if term:
+                    prefix_keys.append((term, user_id))
+            for text in (name, email):
+                for gram in _trigrams(text):
+                    trigrams.setdefault(gram, set()).add(user_id)
+        prefix_keys.sort()
+        self.prefix_keys = prefix_keys
+        self.trigrams = trigrams
+
+    def prefix_matches(self, query):
+        keys = self.prefix_keys
+        for index in range(bisect.bisect_left(keys, (query,)), len(keys)):
+            term, user_id = keys[index]
+            if not term.startswith(query):
+                break
+            yield user_id
+
+    def substring_matches(self, query):
+        grams = sorted((self.trigrams.get(g, set()) for g in _trigrams(query)), key=len)
+        if not grams:
+            return []
+        ids = set(grams[0])
+        for other in grams[1:]:
+            ids &= other
+        # Trigrams can match out of order; confirm on the text
+        return [uid for uid in ids if any(query in text for text in self.haystacks[uid])]
+
+
+class UserDirectory:
+    """
+    In-memory copy of santova.GetAllUser for listings and @mention lookup.
+
+    The procedure runs at most every `ttl` seconds (or after invalidate()).
+    Each reload is diffed against the previous one: new and changed users
+    get the next version number, so clients holding version N can fetch
+    just what changed since. Versions are per process; `epoch` tells a
+    client when its number came from another process or server start.
+
+    Users are the row Structs of app.serialization (attribute access).
+    """
+
+    def __init__(self, loader, ttl=None):
+        if ttl is None:
+            ttl = float(os.environ.get("USER_DIRECTORY_TTL", 300))
+        self.ttl = ttl
+        self._new_epoch()
+        os.register_at_fork(after_in_child=self._new_epoch)
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._stale = True
+
+        self._seq = 0
+        self._fingerprints = {}     # UserId -> fingerprint
+        self._user_seq = {}         # UserId -> version of its last change
+        self._deleted_seq = {}      # UserId -> version it disappeared at
+
+    def _new_epoch(self):
+        # New per process, including each forked worker: versions are
+        # numbered per process, so a sibling's version must read as a reset
+        self.epoch = uuid.uuid4().hex[:12]
+
+    def invalidate(self):
+        """Force the next read to reload from the database."""
+        self._stale = True
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is None or self._stale or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                snap = self._snapshot
+                if snap is None or self._stale or time.monotonic() - self._loaded_at > self.ttl:
+                    snap = self._reload_locked()
+        return snap
+
+    def _reload_locked(self):
+        self._stale = False
+        try:
+            users = self._loader()
+        except Exception:
+            self._stale = True
+            if self._snapshot is None:
+                raise
+            # Keep serving the last good copy; retry on the next read
+            log.exception("reloading user directory failed, serving cached copy")
+            return self._snapshot
+
+        fingerprints = {}
+        for user in users:
+            user_id = user.UserId
+            fp = _fingerprint(user)
+            fingerprints[user_id] = fp
+            if self._fingerprints.get(user_id) != fp:
+                self._seq += 1
+                self._user_seq[user_id] = self._seq
+                self._deleted_seq.pop(user_id, None)
+        for user_id in self._fingerprints.keys() - fingerprints.keys():
+            self._seq += 1
+            self._deleted_seq[user_id] = self._seq
+            self._user_seq.pop(user_id, None)
+
+        self._fingerprints = fingerprints
+        self._snapshot = _DirectorySnapshot(self._seq, users)
+        self._loaded_at = time.monotonic()
+        return self._snapshot
+
+    def all(self):
+        """Returns (users, version)."""
+        snap = self.snapshot()
+        return snap.users, snap.version
+
+    def get(self, user_id):
+        return self.snapshot().by_id.get(user_id)
+
+    def search(self, query, limit=10):
+        """
+        Users whose name or e-mail starts with `query` (any word), then
+        those containing it, in name order within each group. Returns
+        (users, version).
+        """
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        snap = self.snapshot()
+        query = _norm(query)
+        if not query:
+            return snap.by_name[:limit], snap.version
+
+        seen = set(snap.prefix_matches(query))
+        ranked = sorted(seen, key=snap.rank.__getitem__)
+        if len(ranked) < limit and len(query) >= 3:
+            extra = [uid for uid in snap.substring_matches(query) if uid not in seen]
+            ranked.extend(sorted(extra, key=snap.rank.__getitem__))
+        return [snap.by_id[uid] for uid in ranked[:limit]], snap.version
+
+    def changes_since(self, since, epoch=None):
+        """
+        Users added or changed after version `since`, and IDs removed.
+
+        Result dict: users, deleted, version, epoch and reset. `reset` is
+        True when `epoch` belongs to another process or server start (or
+        `since` is ahead of us); the client should reload in full.
+        """
+        snap = self.snapshot()
+        if (epoch is not None and epoch != self.epoch) or since > snap.version:
+            return {"users": [], "deleted": [], "version": snap.version,
+                    "epoch": self.epoch, "reset": True}
+        with self._lock:
+            changed = [uid for uid, seq in self._user_seq.items() if since < seq <= snap.version]
+            deleted = [uid for uid, seq in self._deleted_seq.items() if since < seq <= snap.version]
+        users = [snap.by_id[uid] for uid in changed if uid in snap.by_id]
+        return {"users": users, "deleted": deleted, "version": snap.version,
+                "epoch": self.epoch, "reset": False}
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "users": len(snap.users) if snap else 0,
+            "version": snap.version if snap else 0,
+            "prefix_terms": len(snap.prefix_keys) if snap else 0,
+            "trigrams": len(snap.trigrams) if snap else 0,
+            "ttl": self.ttl,
+        }
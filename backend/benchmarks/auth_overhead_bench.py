@@ -0,0 +1,88 @@
+"""
+Per-request cost of token_required: a full HS256 jwt.decode on every call
+versus the verified-token cache.
+
+Run from backend/:
+
+    python -m benchmarks.auth_overhead_bench [--requests 20000] [--tokens 50]
+
+or run the file itself, from anywhere: python benchmarks/auth_overhead_bench.py
+with the same options.
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+if __package__ in (None, ""):
+    # Run as a file (python benchmarks/auth_overhead_bench.py): make backend/ importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from flask import Flask
+
+from app.auth_middleware import token_required, token_cache
+
+SECRET = "benchmark-secret"
+
+
+def make_tokens(count):
+    exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=2)
+    return [
+        jwt.encode({
+            "UserId": i + 1,
+            "UserName": f"User {i}",
+            "RoleId": 2,
+            "CompanyIds": [1, 2, 3],
+            "exp": exp,
+            "iat": datetime.datetime.now(datetime.timezone.utc),
+        }, SECRET, algorithm="HS256")
+        for i in range(count)
+    ]
+
+
+def run(app, view, tokens, requests, max_size):
+    token_cache.max_size = max_size
+    token_cache.clear()
+    timings = []
+    for i in range(requests):
+        headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+        with app.test_request_context("/", headers=headers):
+            start = time.perf_counter()
+            view()
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def report(label, timings):
+    mean = statistics.fmean(timings) * 1e6
+    p50 = timings[len(timings) // 2] * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"{label:<18} mean {mean:7.2f} us   p50 {p50:7.2f} us   p99 {p99:7.2f} us")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = SECRET
+
+    @token_required
+    def view(user_id, user_name):
+        return user_id
+
+    tokens = make_tokens(args.tokens)
+    uncached = report("jwt.decode", run(app, view, tokens, args.requests, max_size=0))
+    cached = report("token cache", run(app, view, tokens, args.requests, max_size=10000))
+    print(f"speedup {uncached / cached:.1f}x   {token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
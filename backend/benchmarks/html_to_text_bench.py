@@ -0,0 +1,116 @@
+"""
+Benchmark the streaming rulebook HTML-to-text converter against the
+BeautifulSoup path it replaces.
+
+Run from backend/:
+
+    python -m benchmarks.html_to_text_bench [--rules 2000] [--repeat 3]
+
+or run the file itself, from anywhere: python benchmarks/html_to_text_bench.py
+with the same options.
+
+The golden corpus is checked for identical output before timing.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+if __package__ in (None, ""):
+    # Run as a file (python benchmarks/html_to_text_bench.py): make backend/ importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from app.rulebook.html_text import html_to_text, html_to_text_many
+
+
+GOLDEN_CORPUS = [
+    "",
+    "   ",
+    "Plain rule text without markup",
+    "<p>Invoices above <b>10,000</b> need approval</p>",
+    "<ul><li>First</li><li> Second </li></ul><p>After list</p>",
+    "<p>Tom &amp; Jerry &nbsp; &lt;tag&gt; &copy; &bogus; &#150; &#x263a;</p>",
+    "<div>one<div>two</span>three</div>four</div>",
+    "<p>Visible<script>var hidden = 1;</script><style>p { color: red }</style> text</p>",
+    "<ruby>漢<rt>kan</rt></ruby> and <template><p>skip</p></template>shown",
+    "a<br>b</br>c<br/>d<hr>e",
+    "<!-- note -->a<!DOCTYPE html><?pi data?>b<![CDATA[cdata]]>c",
+    "<table><tr><td>Cell 1</td><td>Cell 2</td></tr></table>",
+    "<p>Line\nbreaks\r\n inside   text</p>",
+    "<p>Unclosed <b>bold <i>italic",
+    "<a href='x'>link</a>tail &amp",
+]
+
+
+def make_rule(rng, size):
+    words = ["invoice", "supplier", "approval", "exception", "tolerance",
+             "currency", "amount", "&amp;", "&nbsp;", "PO", "GRN", "match"]
+    parts = []
+    while sum(len(p) for p in parts) < size:
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(3, 15)))
+        block = rng.choice([
+            "<p>{}</p>",
+            "<li><span style='font-weight:bold'>{}</span></li>",
+            "<div class='rule'><strong>Rule:</strong> {}<br></div>",
+            "<table><tr><td>{}</td><td>{}</td></tr></table>",
+        ])
+        parts.append(block.format(text, text))
+    return "<ul>" + "".join(parts) + "</ul>"
+
+
+def bs4_text(html):
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n", strip=True)
+
+
+def time_rows(fn, rows):
+    latencies = []
+    start = time.perf_counter()
+    for html in rows:
+        t0 = time.perf_counter()
+        fn(html)
+        latencies.append(time.perf_counter() - t0)
+    return time.perf_counter() - start, latencies
+
+
+def report(name, total, latencies, nbytes):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} {nbytes / total / 1e6:8.2f} MB/s   "
+          f"p50 {statistics.median(latencies) * 1e3:7.3f} ms   "
+          f"p99 {p99 * 1e3:7.3f} ms   total {total:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=2000)
+    parser.add_argument("--min-size", type=int, default=2_000)
+    parser.add_argument("--max-size", type=int, default=40_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = [make_rule(rng, rng.randint(args.min_size, args.max_size)) for _ in range(args.rules)]
+    nbytes = sum(len(r.encode("utf-8")) for r in rows)
+
+    for html in GOLDEN_CORPUS + rows[:200]:
+        expected, actual = bs4_text(html), html_to_text(html)
+        assert expected == actual, f"output differs for {html[:80]!r}"
+    print(f"golden corpus: {len(GOLDEN_CORPUS)} cases + 200 synthetic rules identical")
+    print(f"rulebook: {len(rows)} rules, {nbytes / 1e6:.1f} MB\n")
+
+    for _ in range(args.repeat):
+        report("bs4", *time_rows(bs4_text, rows), nbytes)
+        report("streaming", *time_rows(html_to_text, rows), nbytes)
+        start = time.perf_counter()
+        html_to_text_many(rows)
+        batch = time.perf_counter() - start
+        print(f"{'batch':<12} {nbytes / batch / 1e6:8.2f} MB/s   "
+              f"{batch / len(rows) * 1e3:7.3f} ms/row   total {batch:6.2f} s\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Encode a 10k-row file listing the old way (dict(zip()) rows through the
+stdlib jsonify provider) and through app.serialization (row Structs and
+the msgspec provider). Reports build + encode time and the tracemalloc
+peak of each path.
+
+Run from backend/:
+
+    python -m benchmarks.json_encode_bench [--rows 10000] [--repeat 5]
+
+or run the file itself, from anywhere: python benchmarks/json_encode_bench.py
+with the same options.
+
+Both bodies are decoded and compared before timing.
+"""
+import argparse
+import datetime
+import decimal
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+if __package__ in (None, ""):
+    # Run as a file (python benchmarks/json_encode_bench.py): make backend/ importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.serialization import MsgspecJSONProvider, rows_to_structs
+
+COLUMNS = [
+    "FileID", "FileName", "FileType", "FileFormat", "FileSize", "ProcessID",
+    "ProcessName", "UserID", "UploadedByName", "UploadedDate", "Description",
+    "DownloadCount", "MimeType", "Price",
+]
+
+
+def make_rows(count):
+    start = datetime.datetime(2024, 1, 1, 9, 30)
+    return [
+        (
+            i, f"document-{i}.pdf", "document", "pdf", 10_000 + i * 37, i % 40,
+            f"Process {i % 40}", i % 300, f"User {i % 300}",
+            start + datetime.timedelta(minutes=i), f"Quarterly report {i} for review",
+            i % 17, "application/pdf", decimal.Decimal(f"{i}.25"),
+        )
+        for i in range(count)
+    ]
+
+
+def old_path(app, provider, rows):
+    files = [dict(zip(COLUMNS, row)) for row in rows]
+    with app.app_context():
+        return provider.response({"success": True, "files": files, "total": len(files)}).get_data()
+
+
+def new_path(app, provider, rows):
+    files = rows_to_structs("FileRecord", COLUMNS, rows)
+    with app.app_context():
+        return provider.response({"success": True, "files": files, "total": len(files)}).get_data()
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    old_provider = DefaultJSONProvider(app)
+    new_provider = MsgspecJSONProvider(app)
+    rows = make_rows(args.rows)
+
+    old_body = old_path(app, old_provider, rows)
+    new_body = new_path(app, new_provider, rows)
+    assert json.loads(old_body) == json.loads(new_body), "bodies differ"
+
+    print(f"{args.rows} rows, {len(new_body) / 1024:.0f} KiB body")
+    results = {}
+    for label, fn in (
+        ("dict + jsonify", lambda: old_path(app, old_provider, rows)),
+        ("Struct + msgspec", lambda: new_path(app, new_provider, rows)),
+    ):
+        seconds, peak = measure(fn, args.repeat)
+        results[label] = (seconds, peak)
+        print(f"{label:<18} {seconds * 1000:8.1f} ms   peak {peak / 1024 / 1024:7.2f} MiB")
+
+    (old_s, old_peak), (new_s, new_peak) = results.values()
+    print(f"speedup {old_s / new_s:.1f}x   peak memory {old_peak / new_peak:.1f}x lower")
+
+
+if __name__ == "__main__":
+    main()
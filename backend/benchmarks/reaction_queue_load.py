@@ -0,0 +1,159 @@
+"""
+Load test for the reaction write-behind queue.
+
+Simulates a burst of reaction toggles on one popular comment against a
+fake DB-API driver (with a configurable round-trip delay) and counts the
+transactions each path commits.
+
+Run from backend/:
+
+    SECRET_KEY=x python -m benchmarks.reaction_queue_load [--clients 50] [--toggles 20]
+
+or run the file itself, from anywhere: python benchmarks/reaction_queue_load.py
+with the same options.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+if __package__ in (None, ""):
+    # Run as a file (python benchmarks/reaction_queue_load.py): make backend/ importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.Database import configure_pool, get_connection
+from app import discussion
+from app.reaction_queue import ReactionQueue, ADD, REMOVE
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        time.sleep(self.conn.rtt)
+        with self.conn.lock:
+            self.conn.stats["statements"] += 1
+        if "@Changed" in sql:
+            # Pretend every toggle changed its row
+            self.description = (("Idx", None),)
+            self._rows = [(int(i),) for i in re.findall(r"INSERT INTO @Changed VALUES \((\d+)\)", sql)]
+        else:
+            self.description = None
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def nextset(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, stats, lock, rtt):
+        self.stats, self.lock, self.rtt = stats, lock, rtt
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        time.sleep(self.rtt)
+        with self.lock:
+            self.stats["transactions"] += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def run(label, toggle, clients, toggles, stats):
+    rng = random.Random(7)
+    plans = [[(rng.choice((ADD, REMOVE)), 1, user, rng.randint(1, 3)) for _ in range(toggles)]
+             for user in range(clients)]
+
+    def client(plan):
+        for op, comment_id, user_id, r_id in plan:
+            toggle(op, comment_id, user_id, r_id)
+
+    threads = [threading.Thread(target=client, args=(plan,)) for plan in plans]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    requests = clients * toggles
+    print(f"{label:<22} {requests:6d} requests  {stats['transactions']:6d} transactions  "
+          f"{stats['statements']:6d} statements  {requests / elapsed:8.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--toggles", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--window-ms", type=float, default=None,
+                        help="coalescing window (default: the queue's, 0 for sync and 50 for async)")
+    args = parser.parse_args()
+
+    lock = threading.Lock()
+    rtt = args.rtt_ms / 1000.0
+    discussion.comment_store.invalidate = lambda: None
+
+    stats = {"transactions": 0, "statements": 0}
+    configure_pool(lambda: FakeConnection(stats, lock, rtt), max_size=20, timeout=30, ping_interval=None)
+
+    def direct(op, comment_id, user_id, r_id):
+        # What the routes did before the queue: one toggle per transaction
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                _, deltas = discussion._apply_reactions(cursor, [(op, (comment_id, user_id, r_id))])
+                conn.commit()
+            finally:
+                cursor.close()
+        discussion._publish_reaction_deltas(deltas)
+
+    run("per-request", direct, args.clients, args.toggles, stats)
+
+    stats = {"transactions": 0, "statements": 0}
+    configure_pool(lambda: FakeConnection(stats, lock, rtt), max_size=20, timeout=30, ping_interval=None)
+    window = None if args.window_ms is None else args.window_ms / 1000.0
+    queue = ReactionQueue(discussion.apply_reaction_batch, window=window, durability="sync")
+
+    def queued(op, comment_id, user_id, r_id):
+        queue.submit(op, comment_id, user_id, r_id).result()
+
+    run("write-behind (sync)", queued, args.clients, args.toggles, stats)
+    queue.close()
+    print(queue.stats())
+
+    stats = {"transactions": 0, "statements": 0}
+    configure_pool(lambda: FakeConnection(stats, lock, rtt), max_size=20, timeout=30, ping_interval=None)
+    queue = ReactionQueue(discussion.apply_reaction_batch, window=window, durability="async")
+
+    def fire_and_forget(op, comment_id, user_id, r_id):
+        queue.submit(op, comment_id, user_id, r_id)
+
+    run("write-behind (async)", fire_and_forget, args.clients, args.toggles, stats)
+    queue.close()
+    print(f"{'':<22} after final flush: {stats['transactions']} transactions")
+    print(queue.stats())
+
+
+if __name__ == "__main__":
+    main()
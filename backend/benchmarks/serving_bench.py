@@ -0,0 +1,137 @@
+"""
+Requests/s of the development server (what `python app.py` runs) against
+gunicorn with gunicorn.conf.py at 1, 2, 4 ... workers, up to the core count.
+
+Run from backend/:
+
+    SECRET_KEY=x python -m benchmarks.serving_bench [--path /api/debug-session]
+        [--seconds 5] [--clients 4] [--connections 8]
+
+or run the file itself, from anywhere: python benchmarks/serving_bench.py
+with the same options (it starts the servers in backend/).
+
+Each server is started on a free local port; the load comes from
+`--clients` processes holding `--connections` keep-alive connections each,
+so the client side is not limited to one core by the GIL. The default
+path needs no database. Numbers only mean something on a machine with
+more cores than the client processes use.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEV_SERVER = "from app import create_app; create_app().run('127.0.0.1', port={port}, debug=False)"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+def client(port, path, connections, seconds, results):
+    counts = [0] * connections
+    stop = time.monotonic() + seconds
+
+    def run(slot):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while time.monotonic() < stop:
+            try:
+                conn.request("GET", path)
+                conn.getresponse().read()
+                counts[slot] += 1
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put(sum(counts))
+
+
+def measure(port, path, args):
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=client, args=(port, path, args.connections, args.seconds, results))
+        for _ in range(args.clients)
+    ]
+    for p in procs:
+        p.start()
+    total = sum(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return total / args.seconds
+
+
+def serve(label, command, port, path, args, env):
+    server = subprocess.Popen(command, cwd=BACKEND, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, path)
+        rate = measure(port, path, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    print(f"{label:<28} {rate:10.0f} req/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/api/debug-session")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    # No access log and no DB connections opened at worker start
+    env = dict(os.environ, PYTHONUNBUFFERED="1", WEB_ACCESS_LOG="/dev/null", DB_POOL_MIN_SIZE="0")
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    cores = multiprocessing.cpu_count()
+    print(f"{cores} cores, GET {args.path}, {args.clients}x{args.connections} connections")
+
+    port = free_port()
+    baseline = serve("python app.py (dev server)",
+                     [sys.executable, "-c", DEV_SERVER.format(port=port)], port, args.path, args, env)
+
+    workers = 1
+    while True:
+        port = free_port()
+        rate = serve(f"gunicorn {workers} worker(s) x {args.threads}",
+                     [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                      "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+                      "--threads", str(args.threads), "app:create_app()"],
+                     port, args.path, args, env)
+        print(f"{'':<28} {rate / baseline:10.1f}x dev server")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    main()
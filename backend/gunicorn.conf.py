@@ -0,0 +1,71 @@
+"""
+Production server settings:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+One worker by default, serving WEB_THREADS requests at a time on threads
+(gthread): requests mostly wait on SQL Server, and the long-lived
+/api/discussion/stream connections each hold a thread, so SSE_MAX_CLIENTS
+defaults to all threads but 16 kept for ordinary requests.
+
+Keep WEB_WORKERS at 1 unless the proxy pins each client to one worker
+(e.g. nginx `hash $http_authorization consistent`). The discussion event
+bus, the comment sync tokens ("since"), the user directory and file index
+versions and their ETags all live in one process: a client served by
+another worker misses live events posted there and gets a reset or a
+full 200 instead of a delta or a 304 (each worker has its own epoch, so
+it never misreads a sibling's token). Every worker also has its own
+connection pool, so the database sees up to
+WEB_WORKERS x DB_POOL_MAX_SIZE connections.
+
+The app is loaded in the master before forking (preload_app); the hooks
+below give each worker its own pool and drain it on shutdown (see
+app/lifecycle.py). SIGTERM stops accepting, lets in-flight requests
+finish for up to WEB_GRACEFUL_TIMEOUT seconds and flushes queued writes.
+"""
+import os
+import signal
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_WORKERS", 1))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 128))
+preload_app = True
+
+# Recycle workers now and then (jitter keeps them from restarting together)
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 1000))
+
+timeout = int(os.environ.get("WEB_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+# Each open event stream holds one of the worker's threads; keep 16 for requests
+os.environ.setdefault("SSE_MAX_CLIENTS", str(max(1, threads - 16)))
+
+
+def when_ready(server):
+    if workers > 1:
+        server.log.warning(
+            "WEB_WORKERS=%d: live discussion events, sync tokens and ETags are per "
+            "worker; route each client to one worker or run a single worker", workers)
+
+
+def post_worker_init(worker):
+    from app.lifecycle import begin_drain, start_worker
+    start_worker()
+
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        begin_drain()
+        handle_exit(sig, frame)
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_exit(server, worker):
+    from app.lifecycle import stop_worker
+    stop_worker()
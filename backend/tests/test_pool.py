@@ -0,0 +1,215 @@
+"""
+ConnectionPool against a fake DB-API driver.
+
+Run from backend/: SECRET_KEY=x python -m pytest tests
+"""
+import threading
+
+import pytest
+
+from app.Database.pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if self.conn.broken:
+            raise ConnectionError("server closed the connection")
+        self.conn.executed.append(sql)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError("server closed the connection")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    """Zero-argument connect function that remembers what it opened."""
+
+    def __init__(self):
+        self.opened = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        conn = FakeConnection()
+        with self._lock:
+            self.opened.append(conn)
+        return conn
+
+
+@pytest.fixture
+def driver():
+    return FakeDriver()
+
+
+def make_pool(driver, **options):
+    config = {"min_size": 0, "max_size": 2, "timeout": 0.05, "ping_interval": None}
+    config.update(options)
+    return ConnectionPool(driver, **config)
+
+
+def test_reuses_returned_connection(driver):
+    pool = make_pool(driver)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(driver.opened) == 1
+
+
+def test_checkout_times_out_when_exhausted(driver):
+    pool = make_pool(driver, max_size=1)
+    with pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    assert pool.stats()["timeouts_total"] == 1
+    # The slot is usable again once the holder returns it
+    with pool.connection():
+        pass
+
+
+def test_waiter_gets_connection_released_by_another_thread(driver):
+    pool = make_pool(driver, max_size=1, timeout=2.0)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            holding.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait()
+    threading.Timer(0.05, release.set).start()
+    with pool.connection():
+        pass
+    holder.join()
+    assert len(driver.opened) == 1
+    assert pool.stats()["wait_time_max"] > 0
+
+
+def test_recycles_connection_past_max_lifetime(driver):
+    pool = make_pool(driver, max_lifetime=60.0)
+    with pool.connection() as old:
+        pass
+    pool._idle[-1].created_at -= 61.0
+
+    with pool.connection() as new:
+        pass
+    assert new is not old
+    assert old.closed
+    stats = pool.stats()
+    assert stats["recycled_total"] == 1
+    assert stats["size"] == 1
+
+
+def test_discards_connection_failing_health_ping(driver):
+    pool = make_pool(driver, ping_interval=30.0)
+    with pool.connection() as stale:
+        pass
+    entry = pool._idle[-1]
+    entry.last_used -= 31.0
+    stale.broken = True
+
+    with pool.connection() as fresh:
+        pass
+    assert fresh is not stale
+    assert stale.closed
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_pings_idle_connection_that_is_healthy(driver):
+    pool = make_pool(driver, ping_interval=30.0)
+    with pool.connection() as conn:
+        pass
+    pool._idle[-1].last_used -= 31.0
+    with pool.connection() as again:
+        pass
+    assert again is conn
+    assert conn.executed == ["SELECT 1"]
+
+
+def test_discards_connection_whose_rollback_fails(driver):
+    pool = make_pool(driver)
+    with pool.connection() as conn:
+        conn.broken = True
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+
+
+def test_stats_counters(driver):
+    pool = make_pool(driver, min_size=1, max_size=3)
+    pool.prefill()
+    with pool.connection():
+        with pool.connection():
+            stats = pool.stats()
+            assert stats["in_use"] == 2
+            assert stats["idle"] == 0
+            assert stats["size"] == 2
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 2
+    assert stats["created_total"] == 2
+    assert stats["creation_rate_per_min"] == 2
+    assert stats["checkouts_total"] == 2
+    assert stats["timeouts_total"] == 0
+    assert stats["closed_total"] == 0
+
+    pool.close()
+    stats = pool.stats()
+    assert stats["size"] == 0
+    assert stats["closed_total"] == 2
+    assert all(conn.closed for conn in driver.opened)
+
+
+def test_prefill_opens_min_size(driver):
+    pool = make_pool(driver, min_size=2, max_size=4)
+    pool.prefill()
+    assert len(driver.opened) == 2
+    assert pool.stats()["idle"] == 2
+
+
+def test_pool_timeout_is_served_as_503(driver, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "x")
+    from app import create_app
+    from app.Database import configure_pool, close_pool, get_connection
+
+    pool = configure_pool(creator=driver, min_size=0, max_size=1, timeout=0.05, ping_interval=None)
+    app = create_app()
+
+    @app.route("/test-checkout")
+    def checkout():
+        with get_connection():
+            return "ok"
+
+    try:
+        with pool.connection():
+            response = app.test_client().get("/test-checkout")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert response.get_json()["success"] is False
+    finally:
+        close_pool()
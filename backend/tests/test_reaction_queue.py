@@ -0,0 +1,109 @@
+"""
+ReactionQueue coalescing against a fake flush_fn that keeps the rows in a set.
+
+Run from backend/: SECRET_KEY=x python -m pytest tests
+"""
+import pytest
+
+from app.reaction_queue import ADD, ADDED, DELETED, NO_MATCH, REMOVE, ReactionQueue
+
+KEY = (1, 2, 3)
+
+
+class FakeReactions:
+    """Applies ops in order like _apply_reactions, recording each batch."""
+
+    def __init__(self, rows=()):
+        self.rows = set(rows)
+        self.batches = []
+
+    def __call__(self, ops):
+        self.batches.append(list(ops))
+        results = []
+        for op, key in ops:
+            if op == ADD:
+                self.rows.add(key)
+                results.append((True, ADDED))
+            elif key in self.rows:
+                self.rows.remove(key)
+                results.append((True, DELETED))
+            else:
+                results.append((False, NO_MATCH))
+        return results
+
+
+def run_batch(flush_fn, *ops):
+    """Queue `ops` for KEY within one window and return each caller's result."""
+    queue = ReactionQueue(flush_fn, window=60.0, durability="sync")
+    futures = [queue.submit(op, *KEY) for op in ops]
+    queue.close()       # flushes everything pending as one batch
+    return [future.result(timeout=5) for future in futures]
+
+
+@pytest.mark.parametrize("existing", [False, True])
+def test_add_then_remove(existing):
+    db = FakeReactions([KEY] if existing else [])
+    assert run_batch(db, ADD, REMOVE) == [(True, ADDED), (True, DELETED)]
+    assert KEY not in db.rows
+    assert db.batches == [[(REMOVE, KEY)]]
+
+
+def test_remove_then_add_when_reaction_exists():
+    db = FakeReactions([KEY])
+    assert run_batch(db, REMOVE, ADD) == [(True, DELETED), (True, ADDED)]
+    assert KEY in db.rows
+    assert db.batches == [[(REMOVE, KEY), (ADD, KEY)]]
+
+
+def test_remove_then_add_when_reaction_is_missing():
+    db = FakeReactions()
+    assert run_batch(db, REMOVE, ADD) == [(False, NO_MATCH), (True, ADDED)]
+    assert KEY in db.rows
+
+
+def test_add_then_add():
+    db = FakeReactions()
+    assert run_batch(db, ADD, ADD) == [(True, ADDED), (True, ADDED)]
+    assert KEY in db.rows
+    assert db.batches == [[(ADD, KEY)]]
+
+
+def test_remove_twice_only_first_succeeds():
+    db = FakeReactions([KEY])
+    assert run_batch(db, REMOVE, REMOVE) == [(True, DELETED), (False, NO_MATCH)]
+    assert KEY not in db.rows
+
+
+def test_long_sequence_matches_running_each_toggle_alone():
+    ops = [ADD, REMOVE, REMOVE, ADD, ADD, REMOVE]
+    for existing in (False, True):
+        sequential = FakeReactions([KEY] if existing else [])
+        expected = [sequential([(op, KEY)])[0] for op in ops]
+        batched = FakeReactions([KEY] if existing else [])
+        assert run_batch(batched, *ops) == expected
+        assert batched.rows == sequential.rows
+
+
+def test_database_error_goes_to_every_caller_of_the_key():
+    def failing(ops):
+        return [(False, "deadlock victim")] * len(ops)
+
+    assert run_batch(failing, ADD, REMOVE) == [(False, "deadlock victim")] * 2
+
+
+def test_flush_exception_goes_to_every_caller():
+    def broken(ops):
+        raise RuntimeError("connection lost")
+
+    assert run_batch(broken, REMOVE, ADD) == [(False, "connection lost")] * 2
+
+
+def test_keys_are_independent():
+    db = FakeReactions([(1, 2, 4)])
+    queue = ReactionQueue(db, window=60.0, durability="sync")
+    first = queue.submit(ADD, *KEY)
+    second = queue.submit(REMOVE, 1, 2, 4)
+    queue.close()
+    assert first.result(timeout=5) == (True, ADDED)
+    assert second.result(timeout=5) == (True, DELETED)
+    assert db.rows == {KEY}